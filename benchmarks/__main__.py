@@ -0,0 +1,109 @@
+"""
+Run the benchmark suite.
+
+Run from the repository root with ``python -m benchmarks``. Use ``--json PATH`` to save
+machine-readable results, and ``--compare OLD.json`` to show the change relative to an
+earlier run, e.g. one made on another commit. Use ``--stdlib-json`` to measure the
+stdlib JSON codec when orjson is installed.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import typing
+
+from sansio_jsonrpc import JsonRpcPeer
+from sansio_jsonrpc.codec import StdlibJsonCodec
+
+from .suite import Result, build_cases, measure
+
+
+def git_revision() -> typing.Optional[str]:
+    """ Return the current commit hash, if this is a git checkout. """
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def load_baseline(path: str) -> typing.Dict[str, float]:
+    """ Map ``group/name`` to messages/sec for a saved run. """
+    with open(path) as file:
+        saved = json.load(file)
+    return {
+        f"{r['group']}/{r['name']}": r["messages_per_sec"] for r in saved["results"]
+    }
+
+
+def print_results(
+    results: typing.List[Result], baseline: typing.Optional[typing.Dict[str, float]]
+) -> None:
+    """ Print a human-readable table. """
+    header = f"{'benchmark':<44} {'ns/op':>12} {'msgs/s':>12} {'MB/s':>9}"
+    if baseline is not None:
+        header += f" {'change':>8}"
+    print(header)
+    for result in results:
+        key = f"{result.group}/{result.name}"
+        line = (
+            f"{key:<44} {result.ns_per_op:>12.0f} {result.messages_per_sec:>12.0f} "
+            f"{result.bytes_per_sec / 1e6:>9.1f}"
+        )
+        if baseline is not None and key in baseline:
+            change = result.messages_per_sec / baseline[key] - 1
+            line += f" {change:>+8.1%}"
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("-k", "--filter", help="only run benchmarks containing this")
+    parser.add_argument("--json", help="write results to this JSON file")
+    parser.add_argument("--compare", help="compare to results saved with --json")
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.2,
+        help="minimum seconds to spend on each benchmark",
+    )
+    parser.add_argument(
+        "--stdlib-json",
+        action="store_true",
+        help="use the stdlib JSON codec even if a faster one is installed",
+    )
+    args = parser.parse_args()
+
+    codec = StdlibJsonCodec() if args.stdlib_json else None
+    cases = build_cases(codec)
+    if args.filter:
+        cases = [c for c in cases if args.filter in f"{c.group}/{c.name}"]
+    baseline = load_baseline(args.compare) if args.compare else None
+
+    results = []
+    for case in cases:
+        results.append(measure(case, args.min_time))
+    print_results(results, baseline)
+
+    if args.json:
+        output = {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "codec": JsonRpcPeer(codec=codec).codec.name,
+            "results": [result.to_json_dict() for result in results],
+        }
+        with open(args.json, "w") as file:
+            json.dump(output, file, indent=2)
+        print(f"Wrote {len(results)} results to {args.json}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
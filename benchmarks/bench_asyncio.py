@@ -0,0 +1,70 @@
+"""
+Show the throughput of the asyncio adapter over a local socket pair.
+
+Each row sends the same number of requests with a given number of them in flight at
+once. With one in flight, every request waits for the previous response, as naive
+client code does; with more, requests are pipelined and their frames are coalesced
+into one ``writelines()`` call per event loop iteration.
+
+Run from the repository root with ``python -m benchmarks.bench_asyncio``.
+"""
+import asyncio
+import socket
+import time
+
+from sansio_jsonrpc import JsonRpcDispatcher, JsonRpcPeer
+from sansio_jsonrpc.asyncio import JsonRpcProtocol
+
+
+REQUESTS = 20_000
+
+
+def make_dispatcher():
+    dispatcher = JsonRpcDispatcher()
+
+    @dispatcher.register
+    def add(a, b):
+        return a + b
+
+    return dispatcher
+
+
+async def bench(in_flight):
+    """ Return ``(requests/sec, writes per request)`` with n requests in flight. """
+    loop = asyncio.get_event_loop()
+    client_sock, server_sock = socket.socketpair()
+    await loop.connect_accepted_socket(
+        lambda: JsonRpcProtocol(JsonRpcPeer(make_dispatcher())), sock=server_sock
+    )
+    _, client = await loop.create_connection(JsonRpcProtocol, sock=client_sock)
+    writes = 0
+    writelines = client.transport.writelines
+
+    def counting_writelines(frames):
+        nonlocal writes
+        writes += 1
+        writelines(frames)
+
+    client.transport.writelines = counting_writelines
+
+    async def worker(count):
+        for i in range(count):
+            await client.request("add", [i, 1])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(REQUESTS // in_flight) for _ in range(in_flight)))
+    elapsed = time.perf_counter() - start
+    client.close()
+    await client.wait_closed()
+    return REQUESTS / elapsed, writes / REQUESTS
+
+
+def main():
+    print(f"{'in flight':>9} {'requests/s':>11} {'writes/request':>15}")
+    for in_flight in (1, 10, 100, 1_000):
+        per_sec, writes = asyncio.run(bench(in_flight))
+        print(f"{in_flight:>9} {per_sec:>11.0f} {writes:>15.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Compare the codec backends on representative JSON-RPC payloads.
+
+Run from the repository root with ``python -m benchmarks.bench_codec``.
+"""
+import json
+import timeit
+
+from sansio_jsonrpc.binary import MsgpackCodec, PureMsgpackCodec, msgpack
+from sansio_jsonrpc.codec import OrjsonCodec, StdlibJsonCodec, orjson
+
+
+class LegacyCodec:
+    """ The encode/decode path used before codecs were pluggable. """
+
+    name = "json (legacy)"
+
+    def encode(self, obj):
+        return json.dumps(obj).encode("utf8")
+
+    def decode(self, data):
+        return json.loads(data.decode("utf8"))
+
+
+def make_payloads():
+    """ Return a list of ``(name, message)`` pairs. """
+    record = {
+        "id": 12345,
+        "name": "Ada Lovelace",
+        "email": "ada@example.com",
+        "score": 98.5,
+        "tags": ["math", "engines"],
+        "active": True,
+    }
+    return [
+        (
+            "small request",
+            {"jsonrpc": "2.0", "id": 1, "method": "get_user", "params": {"id": 7}},
+        ),
+        (
+            "medium result",
+            {"jsonrpc": "2.0", "id": 2, "result": [record] * 100},
+        ),
+        (
+            "large result",
+            {"jsonrpc": "2.0", "id": 3, "result": [record] * 10_000},
+        ),
+        (
+            "numeric result",
+            {"jsonrpc": "2.0", "id": 4, "result": [i * 0.5 for i in range(10_000)]},
+        ),
+    ]
+
+
+def bench(func, arg):
+    """ Return the best time per call in seconds. """
+    timer = timeit.Timer(lambda: func(arg))
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=3, number=number)) / number
+
+
+def main():
+    codecs = [LegacyCodec(), StdlibJsonCodec()]
+    if orjson is not None:
+        codecs.append(OrjsonCodec())
+    codecs.append(PureMsgpackCodec())
+    if msgpack is not None:
+        codecs.append(MsgpackCodec())
+
+    print(f"{'payload':<16} {'codec':<14} {'bytes':>9} {'encode µs':>11} {'decode µs':>11}")
+    for payload_name, payload in make_payloads():
+        for codec in codecs:
+            data = codec.encode(payload)
+            encode = bench(codec.encode, payload) * 1e6
+            decode = bench(codec.decode, data) * 1e6
+            print(
+                f"{payload_name:<16} {codec.name:<14} {len(data):>9} "
+                f"{encode:>11.2f} {decode:>11.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Measure the memory footprint and construction time of message objects.
+
+Run from the repository root with ``python -m benchmarks.bench_messages``.
+"""
+import timeit
+import tracemalloc
+
+from sansio_jsonrpc import JsonRpcError, JsonRpcPeer, JsonRpcRequest, JsonRpcResponse
+from sansio_jsonrpc.main import MissingId
+
+
+COUNT = 100_000
+
+
+def bytes_per_object(factory):
+    """ Return the average traced allocation size of one object. """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objs = [factory(i) for i in range(COUNT)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # Subtract the list that holds the objects.
+    return (after - before) / len(objs) - 8
+
+
+def ns_per_call(stmt, namespace):
+    """ Return the best time per call in nanoseconds. """
+    timer = timeit.Timer(stmt, globals=namespace)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=15, number=number)) / number * 1e9
+
+
+def main():
+    # IDs above 256 are used so that small-int caching does not hide their cost, and
+    # the same ints are used for every factory so that they cancel out.
+    ids = list(range(1000, 1000 + COUNT))
+    print(f"{'object':<30} {'bytes/object':>12}")
+    for name, factory in (
+        ("JsonRpcRequest", lambda i: JsonRpcRequest(id=ids[i], method="m")),
+        ("JsonRpcRequest notification", lambda i: JsonRpcRequest(MissingId(), "m")),
+        ("JsonRpcResponse", lambda i: JsonRpcResponse(id=ids[i], result=True)),
+        ("JsonRpcError", lambda i: JsonRpcError(code=ids[i], message="m")),
+    ):
+        print(f"{name:<30} {bytes_per_object(factory):>12.1f}")
+
+    print()
+    peer = JsonRpcPeer()
+    namespace = {
+        "JsonRpcError": JsonRpcError,
+        "JsonRpcRequest": JsonRpcRequest,
+        "JsonRpcResponse": JsonRpcResponse,
+        "MissingId": MissingId,
+        "peer": peer,
+        "req": JsonRpcRequest(id=1, method="m"),
+        "err": JsonRpcError(code=1, message="m"),
+    }
+    print(f"{'operation':<50} {'ns/call':>9}")
+    for stmt in (
+        "JsonRpcRequest(id=1, method='m', params=[1])",
+        "JsonRpcRequest(id=MissingId(), method='m')",
+        "JsonRpcResponse(id=1, result=1)",
+        "JsonRpcError(code=1, message='m')",
+        "peer.request('m', [1])",
+        "peer.notify('m', [1])",
+        "peer.respond_with_result(req, 1)",
+        "peer.respond_with_error(req, err)",
+    ):
+        print(f"{stmt:<50} {ns_per_call(stmt, namespace):>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Show that pending-request tracking costs the same per request at any table size.
+
+Run from the repository root with ``python -m benchmarks.bench_pending``.
+"""
+import time
+
+from sansio_jsonrpc import JsonRpcResponse, PendingRequests
+
+
+OPERATIONS = 50_000
+
+
+def bench(outstanding):
+    """ Return ``(add+match ns, expire ns)`` per request with n requests pending. """
+    now = [0.0]
+    pending = PendingRequests(clock=lambda: now[0], default_timeout=30)
+    for i in range(outstanding):
+        pending.add(("background", i), "background")
+
+    responses = [JsonRpcResponse(id=i, result=True) for i in range(OPERATIONS)]
+    start = time.perf_counter()
+    for response in responses:
+        pending.add(response.id, "foo")
+        pending.match(response)
+    add_match = (time.perf_counter() - start) / OPERATIONS * 1e9
+
+    for i in range(OPERATIONS):
+        pending.add(("expiring", i), "foo", timeout=1)
+    now[0] = 1
+    start = time.perf_counter()
+    expired = pending.expire()
+    expire = (time.perf_counter() - start) / len(expired) * 1e9
+    return add_match, expire
+
+
+def main():
+    print(f"{'outstanding':>11} {'add+match ns':>13} {'expire ns':>10}")
+    for outstanding in (1_000, 10_000, 50_000, 200_000):
+        add_match, expire = bench(outstanding)
+        print(f"{outstanding:>11} {add_match:>13.0f} {expire:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
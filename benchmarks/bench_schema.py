@@ -0,0 +1,82 @@
+"""
+Compare compiled params validation to interpreting the same schema for each request.
+
+The interpreter is what a generic validator does: it walks the schema for every
+request, looking up each param's accepted types and checking them with
+``isinstance()``. The compiled validator is generated once by
+:func:`compile_schema`.
+
+Run from the repository root with ``python -m benchmarks.bench_schema``.
+"""
+import timeit
+
+from sansio_jsonrpc import JsonRpcInvalidParamsError, ParamsSchema
+from sansio_jsonrpc.schema import _ACCEPTED_TYPES, compile_schema
+
+
+SCHEMA = ParamsSchema(
+    {
+        "user": str,
+        "limit": int,
+        "offset": int,
+        "threshold": float,
+        "tags": (list, None),
+        "active": bool,
+    },
+    optional=["tags", "active"],
+)
+
+PARAMS = {
+    "positional": ["ada", 100, 0, 0.5, ["a", "b"], True],
+    "named": {"user": "ada", "limit": 100, "offset": 0, "threshold": 0.5},
+}
+
+
+def interpret(schema, params):
+    """ Check params against a schema without compiling it. """
+    names = list(schema.params)
+    if isinstance(params, list):
+        if len(params) > len(names):
+            raise JsonRpcInvalidParamsError()
+        values = dict(zip(names, params))
+    else:
+        if not schema.extra and any(name not in schema.params for name in params):
+            raise JsonRpcInvalidParamsError()
+        values = params
+    for name in names:
+        if name not in values:
+            if name not in schema.optional:
+                raise JsonRpcInvalidParamsError()
+            continue
+        spec = schema.params[name]
+        accepted = []
+        for item in spec if isinstance(spec, tuple) else (spec,):
+            accepted.extend(_ACCEPTED_TYPES[item])
+        value = values[name]
+        if isinstance(value, bool) and bool not in accepted:
+            raise JsonRpcInvalidParamsError()
+        if not isinstance(value, tuple(accepted)):
+            raise JsonRpcInvalidParamsError()
+
+
+def ns_per_call(func, params):
+    """ Return the best time per call in nanoseconds. """
+    timer = timeit.Timer(lambda: func(params))
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=7, number=number)) / number * 1e9
+
+
+def main():
+    validate = compile_schema("search", SCHEMA)
+    print(f"{'params':<12} {'interpreted ns':>15} {'compiled ns':>12} {'speedup':>8}")
+    for name, params in PARAMS.items():
+        interpreted = ns_per_call(lambda p: interpret(SCHEMA, p), params)
+        compiled = ns_per_call(validate, params)
+        print(
+            f"{name:<12} {interpreted:>15.0f} {compiled:>12.0f} "
+            f"{interpreted / compiled:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
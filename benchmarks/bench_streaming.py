@@ -0,0 +1,91 @@
+"""
+Compare peak memory and first-byte latency of encoding a large result in one call and
+streaming it with ``respond_with_result_stream()``, and the peak memory of handling a
+large params array as a list and as an iterator.
+
+Peak memory is the largest amount traced by ``tracemalloc`` while encoding, on top of
+the result itself, or while handling, on top of the received frame. The streamed chunks
+are discarded as they are produced, as they would be once written to a socket.
+
+Run from the repository root with ``python -m benchmarks.bench_streaming``.
+"""
+import time
+import tracemalloc
+
+from sansio_jsonrpc import JsonRpcDispatcher, JsonRpcPeer, JsonRpcRequest
+
+
+RECORD = {
+    "id": 12345,
+    "name": "Ada Lovelace",
+    "email": "ada@example.com",
+    "score": 98.5,
+    "tags": ["math", "engines"],
+}
+
+
+def measure(encode):
+    """ Return ``(first byte ms, total ms, peak MB)`` for an encoding function. """
+    start = time.perf_counter()
+    first_byte = None
+    for _ in encode():
+        if first_byte is None:
+            first_byte = time.perf_counter() - start
+    total = time.perf_counter() - start
+    # Tracing allocations slows encoding down, so memory is measured separately.
+    tracemalloc.start()
+    for _ in encode():
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return first_byte * 1e3, total * 1e3, peak / 1e6
+
+
+def main():
+    peer = JsonRpcPeer()
+    request = JsonRpcRequest(id=1, method="get_rows")
+    print(f"codec: {peer.codec.name}")
+    print(
+        f"{'rows':>9} {'mode':<7} {'first byte ms':>13} {'total ms':>9} "
+        f"{'peak MB':>8}"
+    )
+    for rows in (10_000, 100_000, 1_000_000):
+        result = {"rows": [dict(RECORD, id=i) for i in range(rows)]}
+        for mode, encode in (
+            ("whole", lambda: (peer.respond_with_result(request, result),)),
+            ("stream", lambda: peer.respond_with_result_stream(request, result)),
+        ):
+            first_byte, total, peak = measure(encode)
+            print(
+                f"{rows:>9} {mode:<7} {first_byte:>13.2f} {total:>9.1f} {peak:>8.1f}"
+            )
+
+    print()
+    dispatcher = JsonRpcDispatcher()
+
+    def ingest(records):
+        return sum(record["score"] for record in records)
+
+    dispatcher.register(ingest)
+    dispatcher.register(ingest, name="ingest_iter", iter_params=True)
+    server = JsonRpcPeer(dispatcher, lazy=True)
+    print(f"{'records':>9} {'mode':<7} {'handle ms':>9} {'peak MB':>8}")
+    for rows in (10_000, 100_000, 1_000_000):
+        records = [dict(RECORD, id=i) for i in range(rows)]
+        for mode, method, params in (
+            ("list", "ingest", [records]),
+            ("iter", "ingest_iter", records),
+        ):
+            _, frame = JsonRpcPeer().request(method, params)
+            start = time.perf_counter()
+            server.handle(frame)
+            total = time.perf_counter() - start
+            tracemalloc.start()
+            server.handle(frame)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{rows:>9} {mode:<7} {total * 1e3:>9.1f} {peak / 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,498 @@
+"""
+Benchmark cases for the encode, parse, and error hot paths.
+
+Every case is a zero-argument callable plus the number of messages and bytes that one
+call processes, so results can be reported as messages/sec and bytes/sec. None of the
+cases touch the network.
+"""
+from dataclasses import dataclass
+import itertools
+import time
+import typing
+
+from sansio_jsonrpc import (
+    Compression,
+    ConcatenatedJsonFramer,
+    ContentLengthFramer,
+    JsonRpcDispatcher,
+    JsonRpcError,
+    JsonRpcException,
+    JsonRpcParseError,
+    JsonRpcPeer,
+    JsonRpcProxy,
+    JsonRpcRequest,
+    Limits,
+    NewlineFramer,
+    ParamsSchema,
+    PeerMetrics,
+    RequestTracer,
+)
+from sansio_jsonrpc.binary import PureMsgpackCodec
+from sansio_jsonrpc.codec import JsonCodec
+
+
+@dataclass
+class Case:
+    """ A single benchmark. """
+
+    group: str
+    name: str
+    func: typing.Callable[[], typing.Any]
+    messages: int = 1
+    #: The number of encoded bytes produced or consumed by one call.
+    size: int = 0
+
+
+@dataclass
+class Result:
+    """ The measurements for one case. """
+
+    group: str
+    name: str
+    ns_per_op: float
+    messages_per_sec: float
+    bytes_per_sec: float
+
+    def to_json_dict(self) -> dict:
+        """ Convert to a JSON dictionary. """
+        return {
+            "group": self.group,
+            "name": self.name,
+            "ns_per_op": self.ns_per_op,
+            "messages_per_sec": self.messages_per_sec,
+            "bytes_per_sec": self.bytes_per_sec,
+        }
+
+
+RECORD = {
+    "id": 12345,
+    "name": "Ada Lovelace",
+    "email": "ada@example.com",
+    "score": 98.5,
+    "tags": ["math", "engines"],
+    "active": True,
+}
+
+# The number of responses that one flush of a server's output contains.
+FLUSH_COUNT = 200
+
+PAYLOADS = {
+    "small": {"id": 7},
+    "medium": {"rows": [RECORD] * 100},
+    "huge": {"rows": [RECORD] * 20_000},
+}
+
+
+def measure(case: Case, min_time: float) -> Result:
+    """ Run a case repeatedly for at least ``min_time`` seconds and keep the best. """
+    func = case.func
+    func()
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 5:
+            break
+        number *= 2
+    best = elapsed
+    for _ in range(4):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, time.perf_counter() - start)
+    per_op = best / number
+    return Result(
+        group=case.group,
+        name=case.name,
+        ns_per_op=per_op * 1e9,
+        messages_per_sec=case.messages / per_op,
+        bytes_per_sec=case.size / per_op,
+    )
+
+
+def _swallow(exc_type: type, func: typing.Callable, *args) -> None:
+    try:
+        func(*args)
+    except exc_type:
+        pass
+
+
+def build_cases(codec: typing.Optional[JsonCodec] = None) -> typing.List[Case]:
+    """
+    Return every benchmark case.
+
+    :param codec: The codec of the JSON peers, or None for the default codec.
+    """
+    cases: typing.List[Case] = []
+    peer = JsonRpcPeer(codec=codec)
+    request = JsonRpcRequest(id=1, method="get_rows")
+    error = JsonRpcError(code=-32601, message="Method not found")
+    app_error = JsonRpcError(code=1, message="Application error")
+    interned_error = JsonRpcParseError().get_error()
+
+    prepared = peer.prepare("get_rows")
+    lazy_peer = JsonRpcPeer(codec=codec, lazy=True)
+
+    for size, params in PAYLOADS.items():
+        _, req_bytes = peer.request("get_rows", params)
+        notify_bytes = peer.notify("get_rows", params)
+        result_bytes = peer.respond_with_result(request, params)
+        cases += [
+            Case(
+                "encode",
+                f"request/{size}",
+                lambda p=params: peer.request("get_rows", p),
+                size=len(req_bytes),
+            ),
+            Case(
+                "encode",
+                f"notify/{size}",
+                lambda p=params: peer.notify("get_rows", p),
+                size=len(notify_bytes),
+            ),
+            Case(
+                "encode",
+                f"prepared_request/{size}",
+                lambda p=params: prepared.request(p),
+                size=len(req_bytes),
+            ),
+            Case(
+                "encode",
+                f"respond_with_result/{size}",
+                lambda p=params: peer.respond_with_result(request, p),
+                size=len(result_bytes),
+            ),
+            Case(
+                "parse",
+                f"request/{size}",
+                lambda b=req_bytes: peer.parse(b),
+                size=len(req_bytes),
+            ),
+            Case(
+                "parse",
+                f"response/{size}",
+                lambda b=result_bytes: peer.parse(b),
+                size=len(result_bytes),
+            ),
+            Case(
+                "parse",
+                f"lazy_request/{size}",
+                lambda b=req_bytes: lazy_peer.parse(b),
+                size=len(req_bytes),
+            ),
+            Case(
+                "parse",
+                f"lazy_response/{size}",
+                lambda b=result_bytes: lazy_peer.parse(b),
+                size=len(result_bytes),
+            ),
+        ]
+
+    error_bytes = peer.respond_with_error(request, error)
+    malformed = b'{"jsonrpc": "2.0", "id": 1, "method": '
+    shapeless = b'{"jsonrpc": "2.0", "id": 1}'
+    cases += [
+        Case(
+            "error",
+            "respond_with_error",
+            lambda: peer.respond_with_error(request, error),
+            size=len(error_bytes),
+        ),
+        Case(
+            "error",
+            "respond_with_error/interned",
+            lambda: peer.respond_with_error(request, interned_error),
+            size=len(error_bytes),
+        ),
+        Case(
+            "error",
+            "parse/error_response",
+            lambda: peer.parse(error_bytes),
+            size=len(error_bytes),
+        ),
+        Case(
+            "error",
+            "parse/malformed_json",
+            lambda: _swallow(JsonRpcParseError, peer.parse, malformed),
+            size=len(malformed),
+        ),
+        Case(
+            "error",
+            "parse/not_a_message",
+            lambda: _swallow(JsonRpcParseError, peer.parse, shapeless),
+            size=len(shapeless),
+        ),
+        Case(
+            "error",
+            "exc_from_error/reserved",
+            lambda: JsonRpcException.exc_from_error(error),
+        ),
+        Case(
+            "error",
+            "exc_from_error/application",
+            lambda: JsonRpcException.exc_from_error(app_error),
+        ),
+    ]
+
+    batch_size = 100
+
+    def encode_batch():
+        batch = peer.request_batch()
+        for _ in range(batch_size):
+            batch.request("get_rows", PAYLOADS["small"])
+        return batch.encode()
+
+    batch_bytes = encode_batch()
+    cases += [
+        Case("batch", "encode/100", encode_batch, batch_size, len(batch_bytes)),
+        Case(
+            "batch",
+            "parse/100",
+            lambda: peer.parse(batch_bytes),
+            batch_size,
+            len(batch_bytes),
+        ),
+    ]
+
+    frames = [peer.request("get_rows", PAYLOADS["small"])[1] for _ in range(batch_size)]
+    frames[::10] = [malformed] * len(frames[::10])
+
+    def parse_each():
+        for frame in frames:
+            try:
+                peer.parse(frame)
+            except JsonRpcException as exc:
+                peer.respond_with_error(None, exc.get_error())
+
+    frames_size = sum(map(len, frames))
+    cases += [
+        Case("bulk", "parse_each/100", parse_each, batch_size, frames_size),
+        Case(
+            "bulk",
+            "parse_many/100",
+            lambda: peer.parse_many(frames),
+            batch_size,
+            frames_size,
+        ),
+    ]
+
+    _, one = peer.request("get_rows", PAYLOADS["medium"])
+    for framer_cls in (ConcatenatedJsonFramer, NewlineFramer, ContentLengthFramer):
+        stream_peer = JsonRpcPeer(codec=codec, framer=framer_cls())
+        stream = stream_peer.framer.frame(one) * 10
+        chunks = [stream[i : i + 1500] for i in range(0, len(stream), 1500)]
+
+        def feed(stream_peer=stream_peer, chunks=chunks):
+            for chunk in chunks:
+                for _ in stream_peer.feed(chunk):
+                    pass
+
+        cases.append(
+            Case("stream", f"feed/{framer_cls.__name__}", feed, 10, len(stream))
+        )
+
+    for size, params in PAYLOADS.items():
+        _, req_bytes = peer.request("get_rows", params)
+        result_bytes = peer.respond_with_result(request, params)
+        head, tail = result_bytes.split(b'"id":1', 1)
+        proxy = JsonRpcProxy(JsonRpcPeer(codec=codec))
+        upstream_ids = itertools.count()
+
+        def forward(proxy=proxy, ids=upstream_ids, req=req_bytes, head=head, tail=tail):
+            proxy.forward_request("client", req)
+            proxy.forward_response(b"".join((head, b'"id":%d' % next(ids), tail)))
+
+        def reencode(req=req_bytes, resp=result_bytes):
+            peer.encode(peer.parse(req)[0])
+            peer.encode(peer.parse(resp)[0])
+
+        cases += [
+            Case(
+                "proxy",
+                f"forward/{size}",
+                forward,
+                2,
+                len(req_bytes) + len(result_bytes),
+            ),
+            Case(
+                "proxy",
+                f"reencode/{size}",
+                reencode,
+                2,
+                len(req_bytes) + len(result_bytes),
+            ),
+        ]
+
+    limits = Limits(
+        max_frame_bytes=10_000_000,
+        max_depth=32,
+        max_batch_length=1000,
+        max_string_length=65_536,
+    )
+    limited_peer = JsonRpcPeer(codec=codec, limits=limits)
+    for size, params in PAYLOADS.items():
+        _, req_bytes = peer.request("get_rows", params)
+        cases.append(
+            Case(
+                "limits",
+                f"parse/{size}",
+                lambda b=req_bytes: limited_peer.parse(b),
+                size=len(req_bytes),
+            )
+        )
+    deep = b'{"jsonrpc": "2.0", "method": "a", "params": %s}' % (
+        b"[" * 10_000 + b"]" * 10_000
+    )
+    cases += [
+        Case(
+            "limits",
+            "reject/deep",
+            lambda: _swallow(JsonRpcException, limited_peer.parse, deep),
+            size=len(deep),
+        ),
+        Case(
+            "limits",
+            "unlimited/deep",
+            lambda: _swallow(JsonRpcException, peer.parse, deep),
+            size=len(deep),
+        ),
+    ]
+
+    binary_peer = JsonRpcPeer(codec=PureMsgpackCodec())
+    for size in ("small", "medium"):
+        params = PAYLOADS[size]
+        _, req_bytes = binary_peer.request("get_rows", params)
+        result_bytes = binary_peer.respond_with_result(request, params)
+        cases += [
+            Case(
+                "binary",
+                f"request/{size}",
+                lambda p=params: binary_peer.request("get_rows", p),
+                size=len(req_bytes),
+            ),
+            Case(
+                "binary",
+                f"parse/{size}",
+                lambda b=result_bytes: binary_peer.parse(b),
+                size=len(result_bytes),
+            ),
+        ]
+
+    compressed_peer = JsonRpcPeer(
+        codec=codec, compression=Compression(["get_rows"], keys=list(RECORD))
+    )
+    for size in ("small", "medium"):
+        params = PAYLOADS[size]
+        result_bytes = compressed_peer.respond_with_result(request, params)
+        cases += [
+            Case(
+                "compression",
+                f"respond/{size}",
+                lambda p=params: compressed_peer.respond_with_result(request, p),
+                size=len(result_bytes),
+            ),
+            Case(
+                "compression",
+                f"parse/{size}",
+                lambda b=result_bytes: compressed_peer.parse(b),
+                size=len(result_bytes),
+            ),
+        ]
+
+    metered_peer = JsonRpcPeer(codec=codec, metrics=PeerMetrics())
+    for size in ("small", "medium"):
+        params = PAYLOADS[size]
+        _, req_bytes = peer.request("get_rows", params)
+        cases += [
+            Case(
+                "metrics",
+                f"request/{size}",
+                lambda p=params: metered_peer.request("get_rows", p),
+                size=len(req_bytes),
+            ),
+            Case(
+                "metrics",
+                f"parse/{size}",
+                lambda b=req_bytes: metered_peer.parse(b),
+                size=len(req_bytes),
+            ),
+        ]
+
+    # A server flushing the responses to many requests in one loop iteration.
+    framed_peer = JsonRpcPeer(codec=codec, framer=ContentLengthFramer())
+    answered = [JsonRpcRequest(id=i, method="get_rows") for i in range(FLUSH_COUNT)]
+    result = PAYLOADS["medium"]
+    flush_size = sum(
+        len(framed_peer.framer.frame(framed_peer.respond_with_result(r, result)))
+        for r in answered
+    )
+
+    def flush_joined():
+        frame = framed_peer.framer.frame
+        respond = framed_peer.respond_with_result
+        return b"".join([frame(respond(r, result)) for r in answered])
+
+    def flush_chunks():
+        output = framed_peer.output()
+        respond = output.respond_with_result
+        for request in answered:
+            respond(request, result)
+        return output.chunks
+
+    flush_buffer = bytearray()
+    buffer_output = framed_peer.output(flush_buffer)
+
+    def flush_into_buffer():
+        buffer_output.clear()
+        respond = buffer_output.respond_with_result
+        for request in answered:
+            respond(request, result)
+        return flush_buffer
+
+    cases += [
+        Case("output", "flush/joined", flush_joined, FLUSH_COUNT, flush_size),
+        Case("output", "flush/chunks", flush_chunks, FLUSH_COUNT, flush_size),
+        Case("output", "flush/buffer", flush_into_buffer, FLUSH_COUNT, flush_size),
+    ]
+
+    dispatcher = JsonRpcDispatcher()
+    dispatcher.register(lambda id: {"id": id}, name="get_rows")
+    dispatcher.register(
+        lambda id: {"id": id},
+        name="get_rows_checked",
+        schema=ParamsSchema({"id": int}),
+    )
+    server = JsonRpcPeer(codec=codec, request_handler=dispatcher)
+    traced_server = JsonRpcPeer(
+        codec=codec, request_handler=dispatcher, tracer=RequestTracer()
+    )
+    _, call = peer.request("get_rows", PAYLOADS["small"])
+    _, checked_call = peer.request("get_rows_checked", PAYLOADS["small"])
+    _, missing = peer.request("missing", PAYLOADS["small"])
+    cases += [
+        Case(
+            "dispatch", "handle/success", lambda: server.handle(call), size=len(call)
+        ),
+        Case(
+            "dispatch",
+            "handle/schema",
+            lambda: server.handle(checked_call),
+            size=len(checked_call),
+        ),
+        Case(
+            "dispatch",
+            "handle/traced",
+            lambda: traced_server.handle(call),
+            size=len(call),
+        ),
+        Case(
+            "dispatch",
+            "handle/method_not_found",
+            lambda: server.handle(missing),
+            size=len(missing),
+        ),
+    ]
+
+    return cases
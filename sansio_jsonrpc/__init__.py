@@ -1,10 +1,38 @@
 from .main import (
+    EncodedResult,
+    JsonRpcBatch,
+    JsonRpcOutput,
     JsonRpcPeer,
+    JsonRpcPreparedCall,
     JsonRpcRequest,
+    JsonRpcRequestBatch,
     JsonRpcResponse,
+    JsonRpcResponseBatch,
+    LazyJsonRpcRequest,
+    LazyJsonRpcResponse,
 )
+from .dispatch import JsonRpcDispatcher
+from .framing import (
+    ConcatenatedJsonFramer,
+    ContentLengthFramer,
+    Framer,
+    NewlineFramer,
+)
+from .compression import Compression
+from .limits import Limits
+from .metrics import Histogram, PeerMetrics
+from .pending import (
+    PendingRequest,
+    PendingRequests,
+)
+from .proxy import JsonRpcProxy
+from .scheduler import JsonRpcScheduler
+from .schema import ParamsSchema
+from .tracing import RequestTrace, RequestTracer
+from .workers import JsonRpcWorkerPool
 from .exc import (
     JsonRpcApplicationError,
+    JsonRpcDeadlineExceededError,
     JsonRpcError,
     JsonRpcException,
     JsonRpcInvalidParamsError,
@@ -0,0 +1,474 @@
+from __future__ import annotations
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import inspect
+import typing
+
+from .exc import (
+    JsonRpcError,
+    JsonRpcException,
+    JsonRpcInternalError,
+    JsonRpcMethodNotFoundError,
+)
+from .main import (
+    JsonRpcBatch,
+    JsonRpcMessage,
+    JsonRpcPeer,
+    JsonRpcRequest,
+    JsonRpcResponse,
+)
+from .pending import PendingRequests
+from .types import JsonPrimitive, JsonRpcParams
+
+# A request and what its handler returned: a result or an awaitable, and an error.
+_HandlerCall = typing.Tuple[JsonRpcRequest, typing.Any, typing.Optional[JsonRpcError]]
+
+
+class JsonRpcProtocol(asyncio.Protocol):
+    """
+    Runs a :class:`JsonRpcPeer` over an asyncio transport.
+
+    Use it as the protocol of ``loop.create_connection()`` or
+    ``loop.create_server()``. Any number of requests can be in flight at once: each
+    :meth:`request` registers a future in the peer's pending-request tracker and the
+    future is resolved when a response with the same ID arrives, in any order.
+
+    Received requests are passed to the peer's request handler. If the handler returns
+    an awaitable, it runs as a task, so slow requests do not hold up the rest of the
+    connection. Outgoing frames are queued and written with one ``writelines()`` call
+    per event loop iteration, so a burst of requests or responses costs one system
+    call rather than one per frame.
+
+    Back pressure uses the transport's write buffer limits. Above the high water mark,
+    :meth:`request`, :meth:`notify`, and :meth:`drain` wait until the buffer drains
+    below the low water mark. While the buffer is full, or while ``max_tasks``
+    handler tasks are running, the protocol also stops reading, which tells the remote
+    peer to slow down. It never stops reading while its own requests are waiting for
+    responses, because then neither side could make progress.
+    """
+
+    def __init__(
+        self,
+        peer: typing.Optional[JsonRpcPeer] = None,
+        *,
+        write_high_water: int = 64 * 1024,
+        write_low_water: typing.Optional[int] = None,
+        max_tasks: int = 1024,
+    ):
+        """
+        Constructor
+
+        :param peer: The peer that encodes and parses messages, and whose request
+            handler answers received requests. It needs a pending-request tracker to
+            send requests. Defaults to a peer with a tracker and no request handler.
+            Each connection needs its own peer.
+        :param write_high_water: The size of the transport's write buffer, in bytes,
+            above which writing is paused.
+        :param write_low_water: The size below which writing resumes. Defaults to a
+            quarter of the high water mark.
+        :param max_tasks: The number of handler tasks above which reading is paused.
+            Reading resumes when half of them have finished.
+        """
+        self._peer = peer or JsonRpcPeer(pending=PendingRequests())
+        self._write_high_water = write_high_water
+        self._write_low_water = (
+            write_high_water // 4 if write_low_water is None else write_low_water
+        )
+        self._max_tasks = max_tasks
+        self._loop: typing.Optional[asyncio.AbstractEventLoop] = None
+        self._transport: typing.Optional[asyncio.Transport] = None
+        self._outbox: typing.List[bytes] = []
+        self._outbox_size = 0
+        self._flush_scheduled = False
+        self._writing_paused = False
+        self._reading_paused = False
+        self._drain_waiters: typing.Deque[asyncio.Future] = collections.deque()
+        self._tasks: typing.Set[asyncio.Future] = set()
+        self._timer: typing.Optional[asyncio.TimerHandle] = None
+        self._timer_deadline = 0.0
+        self._closed: typing.Optional[asyncio.Future] = None
+
+    @property
+    def peer(self) -> JsonRpcPeer:
+        """ The peer that encodes and parses messages. """
+        return self._peer
+
+    @property
+    def transport(self) -> typing.Optional[asyncio.Transport]:
+        """ The transport, or None if the connection is not made yet. """
+        return self._transport
+
+    async def request(
+        self,
+        method: str,
+        params: typing.Optional[JsonRpcParams] = None,
+        *,
+        timeout: typing.Optional[float] = None,
+    ) -> JsonPrimitive:
+        """
+        Send a request and wait for its result.
+
+        :param timeout: Seconds until the request expires, see
+            :meth:`JsonRpcPeer.request`.
+        :returns: the result of the response
+        :raises JsonRpcException: if the response is an error, using the subclass
+            that is registered for its code
+        :raises asyncio.TimeoutError: if the request expires without a response
+        :raises ConnectionError: if the connection is closed
+        :raises RuntimeError: if the peer does not have a pending-request tracker
+        """
+        pending = self._peer.pending
+        if pending is None:
+            raise RuntimeError("Requests require a pending-request tracker.")
+        await self.drain()
+        loop = typing.cast(asyncio.AbstractEventLoop, self._loop)
+        request_id, data = self._peer.request(method, params, timeout=timeout)
+        future = loop.create_future()
+        entry = pending.get(request_id)
+        if entry is not None:
+            entry.context = future
+            if entry.deadline is not None:
+                self._arm_timer(entry.deadline)
+        self._send(data)
+        if self._reading_paused:
+            self._update_reading()
+        try:
+            return await future
+        except asyncio.CancelledError:
+            pending.cancel(request_id)
+            raise
+
+    async def notify(
+        self, method: str, params: typing.Optional[JsonRpcParams] = None
+    ) -> None:
+        """
+        Send a notification.
+
+        :raises ConnectionError: if the connection is closed
+        """
+        await self.drain()
+        self._send(self._peer.notify(method, params))
+
+    async def drain(self) -> None:
+        """
+        Wait until the transport's write buffer is below the low water mark.
+
+        :raises ConnectionError: if the connection is closed
+        """
+        if self._writing_paused:
+            waiter = typing.cast(asyncio.AbstractEventLoop, self._loop).create_future()
+            self._drain_waiters.append(waiter)
+            await waiter
+        transport = self._transport
+        if transport is None or transport.is_closing():
+            raise ConnectionError("The connection is closed.")
+
+    def close(self) -> None:
+        """ Close the transport after the queued frames are written. """
+        if self._transport is not None:
+            self._flush()
+            self._transport.close()
+
+    async def wait_closed(self) -> None:
+        """ Wait until the connection is lost. """
+        if self._closed is not None:
+            await asyncio.shield(self._closed)
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        """ Called by the transport when the connection is made. """
+        self._loop = asyncio.get_running_loop()
+        self._transport = typing.cast(asyncio.Transport, transport)
+        self._transport.set_write_buffer_limits(
+            self._write_high_water, self._write_low_water
+        )
+        self._closed = self._loop.create_future()
+
+    def connection_lost(self, exc: typing.Optional[Exception]) -> None:
+        """ Called by the transport when the connection is lost. """
+        self._outbox = []
+        self._outbox_size = 0
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending = self._peer.pending
+        if pending is not None:
+            for request in pending:
+                pending.cancel(request.id)
+                if request.context is not None and not request.context.done():
+                    request.context.set_exception(
+                        ConnectionError("The connection was lost.")
+                    )
+        while self._drain_waiters:
+            waiter = self._drain_waiters.popleft()
+            if not waiter.done():
+                waiter.set_exception(ConnectionError("The connection was lost."))
+        for task in list(self._tasks):
+            task.cancel()
+        if self._closed is not None and not self._closed.done():
+            self._closed.set_result(None)
+
+    def pause_writing(self) -> None:
+        """ Called by the transport when its write buffer exceeds the high water. """
+        self._writing_paused = True
+        self._update_reading()
+
+    def resume_writing(self) -> None:
+        """ Called by the transport when its write buffer drains to the low water. """
+        self._writing_paused = False
+        while self._drain_waiters and not self._writing_paused:
+            waiter = self._drain_waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+        self._update_reading()
+
+    def data_received(self, data: bytes) -> None:
+        """ Called by the transport with received bytes. """
+        peer = self._peer
+        frames = peer.feed_frames(data)
+        buffered = None
+        while True:
+            try:
+                for messages in frames:
+                    if isinstance(messages, JsonRpcBatch):
+                        self._dispatch_batch(messages)
+                    else:
+                        for message in messages:
+                            self._dispatch(message)
+                return
+            except JsonRpcException as exc:
+                self._send(peer.respond_with_error(None, exc.get_error()))
+            # If the framer cannot make progress past the error, the stream is lost.
+            if peer.framer.buffered == buffered:
+                self.close()
+                return
+            buffered = peer.framer.buffered
+            frames = peer.feed_frames(b"")
+
+    def _dispatch(self, message: JsonRpcMessage) -> None:
+        """ Resolve a response's future, or pass a request to the handler. """
+        if isinstance(message, JsonRpcResponse):
+            self._resolve(message)
+            return
+        request = typing.cast(JsonRpcRequest, message)
+        result, error = self._call_handler(request)
+        if error is None and inspect.isawaitable(result):
+            self._spawn(result, functools.partial(self._respond_later, request))
+        elif not request.is_notification:
+            self._send(self._respond(request, result, error))
+
+    def _dispatch_batch(self, batch: JsonRpcBatch) -> None:
+        """ Handle the messages of a received batch, and answer it as one batch. """
+        calls: typing.List[_HandlerCall] = []
+        awaitables = []
+        for message in batch:
+            if isinstance(message, JsonRpcResponse):
+                self._resolve(message)
+                continue
+            request = typing.cast(JsonRpcRequest, message)
+            result, error = self._call_handler(request)
+            if error is None and inspect.isawaitable(result):
+                awaitables.append(result)
+            calls.append((request, result, error))
+        if awaitables:
+            loop = typing.cast(asyncio.AbstractEventLoop, self._loop)
+            futures = [asyncio.ensure_future(a, loop=loop) for a in awaitables]
+            gathered = asyncio.gather(*futures, return_exceptions=True)
+            self._spawn(
+                gathered, functools.partial(self._respond_batch_later, batch, calls)
+            )
+        else:
+            self._respond_batch(batch, calls)
+
+    def _resolve(self, response: JsonRpcResponse) -> None:
+        """ Resolve the future of the request that a response answers. """
+        pending = self._peer.pending
+        request = None if pending is None else pending.match(response)
+        if request is None or request.context is None or request.context.done():
+            return
+        if response.success:
+            request.context.set_result(response.result)
+        else:
+            error = typing.cast(JsonRpcError, response.error)
+            request.context.set_exception(JsonRpcException.exc_from_error(error))
+
+    def _call_handler(
+        self, request: JsonRpcRequest
+    ) -> typing.Tuple[typing.Any, typing.Optional[JsonRpcError]]:
+        """
+        Call the request handler, which may return an awaitable or a
+        ``concurrent.futures.Future``, e.g. if it is a :class:`JsonRpcWorkerPool`.
+        """
+        handler = self._peer._request_handler
+        if handler is None:
+            return None, JsonRpcMethodNotFoundError().get_error()
+        result, error = JsonRpcPeer._call_handler(handler, request)
+        if isinstance(result, concurrent.futures.Future):
+            result = asyncio.wrap_future(result, loop=self._loop)
+        return result, error
+
+    @staticmethod
+    def _outcome(
+        result: typing.Any, exc: typing.Optional[BaseException]
+    ) -> typing.Tuple[JsonPrimitive, typing.Optional[JsonRpcError]]:
+        """ Convert what an asynchronous handler returned or raised, like a call. """
+        if exc is None:
+            return result, None
+        if isinstance(exc, JsonRpcException):
+            return None, exc.get_error()
+        return None, JsonRpcInternalError().get_error()
+
+    def _respond_later(self, request: JsonRpcRequest, task: asyncio.Future) -> None:
+        """ Send the response of an asynchronous handler once it is done. """
+        if request.is_notification:
+            return
+        exc = task.exception()
+        result = task.result() if exc is None else None
+        self._send(self._respond(request, *self._outcome(result, exc)))
+
+    def _respond_batch_later(
+        self,
+        batch: JsonRpcBatch,
+        calls: typing.List[_HandlerCall],
+        gathered: asyncio.Future,
+    ) -> None:
+        """ Send the responses to a batch once its asynchronous handlers are done. """
+        outcomes = iter(gathered.result())
+        for index, (request, result, error) in enumerate(calls):
+            if error is None and inspect.isawaitable(result):
+                outcome = next(outcomes)
+                if isinstance(outcome, BaseException):
+                    calls[index] = (request, *self._outcome(None, outcome))
+                else:
+                    calls[index] = (request, outcome, None)
+        self._respond_batch(batch, calls)
+
+    def _respond(
+        self,
+        request: JsonRpcRequest,
+        result: JsonPrimitive,
+        error: typing.Optional[JsonRpcError],
+    ) -> bytes:
+        """ Encode the response to a request, as :meth:`JsonRpcPeer.handle` does. """
+        peer = self._peer
+        if error is None:
+            try:
+                return peer.respond_with_result(request, result)
+            except JsonRpcException as exc:
+                error = exc.get_error()
+        return peer.respond_with_error(request, error)
+
+    def _respond_batch(
+        self, batch: JsonRpcBatch, calls: typing.List[_HandlerCall]
+    ) -> None:
+        """ Encode and send the responses to a batch, if there are any. """
+        response_batch = self._peer.response_batch(batch)
+        for request, result, error in calls:
+            if error is None:
+                try:
+                    response_batch.add_result(request, result)
+                    continue
+                except JsonRpcException as exc:
+                    error = exc.get_error()
+            response_batch.add_error(request, error)
+        data = response_batch.encode()
+        if data:
+            self._send(data)
+
+    def _spawn(
+        self,
+        awaitable: typing.Awaitable,
+        callback: typing.Callable[[asyncio.Future], None],
+    ) -> None:
+        """
+        Run a handler as a task and call back with it when it is done, unless it is
+        cancelled. Reading stops if there are too many tasks.
+        """
+        task = asyncio.ensure_future(awaitable, loop=self._loop)
+        self._tasks.add(task)
+        task.add_done_callback(functools.partial(self._task_done, callback))
+        if len(self._tasks) >= self._max_tasks:
+            self._update_reading()
+
+    def _task_done(
+        self, callback: typing.Callable[[asyncio.Future], None], task: asyncio.Future
+    ) -> None:
+        """ Forget a finished handler task, and resume reading if it was paused. """
+        self._tasks.discard(task)
+        if not task.cancelled():
+            callback(task)
+        if self._reading_paused:
+            self._update_reading()
+
+    def _send(self, data: bytes) -> None:
+        """
+        Queue a frame, to be written at the end of this event loop iteration.
+
+        If the queue exceeds the high water mark first, it is written right away, so
+        that a caller that sends in a loop without yielding still sees back pressure.
+        """
+        for chunk in self._peer.framer.frame_chunks(data):
+            self._outbox.append(chunk)
+            self._outbox_size += len(chunk)
+        if self._outbox_size > self._write_high_water:
+            self._flush()
+        elif not self._flush_scheduled:
+            self._flush_scheduled = True
+            typing.cast(asyncio.AbstractEventLoop, self._loop).call_soon(self._flush)
+
+    def _flush(self) -> None:
+        """ Write every queued frame with one call. """
+        self._flush_scheduled = False
+        outbox = self._outbox
+        if not outbox:
+            return
+        self._outbox = []
+        self._outbox_size = 0
+        transport = self._transport
+        if transport is not None and not transport.is_closing():
+            transport.writelines(outbox)
+
+    def _update_reading(self) -> None:
+        """ Pause or resume reading according to the class docstring. """
+        transport = self._transport
+        if transport is None or transport.is_closing():
+            return
+        pending = self._peer.pending
+        waiting = pending is not None and len(pending) > 0
+        if self._reading_paused:
+            if waiting or (
+                not self._writing_paused and len(self._tasks) <= self._max_tasks // 2
+            ):
+                self._reading_paused = False
+                transport.resume_reading()
+        elif not waiting and (
+            self._writing_paused or len(self._tasks) >= self._max_tasks
+        ):
+            self._reading_paused = True
+            transport.pause_reading()
+
+    def _arm_timer(self, deadline: float) -> None:
+        """ Make sure that the expiry timer fires by a request's deadline. """
+        if self._timer is not None:
+            if self._timer_deadline <= deadline:
+                return
+            self._timer.cancel()
+        pending = typing.cast(PendingRequests, self._peer.pending)
+        delay = max(0.0, deadline - pending.clock())
+        loop = typing.cast(asyncio.AbstractEventLoop, self._loop)
+        self._timer = loop.call_later(delay, self._expire)
+        self._timer_deadline = deadline
+
+    def _expire(self) -> None:
+        """ Fail the futures of expired requests, and rearm the timer. """
+        self._timer = None
+        pending = typing.cast(PendingRequests, self._peer.pending)
+        for request in pending.expire():
+            if request.context is not None and not request.context.done():
+                request.context.set_exception(
+                    asyncio.TimeoutError(f"Request {request.id!r} timed out.")
+                )
+        deadline = pending.next_deadline()
+        if deadline is not None:
+            self._arm_timer(deadline)
@@ -0,0 +1,354 @@
+from __future__ import annotations
+import struct
+import typing
+
+from .codec import JsonCodec
+from .exc import JsonRpcParseError
+
+try:
+    import msgpack  # type: ignore
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+
+_pack_double = struct.Struct(">Bd").pack
+_unpack_double = struct.Struct(">d").unpack_from
+_unpack_float = struct.Struct(">f").unpack_from
+_unpack_u16 = struct.Struct(">H").unpack_from
+_unpack_u32 = struct.Struct(">I").unpack_from
+_unpack_u64 = struct.Struct(">Q").unpack_from
+_unpack_i8 = struct.Struct(">b").unpack_from
+_unpack_i16 = struct.Struct(">h").unpack_from
+_unpack_i32 = struct.Struct(">i").unpack_from
+_unpack_i64 = struct.Struct(">q").unpack_from
+
+# The headers for small values, indexed by length or value.
+_FIXSTR = [bytes((0xA0 | n,)) for n in range(32)]
+_FIXARRAY = [bytes((0x90 | n,)) for n in range(16)]
+_FIXMAP = [bytes((0x80 | n,)) for n in range(16)]
+_FIXINT = [bytes((n,)) for n in range(128)]
+_FLOAT_TYPES = {float}
+_INT_TYPES = {int}
+
+
+def _encode(obj: typing.Any, out: bytearray) -> None:
+    """ Append a serialized value to ``out``. """
+    type_ = type(obj)
+    if type_ is str:
+        _encode_str(obj, out)
+    elif type_ is int:
+        if 0 <= obj < 128:
+            out += _FIXINT[obj]
+        else:
+            _encode_int(obj, out)
+    elif type_ is dict:
+        size = len(obj)
+        if size < 16:
+            out += _FIXMAP[size]
+        elif size < 0x10000:
+            out += b"\xde" + size.to_bytes(2, "big")
+        else:
+            out += b"\xdf" + size.to_bytes(4, "big")
+        for key, value in obj.items():
+            if type(key) is not str:
+                raise TypeError(f"Object keys must be strings, not {key!r}")
+            _encode_str(key, out)
+            _encode(value, out)
+    elif type_ is list or type_ is tuple:
+        size = len(obj)
+        if size < 16:
+            out += _FIXARRAY[size]
+        elif size < 0x10000:
+            out += b"\xdc" + size.to_bytes(2, "big")
+        else:
+            out += b"\xdd" + size.to_bytes(4, "big")
+        if size >= 8 and _encode_numbers(obj, out):
+            return
+        for item in obj:
+            _encode(item, out)
+    elif type_ is float:
+        out += _pack_double(0xCB, obj)
+    elif obj is None:
+        out += b"\xc0"
+    elif obj is True:
+        out += b"\xc3"
+    elif obj is False:
+        out += b"\xc2"
+    elif isinstance(obj, str):
+        _encode(str(obj), out)
+    elif isinstance(obj, int):
+        _encode(int(obj), out)
+    elif isinstance(obj, dict):
+        _encode(dict(obj), out)
+    elif isinstance(obj, (list, tuple)):
+        _encode(list(obj), out)
+    else:
+        raise TypeError(f"Type is not JSON serializable: {type_.__name__}")
+
+
+def _encode_numbers(obj: typing.Sequence, out: bytearray) -> bool:
+    """
+    Append the items of an array that only contains floats, or only contains small
+    non-negative integers, in a single C call.
+
+    :returns: False, without appending anything, for any other array
+    """
+    types = set(map(type, obj))
+    if types == _FLOAT_TYPES:
+        args = [0xCB] * (2 * len(obj))
+        args[1::2] = obj
+        out += struct.pack(">" + "Bd" * len(obj), *args)
+        return True
+    if types == _INT_TYPES and min(obj) >= 0 and max(obj) < 128:
+        out += bytes(obj)
+        return True
+    return False
+
+
+def _encode_str(obj: str, out: bytearray) -> None:
+    """ Append a serialized string to ``out``. """
+    data = obj.encode("utf8")
+    size = len(data)
+    if size < 32:
+        out += _FIXSTR[size]
+    elif size < 0x100:
+        out += b"\xd9" + size.to_bytes(1, "big")
+    elif size < 0x10000:
+        out += b"\xda" + size.to_bytes(2, "big")
+    else:
+        out += b"\xdb" + size.to_bytes(4, "big")
+    out += data
+
+
+def _encode_int(obj: int, out: bytearray) -> None:
+    """ Append a serialized integer that is not a positive fixint to ``out``. """
+    if obj >= 0:
+        if obj < 0x100:
+            out += b"\xcc" + obj.to_bytes(1, "big")
+        elif obj < 0x10000:
+            out += b"\xcd" + obj.to_bytes(2, "big")
+        elif obj < 0x100000000:
+            out += b"\xce" + obj.to_bytes(4, "big")
+        elif obj < 0x10000000000000000:
+            out += b"\xcf" + obj.to_bytes(8, "big")
+        else:
+            raise TypeError("Integer is too large for MessagePack")
+    elif obj >= -32:
+        out += obj.to_bytes(1, "big", signed=True)
+    elif obj >= -0x80:
+        out += b"\xd0" + obj.to_bytes(1, "big", signed=True)
+    elif obj >= -0x8000:
+        out += b"\xd1" + obj.to_bytes(2, "big", signed=True)
+    elif obj >= -0x80000000:
+        out += b"\xd2" + obj.to_bytes(4, "big", signed=True)
+    elif obj >= -0x8000000000000000:
+        out += b"\xd3" + obj.to_bytes(8, "big", signed=True)
+    else:
+        raise TypeError("Integer is too large for MessagePack")
+
+
+class _InvalidFormat(Exception):
+    """ Raised inside the decoder for data that is not a JSON value. """
+
+
+def _decode(
+    data: typing.Union[bytes, bytearray], pos: int
+) -> typing.Tuple[typing.Any, int]:
+    """ Deserialize the value at ``pos`` and return it with the offset after it. """
+    byte = data[pos]
+    pos += 1
+    if byte < 0x80:
+        return byte, pos
+    if byte >= 0xE0:
+        return byte - 0x100, pos
+    if byte < 0xC0:
+        kind = byte & 0xF0
+        if kind == 0x80:
+            return _decode_map(data, pos, byte & 0x0F)
+        if kind == 0x90:
+            return _decode_array(data, pos, byte & 0x0F)
+        end = pos + (byte & 0x1F)
+        return data[pos:end].decode("utf8"), end
+    if byte == 0xC0:
+        return None, pos
+    if byte == 0xC2:
+        return False, pos
+    if byte == 0xC3:
+        return True, pos
+    if byte == 0xCB:
+        return _unpack_double(data, pos)[0], pos + 8
+    if byte == 0xCA:
+        return _unpack_float(data, pos)[0], pos + 4
+    if byte == 0xCC:
+        return data[pos], pos + 1
+    if byte == 0xCD:
+        return _unpack_u16(data, pos)[0], pos + 2
+    if byte == 0xCE:
+        return _unpack_u32(data, pos)[0], pos + 4
+    if byte == 0xCF:
+        return _unpack_u64(data, pos)[0], pos + 8
+    if byte == 0xD0:
+        return _unpack_i8(data, pos)[0], pos + 1
+    if byte == 0xD1:
+        return _unpack_i16(data, pos)[0], pos + 2
+    if byte == 0xD2:
+        return _unpack_i32(data, pos)[0], pos + 4
+    if byte == 0xD3:
+        return _unpack_i64(data, pos)[0], pos + 8
+    if byte == 0xD9:
+        end = pos + 1 + data[pos]
+        return data[pos + 1 : end].decode("utf8"), end
+    if byte == 0xDA:
+        end = pos + 2 + _unpack_u16(data, pos)[0]
+        return data[pos + 2 : end].decode("utf8"), end
+    if byte == 0xDB:
+        end = pos + 4 + _unpack_u32(data, pos)[0]
+        return data[pos + 4 : end].decode("utf8"), end
+    if byte == 0xDC:
+        return _decode_array(data, pos + 2, _unpack_u16(data, pos)[0])
+    if byte == 0xDD:
+        return _decode_array(data, pos + 4, _unpack_u32(data, pos)[0])
+    if byte == 0xDE:
+        return _decode_map(data, pos + 2, _unpack_u16(data, pos)[0])
+    if byte == 0xDF:
+        return _decode_map(data, pos + 4, _unpack_u32(data, pos)[0])
+    # Binary data, extension types, and the unused byte have no JSON equivalent.
+    raise _InvalidFormat()
+
+
+def _decode_array(
+    data: typing.Union[bytes, bytearray], pos: int, size: int
+) -> typing.Tuple[list, int]:
+    """ Deserialize ``size`` array items starting at ``pos``. """
+    if size >= 8:
+        # Arrays of doubles or positive fixints are decoded in a single C call.
+        first = data[pos]
+        if first == 0xCB:
+            end = pos + 9 * size
+            if data[pos:end:9] == b"\xcb" * size and end <= len(data):
+                return list(struct.unpack_from(">" + "xd" * size, data, pos)), end
+        elif first < 0x80:
+            end = pos + size
+            if end <= len(data) and data[pos:end].isascii():
+                return list(data[pos:end]), end
+    items: typing.List[typing.Any] = []
+    append = items.append
+    for _ in range(size):
+        byte = data[pos]
+        if byte < 0x80:
+            append(byte)
+            pos += 1
+        elif 0xA0 <= byte < 0xC0:
+            end = pos + 1 + (byte & 0x1F)
+            append(data[pos + 1 : end].decode("utf8"))
+            pos = end
+        else:
+            item, pos = _decode(data, pos)
+            append(item)
+    return items, pos
+
+
+def _decode_map(
+    data: typing.Union[bytes, bytearray], pos: int, size: int
+) -> typing.Tuple[dict, int]:
+    """ Deserialize ``size`` map entries starting at ``pos``. """
+    obj: typing.Dict[str, typing.Any] = dict()
+    for _ in range(size):
+        # Keys are usually short strings, and values are often short strings or small
+        # integers, so those are decoded here without a function call.
+        byte = data[pos]
+        if 0xA0 <= byte < 0xC0:
+            end = pos + 1 + (byte & 0x1F)
+            key = data[pos + 1 : end].decode("utf8")
+            pos = end
+        else:
+            key, pos = _decode(data, pos)
+            if type(key) is not str:
+                raise _InvalidFormat()
+        byte = data[pos]
+        if byte < 0x80:
+            obj[key] = byte
+            pos += 1
+        elif 0xA0 <= byte < 0xC0:
+            end = pos + 1 + (byte & 0x1F)
+            obj[key] = data[pos + 1 : end].decode("utf8")
+            pos = end
+        else:
+            obj[key], pos = _decode(data, pos)
+    return obj, pos
+
+
+class PureMsgpackCodec(JsonCodec):
+    """
+    A codec for MessagePack, implemented in pure Python.
+
+    MessagePack carries the same values as JSON in a compact binary form: numbers are
+    stored in binary instead of as decimal text, and strings are length-prefixed
+    instead of escaped. Only the types that JSON has are supported. Integers must fit
+    in 64 bits, and floats are always encoded with double precision, so that every
+    value survives a round trip exactly. The output is identical to
+    :class:`MsgpackCodec`, so the two can talk to each other.
+    """
+
+    name = "msgpack (pure)"
+    binary = True
+
+    def encode(self, obj: typing.Any) -> bytes:
+        """ Serialize a JSON value. """
+        out = bytearray()
+        _encode(obj, out)
+        return bytes(out)
+
+    def decode(self, data: typing.Union[bytes, bytearray]) -> typing.Any:
+        """ Deserialize a JSON value. """
+        try:
+            obj, end = _decode(data, 0)
+        except UnicodeDecodeError:
+            raise JsonRpcParseError("Invalid ASCII encoding")
+        except (_InvalidFormat, IndexError, struct.error, RecursionError):
+            raise JsonRpcParseError("Invalid MessagePack format")
+        if end != len(data):
+            raise JsonRpcParseError("Invalid MessagePack format")
+        return obj
+
+
+class MsgpackCodec(JsonCodec):
+    """
+    A codec for MessagePack that uses the optional ``msgpack`` package.
+
+    The package has a C extension that is much faster than :class:`PureMsgpackCodec`.
+    Install it with the ``binary`` extra, i.e. ``pip install sansio-jsonrpc[binary]``.
+    """
+
+    name = "msgpack"
+    binary = True
+
+    def __init__(self) -> None:
+        """ Constructor. """
+        if msgpack is None:
+            raise RuntimeError("MsgpackCodec requires the msgpack package.")
+
+    def encode(self, obj: typing.Any) -> bytes:
+        """ Serialize a JSON value. """
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def decode(self, data: typing.Union[bytes, bytearray]) -> typing.Any:
+        """ Deserialize a JSON value. """
+        try:
+            return msgpack.unpackb(data, raw=False, ext_hook=_reject_ext)
+        except UnicodeDecodeError:
+            raise JsonRpcParseError("Invalid ASCII encoding")
+        except (ValueError, TypeError, msgpack.UnpackException):
+            raise JsonRpcParseError("Invalid MessagePack format")
+
+
+def _reject_ext(code: int, data: bytes) -> typing.NoReturn:
+    """ Extension types have no JSON equivalent. """
+    raise ValueError("Extension types are not supported")
+
+
+def default_binary_codec() -> JsonCodec:
+    """ Return the fastest MessagePack codec that is installed. """
+    if msgpack is not None:
+        return MsgpackCodec()
+    return PureMsgpackCodec()
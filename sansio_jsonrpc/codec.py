@@ -0,0 +1,107 @@
+from __future__ import annotations
+import json
+import typing
+
+from .exc import JsonRpcParseError
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
+
+
+class JsonCodec:
+    """
+    A base class for converting between JSON values and their network representation.
+
+    Both directions work on ``bytes`` so that a backend which reads and writes UTF-8
+    natively never has to build an intermediate ``str``. Pass an instance to
+    :class:`JsonRpcPeer` to choose a backend explicitly.
+    """
+
+    #: A short name that identifies the backend, e.g. in benchmark output.
+    name: str = ""
+    #: True if the network representation is not JSON text, so that features which
+    #: scan the encoded text, such as lazy parsing, do not apply.
+    binary: bool = False
+
+    def encode(self, obj: typing.Any) -> bytes:
+        """ Serialize a JSON value. """
+        raise NotImplementedError()
+
+    def decode(self, data: typing.Union[bytes, bytearray]) -> typing.Any:
+        """
+        Deserialize a JSON value.
+
+        :raises JsonRpcParseError: if the data is not valid UTF-8 or not valid JSON
+        """
+        raise NotImplementedError()
+
+    def __repr__(self) -> str:
+        """ Return string representation. """
+        return f"{self.__class__.__name__}()"
+
+
+class StdlibJsonCodec(JsonCodec):
+    """
+    A codec that uses the standard library's ``json`` module.
+
+    The output uses compact separators. Input bytes are passed straight to
+    ``json.loads``, which decodes them in the same pass that parses them.
+    """
+
+    name = "json"
+
+    def __init__(self) -> None:
+        """ Constructor. """
+        self._encode = json.JSONEncoder(separators=(",", ":")).encode
+
+    def encode(self, obj: typing.Any) -> bytes:
+        """ Serialize a JSON value. """
+        return self._encode(obj).encode("utf8")
+
+    def decode(self, data: typing.Union[bytes, bytearray]) -> typing.Any:
+        """ Deserialize a JSON value. """
+        try:
+            return json.loads(data)
+        except UnicodeDecodeError:
+            raise JsonRpcParseError("Invalid ASCII encoding")
+        except (ValueError, RecursionError):
+            # The decoder recurses once per level of nesting.
+            raise JsonRpcParseError("Invalid JSON format")
+
+
+class OrjsonCodec(JsonCodec):
+    """
+    A codec that uses the optional ``orjson`` package.
+
+    ``orjson`` reads and writes UTF-8 bytes directly. Install it with the ``fast``
+    extra, i.e. ``pip install sansio-jsonrpc[fast]``.
+    """
+
+    name = "orjson"
+
+    def __init__(self) -> None:
+        """ Constructor. """
+        if orjson is None:
+            raise RuntimeError("OrjsonCodec requires the orjson package.")
+
+    def encode(self, obj: typing.Any) -> bytes:
+        """ Serialize a JSON value. """
+        return orjson.dumps(obj)
+
+    def decode(self, data: typing.Union[bytes, bytearray]) -> typing.Any:
+        """ Deserialize a JSON value. """
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError as exc:
+            if "UTF-8" in str(exc):
+                raise JsonRpcParseError("Invalid ASCII encoding")
+            raise JsonRpcParseError("Invalid JSON format")
+
+
+def default_codec() -> JsonCodec:
+    """ Return the fastest codec that is installed. """
+    if orjson is not None:
+        return OrjsonCodec()
+    return StdlibJsonCodec()
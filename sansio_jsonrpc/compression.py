@@ -0,0 +1,122 @@
+from __future__ import annotations
+import typing
+import zlib
+
+from .codec import JsonCodec, default_codec
+from .exc import JsonRpcInvalidRequestError, JsonRpcParseError
+from .types import JsonDict
+
+#: The first byte of a compressed frame. It never starts a JSON text, a UTF-8 string,
+#: or a MessagePack value, so compressed and uncompressed frames can share a stream.
+COMPRESSED_FLAG = b"\xc1"
+
+# zlib uses at most the last 32 KiB of a preset dictionary.
+_MAX_DICTIONARY = 32768
+
+# The envelopes that occur in every stream, with members in the same order as
+# to_json_dict(). They go at the end of the dictionary, where matches are cheapest.
+_TEMPLATES: typing.Tuple[JsonDict, ...] = (
+    {"id": 0, "jsonrpc": "2.0", "error": {"code": -32600, "message": ""}},
+    {"id": 0, "jsonrpc": "2.0", "result": None},
+    {"method": "", "jsonrpc": "2.0", "id": 0, "params": []},
+    {"method": "", "jsonrpc": "2.0", "params": {}},
+)
+
+
+class Compression:
+    """
+    Compresses frames with zlib and a preset dictionary of common message parts.
+
+    Pass an instance to :class:`JsonRpcPeer` to compress each frame that it encodes and
+    decompress each frame that it parses. Small frames gain little from compression,
+    so frames below the threshold are sent as they are, as are frames that would not
+    shrink. A compressed frame starts with :data:`COMPRESSED_FLAG`, so a peer can
+    receive both kinds of frame on the same stream.
+
+    The dictionary primes the compressor with the envelope of each message kind and
+    with method names and keys that the application passes in, so even a short frame
+    compresses well. Both peers must build the same dictionary: a frame that was
+    compressed with a different dictionary fails to parse.
+
+    Compressed frames are binary, so they need a length-prefixed framer such as
+    :class:`ContentLengthFramer`.
+    """
+
+    def __init__(
+        self,
+        methods: typing.Iterable[str] = (),
+        *,
+        keys: typing.Iterable[str] = (),
+        threshold: int = 256,
+        level: int = 6,
+        codec: typing.Optional[JsonCodec] = None,
+    ):
+        """
+        Constructor
+
+        :param methods: Method names to add to the dictionary, most common last.
+        :param keys: Member names of params and results to add to the dictionary, most
+            common last.
+        :param threshold: Frames smaller than this many bytes are not compressed.
+        :param level: The zlib compression level, from 1 (fastest) to 9 (smallest).
+        :param codec: The codec used by the peer, which encodes the dictionary's
+            sample messages. Defaults to the default JSON codec.
+        """
+        codec = codec or default_codec()
+        samples = [codec.encode({key: 0}) for key in keys]
+        for method in methods:
+            samples.append(codec.encode({"method": method, "jsonrpc": "2.0", "id": 0}))
+        samples.extend(codec.encode(template) for template in _TEMPLATES)
+        #: The preset dictionary, which must be the same on both peers.
+        self.dictionary = b"".join(samples)[-_MAX_DICTIONARY:]
+        self.threshold = threshold
+        self._level = level
+
+    def compress(self, data: bytes) -> bytes:
+        """
+        Compress a frame if it is large enough and if compression makes it smaller.
+
+        :returns: the compressed frame with its flag, or the original frame
+        """
+        if len(data) < self.threshold:
+            return data
+        # A new compressor is cheaper than copying a primed one, which copies its
+        # whole window.
+        compressor = zlib.compressobj(
+            self._level,
+            zlib.DEFLATED,
+            zlib.MAX_WBITS,
+            zlib.DEF_MEM_LEVEL,
+            zlib.Z_DEFAULT_STRATEGY,
+            self.dictionary,
+        )
+        compressed = compressor.compress(data) + compressor.flush()
+        if len(compressed) + 1 >= len(data):
+            return data
+        return COMPRESSED_FLAG + compressed
+
+    def decompress(self, data: bytes, max_size: typing.Optional[int] = None) -> bytes:
+        """
+        Decompress a frame if it has the compressed flag.
+
+        :param max_size: The maximum size of the decompressed frame. Decompression
+            stops as soon as the output exceeds it, so a small frame cannot expand into
+            an unbounded amount of memory.
+        :returns: the decompressed frame, or the original frame
+        :raises JsonRpcParseError: if the frame is not valid zlib data, or if it was
+            compressed with a different dictionary
+        :raises JsonRpcInvalidRequestError: if the frame exceeds ``max_size`` bytes
+        """
+        if data[:1] != COMPRESSED_FLAG:
+            return data
+        decompressor = zlib.decompressobj(zdict=self.dictionary)
+        limit = 0 if max_size is None else max_size + 1
+        try:
+            decompressed = decompressor.decompress(memoryview(data)[1:], limit)
+        except zlib.error:
+            raise JsonRpcParseError("Invalid compressed frame") from None
+        if max_size is not None and len(decompressed) > max_size:
+            raise JsonRpcInvalidRequestError(f"Message exceeds {max_size} bytes.")
+        if not decompressor.eof or decompressor.unused_data:
+            raise JsonRpcParseError("Invalid compressed frame")
+        return decompressed
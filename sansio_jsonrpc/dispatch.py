@@ -0,0 +1,288 @@
+from __future__ import annotations
+import inspect
+import typing
+
+from .envelope import scan_members
+from .exc import JsonRpcInvalidParamsError, JsonRpcMethodNotFoundError
+from .main import JsonRpcRequest, LazyJsonRpcRequest
+from .schema import ParamsSchema, compile_schema
+from .streaming import iter_items
+from .types import JsonPrimitive, JsonRpcParams
+
+
+Binder = typing.Callable[[typing.Optional[JsonRpcParams]], JsonPrimitive]
+Route = typing.Callable[[JsonRpcRequest], JsonPrimitive]
+Handler = typing.TypeVar("Handler", bound=typing.Callable[..., typing.Any])
+
+
+def _invalid_params_message(name: str) -> str:
+    """
+    Return the message of the error for params that do not fit a method.
+
+    The message is interned, so that the error is not allocated for each bad call, and
+    peers cache its encoding.
+    """
+    message = f"Invalid params for method {name!r}"
+    JsonRpcInvalidParamsError.intern(message)
+    return message
+
+
+def compile_binder(
+    name: str,
+    func: typing.Callable[..., typing.Any],
+    schema: typing.Optional[ParamsSchema] = None,
+) -> Binder:
+    """
+    Inspect a function's signature once and return a closure that calls it with params.
+
+    The closure accepts positional params (a list), named params (a dict), or no
+    params (None). It checks the params against the signature with a few
+    precomputed comparisons and raises ``JsonRpcInvalidParamsError`` if they do not
+    fit, so the function itself never sees a binding ``TypeError``. If a schema is
+    given, the params are checked against it first, see :func:`compile_schema`.
+    """
+    positional: typing.List[str] = []
+    required_positional = 0
+    named: typing.Set[str] = set()
+    required_named: typing.Set[str] = set()
+    has_var_positional = False
+    has_var_named = False
+    positional_only_required = False
+    named_only_required = False
+
+    for param in inspect.signature(func).parameters.values():
+        required = param.default is param.empty
+        if param.kind is param.VAR_POSITIONAL:
+            has_var_positional = True
+        elif param.kind is param.VAR_KEYWORD:
+            has_var_named = True
+        elif param.kind is param.KEYWORD_ONLY:
+            named.add(param.name)
+            if required:
+                required_named.add(param.name)
+                named_only_required = True
+        else:
+            positional.append(param.name)
+            if required:
+                required_positional += 1
+            if param.kind is param.POSITIONAL_ONLY:
+                positional_only_required = positional_only_required or required
+            else:
+                named.add(param.name)
+                if required:
+                    required_named.add(param.name)
+
+    min_positional = required_positional
+    max_positional = None if has_var_positional else len(positional)
+    accepts_list = not named_only_required
+    accepts_dict = not positional_only_required
+    accepts_none = min_positional == 0 and not named_only_required
+    invalid_message = _invalid_params_message(name)
+
+    def bind(params: typing.Optional[JsonRpcParams]) -> JsonPrimitive:
+        if params is None:
+            if accepts_none:
+                return func()
+        elif type(params) is list:
+            count = len(params)
+            if (
+                accepts_list
+                and count >= min_positional
+                and (max_positional is None or count <= max_positional)
+            ):
+                return func(*params)
+        else:
+            keys = typing.cast(dict, params).keys()
+            if (
+                accepts_dict
+                and keys >= required_named
+                and (has_var_named or keys <= named)
+            ):
+                return func(**typing.cast(dict, params))
+        raise JsonRpcInvalidParamsError(invalid_message)
+
+    if schema is None:
+        return bind
+    validate = compile_schema(name, schema)
+
+    def validate_and_bind(params: typing.Optional[JsonRpcParams]) -> JsonPrimitive:
+        validate(params)
+        return bind(params)
+
+    return validate_and_bind
+
+
+def _streamed_params(
+    request: JsonRpcRequest, field: typing.Optional[str], invalid_message: str
+) -> typing.Any:
+    """
+    Return a request's params with an array replaced by an iterator over its items.
+
+    If the params of a lazy request are still encoded, the array's items are decoded
+    one at a time as the iterator reaches them. Otherwise the iterator runs over the
+    decoded list.
+
+    :param field: The name of the array in named params, or None if the params are
+        the array.
+    :raises JsonRpcInvalidParamsError: if the params are not an array, or do not
+        contain an array with the given name
+    """
+    raw = request.raw_params if isinstance(request, LazyJsonRpcRequest) else None
+    if raw is not None:
+        codec = typing.cast(LazyJsonRpcRequest, request)._codec
+        if field is None:
+            if raw[:1] == b"[":
+                return iter_items(codec, raw)
+            raise JsonRpcInvalidParamsError(invalid_message)
+        members = scan_members(raw)
+        span = None if members is None else members.get(field.encode())
+        if span is not None and raw[span[0]] == ord("["):
+            start, end = span
+            params = codec.decode(b"".join((raw[:start], b"[]", raw[end:])))
+            params[field] = iter_items(codec, raw, start)
+            return params
+    params = request.params
+    if field is None:
+        if type(params) is list:
+            return iter(params)
+    elif type(params) is dict and type(params.get(field)) is list:
+        params = dict(params)
+        params[field] = iter(params[field])
+        return params
+    raise JsonRpcInvalidParamsError(invalid_message)
+
+
+def compile_streamer(
+    name: str, func: typing.Callable[..., typing.Any], field: typing.Optional[str]
+) -> Route:
+    """
+    Return a closure that calls a function with an iterator over a params array.
+
+    If ``field`` is None, the params must be an array, and the function receives an
+    iterator over its items as its only argument. Otherwise the params must be an
+    object with an array member of that name, and the function receives the members
+    as keyword arguments, with an iterator in place of that array.
+    """
+    invalid_message = _invalid_params_message(name)
+    if field is None:
+        return lambda request: func(_streamed_params(request, None, invalid_message))
+    binder = compile_binder(name, func)
+    return lambda request: binder(_streamed_params(request, field, invalid_message))
+
+
+class JsonRpcDispatcher:
+    """
+    Routes requests to registered functions by method name.
+
+    Each function's signature is analyzed when it is registered, so dispatching a
+    request costs one dict lookup, a few comparisons to validate the params, and the
+    call itself. Pass a dispatcher as the ``request_handler`` of a
+    :class:`JsonRpcPeer` to use :meth:`JsonRpcPeer.handle`.
+    """
+
+    def __init__(self) -> None:
+        """ Constructor. """
+        self._binders: typing.Dict[str, Binder] = dict()
+        # The methods whose handlers take the request rather than the params.
+        self._routes: typing.Dict[str, Route] = dict()
+
+    def __contains__(self, method: str) -> bool:
+        """ True if a function is registered for this method name. """
+        return method in self._binders or method in self._routes
+
+    @property
+    def methods(self) -> typing.List[str]:
+        """ The registered method names. """
+        return list(self._binders) + list(self._routes)
+
+    @typing.overload
+    def register(
+        self,
+        func: Handler,
+        *,
+        name: typing.Optional[str] = None,
+        schema: typing.Optional[ParamsSchema] = None,
+        iter_params: typing.Union[bool, str, None] = None,
+    ) -> Handler:
+        ...
+
+    @typing.overload
+    def register(
+        self,
+        func: None = None,
+        *,
+        name: typing.Optional[str] = None,
+        schema: typing.Optional[ParamsSchema] = None,
+        iter_params: typing.Union[bool, str, None] = None,
+    ) -> typing.Callable[[Handler], Handler]:
+        ...
+
+    def register(
+        self,
+        func: typing.Optional[Handler] = None,
+        *,
+        name: typing.Optional[str] = None,
+        schema: typing.Optional[ParamsSchema] = None,
+        iter_params: typing.Union[bool, str, None] = None,
+    ) -> typing.Union[Handler, typing.Callable[[Handler], Handler]]:
+        """
+        Register a function to handle a method.
+
+        This can be called directly or used as a decorator, with or without
+        arguments.
+
+        :param func: The function. It receives the request params as positional
+            arguments (for a list) or keyword arguments (for a dict), and returns the
+            result. It may raise any ``JsonRpcException`` to send an error response.
+        :param name: The method name. Defaults to the function's name.
+        :param schema: If given, the params are checked against this
+            :class:`ParamsSchema` before the function is called.
+        :param iter_params: If True, the params must be an array, and the function
+            receives an iterator over its items instead. If a string, the params must
+            be an object with an array member of that name, and the function receives
+            an iterator in place of that array. With a peer that parses lazily, the
+            items are decoded one at a time as the function iterates, see
+            :func:`compile_streamer`.
+        :raises ValueError: if both a schema and ``iter_params`` are given
+        """
+        if func is None:
+            return lambda func: self.register(
+                func, name=name, schema=schema, iter_params=iter_params
+            )
+        method = name or func.__name__
+        self.unregister(method, missing_ok=True)
+        if iter_params:
+            if schema is not None:
+                raise ValueError("A schema cannot check params that are iterated.")
+            field = iter_params if isinstance(iter_params, str) else None
+            self._routes[method] = compile_streamer(method, func, field)
+        else:
+            self._binders[method] = compile_binder(method, func, schema)
+        return func
+
+    def unregister(self, method: str, *, missing_ok: bool = False) -> None:
+        """
+        Remove the function registered for a method.
+
+        :raises KeyError: if no function is registered, unless ``missing_ok``
+        """
+        if self._binders.pop(method, None) is None:
+            if self._routes.pop(method, None) is None and not missing_ok:
+                raise KeyError(method)
+
+    def __call__(self, request: JsonRpcRequest) -> JsonPrimitive:
+        """
+        Call the function registered for a request's method, and return its result.
+
+        :raises JsonRpcMethodNotFoundError: if no function is registered
+        :raises JsonRpcInvalidParamsError: if the params do not fit the function
+        """
+        binder = self._binders.get(request.method)
+        if binder is None:
+            route = self._routes.get(request.method)
+            if route is None:
+                # The method name is not in the message, so that the interned error is
+                # reused whatever a client sends.
+                raise JsonRpcMethodNotFoundError()
+            return route(request)
+        return binder(request.params)
@@ -0,0 +1,274 @@
+from __future__ import annotations
+import re
+import typing
+
+from .exc import JsonRpcParseError
+from .framing import _SKIP_TO_BRACKET
+
+
+PAYLOAD_NAMES = (b"params", b"result")
+
+_OBJECT_START = re.compile(rb"[ \t\r\n]*\{")
+# A member name, and its value and the following separator if the value is a string or
+# a scalar. If the value is an object or array, the match ends at its first byte.
+_MEMBER = re.compile(
+    rb'[ \t\r\n]*"([^"\\]*(?:\\[\s\S][^"\\]*)*)"[ \t\r\n]*:[ \t\r\n]*'
+    rb'(?:("[^"\\]*(?:\\[\s\S][^"\\]*)*"|[^,}\]"{\[ \t\r\n]+)[ \t\r\n]*([,}]))?'
+)
+_SEPARATOR = re.compile(rb"[ \t\r\n]*([,}])")
+# The start of an array, up to its first item or its end.
+_ARRAY_START = re.compile(rb"[ \t\r\n]*\[[ \t\r\n]*")
+# An array item that is a string or a scalar.
+_ITEM = re.compile(rb'"[^"\\]*(?:\\[\s\S][^"\\]*)*"|[^,\]"{\[ \t\r\n]+')
+# The separator after an array item, and the whitespace before the next item.
+_ITEM_SEPARATOR = re.compile(rb"[ \t\r\n]*([,\]])[ \t\r\n]*")
+_ESCAPE = re.compile(rb"\\[\s\S]")
+_ESCAPE_FREE_STRING = re.compile(rb'"[^"]*"')
+# Every byte except quotes and brackets, for bytes.translate() to delete.
+_NOT_STRUCTURAL = bytes(range(256)).translate(None, b'"{}[]')
+_WHITESPACE = b" \t\r\n"
+
+_OPEN_BRACE = ord("{")
+_OPEN_BRACKET = ord("[")
+_CLOSE_BRACE = ord("}")
+_CLOSE_BRACKET = ord("]")
+_QUOTE = ord('"')
+_BACKSLASH = ord("\\")
+_COLON = ord(":")
+_COMMA = ord(",")
+
+
+Span = typing.Tuple[int, int]
+
+
+def scan_members(data: bytes) -> typing.Optional[typing.Dict[bytes, Span]]:
+    """
+    Locate the top-level members of an encoded object without decoding them.
+
+    Members are tokenized one at a time, and object or array values are skipped. The
+    value of a ``params`` or ``result`` member is skipped without a Python loop: its
+    end is found from the other end of the message, by stepping backwards over the
+    members that follow it, and then checked with a few whole-buffer operations that
+    run in C. Only if that check fails, e.g. because an extension member with an object
+    value follows the payload, is the payload scanned bracket by bracket.
+
+    The values are not validated, but a data structure that is not a plain JSON object
+    yields None, as does a member name that contains an escape or appears twice, so
+    that the caller can fall back to decoding the data.
+
+    :returns: a dict of member names (as they appear in the data) to the start and end
+        offsets of their values, or None
+    :raises JsonRpcParseError: if an object or array value is not terminated
+    """
+    match = _OBJECT_START.match(data)
+    if match is None:
+        return None
+    pos = match.end()
+    end = len(data)
+    members: typing.Dict[bytes, Span] = dict()
+    while True:
+        match = _MEMBER.match(data, pos)
+        if match is None:
+            return None
+        name = match.group(1)
+        if b"\\" in name or name in members:
+            return None
+        if match.lastindex == 3:
+            members[name] = match.span(2)
+        else:
+            start = pos = match.end()
+            if pos == end or data[pos] not in (_OPEN_BRACE, _OPEN_BRACKET):
+                return None
+            if name in PAYLOAD_NAMES:
+                pos = _find_container_end(data, pos)
+            else:
+                pos = _skip_container(data, pos)
+            members[name] = (start, pos)
+            match = _SEPARATOR.match(data, pos)
+            if match is None:
+                return None
+        if match.group(typing.cast(int, match.lastindex)) == b"}":
+            if data[match.end() :].strip(_WHITESPACE):
+                return None
+            return members
+        pos = match.end()
+
+
+def find_payload(data: bytes) -> typing.Optional[typing.Tuple[bytes, int, int]]:
+    """
+    Locate the ``params`` or ``result`` member of an encoded message without decoding.
+
+    See :func:`scan_members`.
+
+    :returns: the member name and the start and end offsets of its value, or None if
+        the data is not an object with a ``params`` or ``result`` member whose value is
+        an object or array
+    :raises JsonRpcParseError: if an object or array value is not terminated
+    """
+    members = scan_members(data)
+    if members is None:
+        return None
+    for name in PAYLOAD_NAMES:
+        span = members.get(name)
+        if span is not None and data[span[0]] in (_OPEN_BRACE, _OPEN_BRACKET):
+            return (name,) + span
+    return None
+
+
+def scan_items(data: bytes, start: int = 0) -> typing.Iterator[Span]:
+    """
+    Locate the items of an encoded array one at a time, without decoding them.
+
+    Strings and scalars are matched with one regular expression each, and objects and
+    arrays are skipped bracket by bracket. The items are not validated.
+
+    :param start: The offset of the array in the data.
+    :returns: an iterator of the start and end offsets of each item
+    :raises JsonRpcParseError: if the data is not an array, or it is not terminated
+    """
+    match = _ARRAY_START.match(data, start)
+    if match is None:
+        raise JsonRpcParseError("Invalid JSON format")
+    pos = match.end()
+    if data[pos : pos + 1] == b"]":
+        return
+    end = len(data)
+    while True:
+        if pos < end and data[pos] in (_OPEN_BRACE, _OPEN_BRACKET):
+            item_end = _skip_container(data, pos)
+        else:
+            match = _ITEM.match(data, pos)
+            if match is None:
+                raise JsonRpcParseError("Invalid JSON format")
+            item_end = match.end()
+        yield pos, item_end
+        match = _ITEM_SEPARATOR.match(data, item_end)
+        if match is None:
+            raise JsonRpcParseError("Invalid JSON format")
+        if match.group(1) == b"]":
+            return
+        pos = match.end()
+
+
+def _find_container_end(data: bytes, start: int) -> int:
+    """ Return the end offset of the object or array that starts at ``start``. """
+    end = _last_container_end(data)
+    if end is not None and end > start and _is_single_value(data[start:end]):
+        return end
+    return _skip_container(data, start)
+
+
+def _last_container_end(data: bytes) -> typing.Optional[int]:
+    """
+    Step backwards over the trailing members whose values are strings or scalars.
+
+    :returns: the end offset of the value in front of them if that value is an object
+        or array, otherwise None
+    """
+    pos = _rskip_whitespace(data, len(data))
+    if pos == 0 or data[pos - 1] != _CLOSE_BRACE:
+        return None
+    pos -= 1
+    while True:
+        pos = _rskip_whitespace(data, pos)
+        if pos == 0:
+            return None
+        byte = data[pos - 1]
+        if byte == _CLOSE_BRACE or byte == _CLOSE_BRACKET:
+            return pos
+        if byte == _QUOTE:
+            pos = _rfind_string_start(data, pos - 1)
+        else:
+            while pos > 0 and data[pos - 1] not in b' \t\r\n:,"{}[]':
+                pos -= 1
+        # The member name and separators.
+        pos = _rskip_whitespace(data, pos)
+        if pos == 0 or data[pos - 1] != _COLON:
+            return None
+        pos = _rskip_whitespace(data, pos - 1)
+        if pos == 0 or data[pos - 1] != _QUOTE:
+            return None
+        pos = _rskip_whitespace(data, _rfind_string_start(data, pos - 1))
+        if pos == 0 or data[pos - 1] != _COMMA:
+            return None
+        pos -= 1
+
+
+def _rskip_whitespace(data: bytes, pos: int) -> int:
+    """ Return the offset just after the last non-whitespace byte before ``pos``. """
+    while pos > 0 and data[pos - 1] in _WHITESPACE:
+        pos -= 1
+    return pos
+
+
+def _rfind_string_start(data: bytes, close: int) -> int:
+    """ Return the offset of the opening quote of the string that ends at ``close``. """
+    pos = close
+    while True:
+        pos = data.rfind(b'"', 0, pos)
+        if pos == -1:
+            return 0
+        backslash = pos
+        while backslash > 0 and data[backslash - 1] == _BACKSLASH:
+            backslash -= 1
+        if (pos - backslash) % 2 == 0:
+            return pos
+
+
+def strip_to_brackets(data: bytes) -> bytes:
+    """
+    Return the brackets in encoded JSON that are not inside strings, in order.
+
+    Every step is a whole-buffer operation that runs in C.
+    """
+    if b"\\" in data:
+        data = _ESCAPE.sub(b"", data)
+    # Removing two adjacent quotes does not change which brackets are inside strings,
+    # so strings without brackets can be removed with a plain replace().
+    brackets = data.translate(None, _NOT_STRUCTURAL).replace(b'""', b"")
+    if b'"' in brackets:
+        brackets = _ESCAPE_FREE_STRING.sub(b"", brackets)
+    return brackets
+
+
+def _is_single_value(raw: bytes) -> bool:
+    """
+    True if ``raw`` is one object or array rather than several values.
+
+    The brackets outside strings form a single value if the first one matches the last
+    one, and the ones between them cancel out when adjacent pairs are removed
+    repeatedly. Each pass is a whole-buffer operation, and the number of passes is at
+    most the nesting depth.
+    """
+    brackets = strip_to_brackets(raw)
+    if brackets[:1] + brackets[-1:] not in (b"{}", b"[]"):
+        return False
+    inner = brackets[1:-1]
+    while inner:
+        reduced = inner.replace(b"{}", b"").replace(b"[]", b"")
+        if len(reduced) == len(inner):
+            return False
+        inner = reduced
+    return True
+
+
+def _skip_container(data: bytes, pos: int) -> int:
+    """
+    Return the end offset of the object or array that starts at ``pos``.
+
+    :raises JsonRpcParseError: if the data ends first
+    """
+    end = len(data)
+    depth = 0
+    while True:
+        pos = _SKIP_TO_BRACKET.match(data, pos).end()  # type: ignore
+        if pos == end or data[pos] == _QUOTE:
+            raise JsonRpcParseError("Invalid JSON format")
+        byte = data[pos]
+        pos += 1
+        if byte == _OPEN_BRACE or byte == _OPEN_BRACKET:
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return pos
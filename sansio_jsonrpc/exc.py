@@ -1,12 +1,12 @@
 from __future__ import annotations
-from dataclasses import dataclass
 import typing
 
 
 from .types import JsonDict, JsonList, JsonPrimitive
+from .util import slotted_dataclass
 
 
-@dataclass
+@slotted_dataclass
 class JsonRpcError:
     """ Represents an error in the JSON RPC protocol. """
 
@@ -37,6 +37,42 @@ class JsonRpcError:
         return f"JsonRpcError(code={self.code}, message={message}, data={data})"
 
 
+class _InternedError(JsonRpcError):
+    """
+    A shared, immutable error with a constant message and no data.
+
+    Exceptions reuse these instead of allocating an error each time they are raised
+    with a standard message, see :meth:`JsonRpcReservedError.intern`. An interned error
+    compares equal to an ordinary error with the same fields, and it is copied and
+    pickled as an ordinary error.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, code: int, message: str):
+        object.__setattr__(self, "code", code)
+        object.__setattr__(self, "message", message)
+        object.__setattr__(self, "data", None)
+
+    def __setattr__(self, name: str, value: typing.Any) -> None:
+        raise AttributeError(f"Cannot assign {name!r} of an interned error.")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"Cannot delete {name!r} of an interned error.")
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, JsonRpcError):
+            return (self.code, self.message, self.data) == (
+                other.code,
+                other.message,
+                other.data,
+            )
+        return NotImplemented
+
+    def __reduce__(self) -> typing.Tuple[type, tuple]:
+        return JsonRpcError, (self.code, self.message, self.data)
+
+
 class JsonRpcException(Exception):
     """
     A base class for JSON-RPC exceptions.
@@ -88,25 +124,89 @@ class JsonRpcException(Exception):
         error's numeric code and instantiates it. It uses some metaclass black magic so
         that it can even return custom subclasses you define in your own code!
         """
-        exc: JsonRpcException
-        if -32768 <= error.code <= -32000:
-            exc = JsonRpcReservedError.exc_from_error(error)
-        else:
-            exc = JsonRpcApplicationError.exc_from_error(error)
-        return exc
+        return _exc_from_error(error_class(error.code), error)
+
 
+def error_class(code: int) -> type:
+    """
+    Return the exception class registered for an error code.
 
-class JsonRpcReservedErrorMeta(type):
+    Codes without a registered class map to ``JsonRpcReservedError`` if they are in the
+    reserved range, or to ``JsonRpcApplicationError`` otherwise.
     """
-    This metaclass builds a map of error codes to classes.
+    cls = JsonRpcErrorMeta._error_classes.get(code)
+    if cls is None:
+        if -32768 <= code <= -32000:
+            return JsonRpcReservedError
+        return JsonRpcApplicationError
+    return cls
+
+
+def _exc_from_error(cls: type, error: JsonRpcError) -> JsonRpcException:
+    """
+    Create an exception of the given class that holds the given error.
+
+    The library's own constructors only wrap a new error around the message and data,
+    so for classes that do not override them, the received error is reused instead of
+    copied. The exception's ``args`` are the same as if the constructor had been
+    called.
+    """
+    # The subclasses' constructors have different signatures.
+    exc_cls: typing.Any = cls
+    if error.message:
+        init = exc_cls.__init__
+        if init is _RESERVED_INIT:
+            exc = exc_cls.__new__(cls, error.message, error.data)
+            exc._error = error
+            return exc
+        if init is _APPLICATION_INIT:
+            exc = exc_cls.__new__(cls, error.message)
+            exc._error = error
+            return exc
+    if issubclass(cls, JsonRpcReservedError):
+        return exc_cls(error.message, error.data)
+    return exc_cls(error.message, data=error.data)
+
+
+class JsonRpcErrorMeta(type):
+    """
+    This metaclass builds one map of error codes to classes.
 
     This is used to find the right class to instantiate when an error response is
-    received. It also enforces the requirement that reserved error codes must be in the
-    range [-32768, -32000].
+    received, with a single lookup whatever the code. Each class that sets its own
+    ``ERROR_CODE`` is registered when it is created, and a class whose code is already
+    registered to a different class raises an exception, so that two classes never
+    share a code. Defining a class again, e.g. when its module is reloaded, replaces the
+    earlier definition.
     """
 
     _error_classes: typing.Dict[int, type] = dict()
 
+    def __init__(cls, name, bases, attrs):
+        super().__init__(name, bases, attrs)
+        code = attrs.get("ERROR_CODE")
+        if code is None:
+            return
+        existing = JsonRpcErrorMeta._error_classes.get(code)
+        if existing is not None and (existing.__module__, existing.__qualname__) != (
+            cls.__module__,
+            cls.__qualname__,
+        ):
+            raise RuntimeError(
+                f"Error code {code} of {cls.__qualname__} is already used by "
+                f"{existing.__module__}.{existing.__qualname__}."
+            )
+        JsonRpcErrorMeta._error_classes[code] = cls
+
+
+class JsonRpcReservedErrorMeta(JsonRpcErrorMeta):
+    """
+    This metaclass registers error codes and interns the default error of each class.
+
+    It also enforces the requirement that reserved error codes must be in the range
+    [-32768, -32000].
+    """
+
     def __init__(cls, name, bases, attrs):
         if cls.ERROR_CODE is not None and (
             cls.ERROR_CODE < -32768 or cls.ERROR_CODE > -32000
@@ -115,7 +215,12 @@ class JsonRpcReservedErrorMeta(type):
                 "Subclasses of JsonRpcReservedError must set ERROR_CODE in range "
                 "[-32768, -32000]."
             )
-        JsonRpcReservedErrorMeta._error_classes[cls.ERROR_CODE] = cls
+        super().__init__(name, bases, attrs)
+        # The interned errors of this class, by message. None is the default message.
+        cls._interned = dict()
+        if cls.ERROR_CODE is not None:
+            error = _InternedError(cls.ERROR_CODE, cls.ERROR_MESSAGE)
+            cls._interned[None] = cls._interned[cls.ERROR_MESSAGE] = error
 
 
 class JsonRpcReservedError(JsonRpcException, metaclass=JsonRpcReservedErrorMeta):
@@ -127,15 +232,41 @@ class JsonRpcReservedError(JsonRpcException, metaclass=JsonRpcReservedErrorMeta)
 
     ERROR_CODE: int = -32000
     ERROR_MESSAGE: str = "JSON-RPC reserved error"
+    # Set for each class by the metaclass.
+    _interned: typing.ClassVar[typing.Dict[typing.Optional[str], JsonRpcError]]
 
     def __init__(
         self,
         message: typing.Optional[str] = None,
         data: typing.Optional[JsonDict] = None,
     ):
-        error = JsonRpcError(self.ERROR_CODE, message or self.ERROR_MESSAGE, data)
+        error = None
+        if data is None:
+            error = self._interned.get(message)
+        if error is None:
+            error = JsonRpcError(self.ERROR_CODE, message or self.ERROR_MESSAGE, data)
         super().__init__(error)
 
+    @classmethod
+    def intern(cls, message: typing.Optional[str] = None) -> JsonRpcError:
+        """
+        Return a shared, immutable error of this class with a constant message.
+
+        Once a message is interned, raising this class with that message and no data
+        reuses the interned error instead of allocating one, and peers cache its
+        encoding, which makes floods of the same error cheap. Only intern messages that
+        are constant, since interned errors are never freed.
+
+        :param message: Defaults to the class's ``ERROR_MESSAGE``, which is always
+            interned.
+        """
+        error = cls._interned.get(message)
+        if error is None:
+            error = cls._interned[message] = _InternedError(
+                cls.ERROR_CODE, typing.cast(str, message)
+            )
+        return error
+
     @staticmethod
     def exc_from_error(error: JsonRpcError) -> JsonRpcReservedError:
         """
@@ -145,21 +276,20 @@ class JsonRpcReservedError(JsonRpcException, metaclass=JsonRpcReservedErrorMeta)
         If it does not find such a subclass, then it returns a ``JsonRpcReservedError``
         instead.
         """
-        cls = JsonRpcReservedError._error_classes.get(error.code, JsonRpcReservedError)
-        return cls(error.message, error.data)
+        cls = JsonRpcErrorMeta._error_classes.get(error.code)
+        if cls is None or not issubclass(cls, JsonRpcReservedError):
+            cls = JsonRpcReservedError
+        return typing.cast(JsonRpcReservedError, _exc_from_error(cls, error))
 
 
-class JsonRpcApplicationErrorMeta(type):
+class JsonRpcApplicationErrorMeta(JsonRpcErrorMeta):
     """
-    This metaclass builds a map of error codes to classes.
+    This metaclass registers error codes.
 
-    This is used to find the right class to instantiate when an error response is
-    received. It also enforces the requirement that application error codes must **not**
-    be in the range [-32768, -32000].
+    It also enforces the requirement that application error codes must **not** be in
+    the range [-32768, -32000].
     """
 
-    _error_classes: typing.Dict[int, type] = dict()
-
     def __init__(cls, name, bases, attrs):
         if (
             cls.ERROR_CODE is not None
@@ -170,7 +300,7 @@ class JsonRpcApplicationErrorMeta(type):
                 "Subclasses of JsonRpcReservedError must set ERROR_CODE outside the "
                 " range [-32768, -32000]."
             )
-        JsonRpcApplicationErrorMeta._error_classes[cls.ERROR_CODE] = cls
+        super().__init__(name, bases, attrs)
 
 
 class JsonRpcApplicationError(JsonRpcException, metaclass=JsonRpcApplicationErrorMeta):
@@ -197,10 +327,20 @@ class JsonRpcApplicationError(JsonRpcException, metaclass=JsonRpcApplicationErro
 
     @staticmethod
     def exc_from_error(error: JsonRpcError) -> JsonRpcApplicationError:
-        cls = JsonRpcApplicationError._error_classes.get(
-            error.code, JsonRpcApplicationError
-        )
-        return cls(error.message, data=error.data)
+        """
+        Create a new application exception that corresponds to the error code.
+
+        This returns a ``JsonRpcApplicationError`` if no subclass is registered with the
+        given error code.
+        """
+        cls = JsonRpcErrorMeta._error_classes.get(error.code)
+        if cls is None or not issubclass(cls, JsonRpcApplicationError):
+            cls = JsonRpcApplicationError
+        return typing.cast(JsonRpcApplicationError, _exc_from_error(cls, error))
+
+
+_RESERVED_INIT = JsonRpcReservedError.__init__
+_APPLICATION_INIT = JsonRpcApplicationError.__init__
 
 
 class JsonRpcParseError(JsonRpcReservedError):
@@ -246,5 +386,29 @@ class JsonRpcInternalError(JsonRpcReservedError):
     Internal JSON-RPC error.
     """
 
-    ERROR_CODE = -32602
+    ERROR_CODE = -32603
     ERROR_MESSAGE = "Internal JSON-RPC error."
+
+
+class JsonRpcDeadlineExceededError(JsonRpcReservedError):
+    """
+    The request expired before the server could handle it.
+
+    :class:`JsonRpcScheduler` answers requests with this error when it drops them.
+    """
+
+    ERROR_CODE = -32001
+    ERROR_MESSAGE = "The request expired before it could be handled."
+
+
+# Messages that the library raises for every malformed message, so that floods of bad
+# input reuse the same errors.
+for _message in (
+    "Invalid JSON format",
+    "Invalid ASCII encoding",
+    "Invalid MessagePack format",
+    "Invalid compressed frame",
+):
+    JsonRpcParseError.intern(_message)
+for _message in ("Batch array must not be empty.", "Invalid batch element."):
+    JsonRpcInvalidRequestError.intern(_message)
@@ -0,0 +1,379 @@
+from __future__ import annotations
+import re
+import typing
+
+from .exc import JsonRpcInvalidRequestError, JsonRpcParseError
+
+
+# Anything that exposes the buffer protocol as raw bytes can be fed to a framer.
+Chunk = typing.Union[bytes, bytearray, memoryview]
+
+_NON_WHITESPACE = re.compile(rb"[^ \t\r\n]")
+# Skips everything up to the next bracket, including complete strings. It stops at the
+# opening quote of a string that is not complete yet.
+_SKIP_TO_BRACKET = re.compile(
+    rb'[^"{}\[\]]*(?:"[^"\\]*(?:\\[\s\S][^"\\]*)*"[^"{}\[\]]*)*'
+)
+# Skips the rest of a string body. It stops at the closing quote, or at a backslash
+# that is the last byte in the buffer.
+_SKIP_STRING = re.compile(rb'[^"\\]*(?:\\[\s\S][^"\\]*)*')
+_CONTENT_LENGTH = re.compile(
+    rb"^content-length[ \t]*:[ \t]*(\d+)[ \t]*\r?$", re.IGNORECASE | re.MULTILINE
+)
+
+_OPEN_BRACE = ord("{")
+_OPEN_BRACKET = ord("[")
+_QUOTE = ord('"')
+_BACKSLASH = ord("\\")
+
+
+class Framer:
+    """
+    A base class for splitting a byte stream into JSON-RPC frames.
+
+    A framer owns a single buffer. Chunks are appended to it with :meth:`feed` and
+    complete frames are removed from it with :meth:`next_frame`. Each framer remembers
+    how far it has scanned, so every byte received is examined once no matter how the
+    stream is chunked. Consumed bytes are discarded lazily, when the next chunk arrives,
+    so draining many frames from one chunk costs a single buffer compaction.
+    """
+
+    #: The bytes that end each frame, or None if the framing needs the size of the
+    #: frame before the frame itself, so that frames cannot be streamed.
+    trailer: typing.Optional[bytes] = None
+
+    def __init__(self, *, max_frame_bytes: typing.Optional[int] = None) -> None:
+        """
+        Constructor
+
+        :param max_frame_bytes: If a frame grows larger than this, it is discarded and
+            :meth:`next_frame` raises ``JsonRpcInvalidRequestError``, like
+            :meth:`Limits.check` does for a message that is too large. The check is made
+            as data arrives, so an oversized frame is never buffered completely.
+        """
+        self._max_frame_bytes = max_frame_bytes
+        self._buffer = bytearray()
+        # Offset of the first byte that has not been returned as part of a frame.
+        self._start = 0
+        # Offset of the first byte that has not been scanned yet.
+        self._scan = 0
+
+    @property
+    def buffered(self) -> int:
+        """ The number of received bytes that are not part of a returned frame. """
+        return len(self._buffer) - self._start
+
+    def feed(self, chunk: Chunk) -> None:
+        """
+        Append a chunk of received data to the internal buffer.
+
+        The chunk is copied directly into the buffer, so ``memoryview`` and
+        ``bytearray`` objects do not need to be converted to ``bytes`` first.
+        """
+        if self._start:
+            del self._buffer[: self._start]
+            self._scan -= self._start
+            self._start = 0
+        self._buffer += chunk
+
+    def next_frame(self) -> typing.Optional[bytes]:
+        """
+        Remove the next complete frame from the buffer and return it.
+
+        :returns: the frame payload, or None if no complete frame is buffered
+        :raises JsonRpcParseError: if the stream violates the framing protocol
+        :raises JsonRpcInvalidRequestError: if the frame exceeds the maximum size
+        """
+        raise NotImplementedError()
+
+    def frame(self, data: bytes) -> bytes:
+        """ Wrap an encoded message so that the remote framer can find its end. """
+        raise NotImplementedError()
+
+    def frame_chunks(self, data: bytes) -> typing.Tuple[bytes, ...]:
+        """
+        Like :meth:`frame`, but return the framed message as a sequence of chunks.
+
+        The message itself is one of the chunks, so it is not copied. The chunks can
+        be passed to ``writelines()`` or ``socket.sendmsg()``.
+        """
+        return (self.frame(data),)
+
+    def frame_into(self, buffer: bytearray, data: bytes) -> None:
+        """ Like :meth:`frame`, but append the framed message to a buffer. """
+        for chunk in self.frame_chunks(data):
+            buffer += chunk
+
+    def reset(self) -> None:
+        """ Discard all buffered data. """
+        self._buffer.clear()
+        self._start = 0
+        self._scan = 0
+
+    def _too_large(self) -> JsonRpcInvalidRequestError:
+        """ The error for a frame that exceeds the maximum size. """
+        return JsonRpcInvalidRequestError(
+            f"Message exceeds {self._max_frame_bytes} bytes."
+        )
+
+    def _take(self, start: int, end: int, next_start: int) -> bytes:
+        """ Copy ``buffer[start:end]`` out as a frame and consume up to next_start. """
+        with memoryview(self._buffer) as view:
+            frame = bytes(view[start:end])
+        self._start = next_start
+        return frame
+
+
+class NewlineFramer(Framer):
+    """
+    Frames are separated by a single line feed.
+
+    Encoded JSON never contains a raw line feed, so this is the cheapest framing to
+    produce and to scan. Blank lines between frames are ignored. After a line that is
+    too large, the framer skips ahead to the next line.
+    """
+
+    trailer = b"\n"
+
+    def __init__(self, *, max_frame_bytes: typing.Optional[int] = None) -> None:
+        """ Constructor. """
+        super().__init__(max_frame_bytes=max_frame_bytes)
+        # True while skipping the rest of a line that is too large.
+        self._discarding = False
+
+    def next_frame(self) -> typing.Optional[bytes]:
+        """ Return the next line, excluding the line terminator. """
+        buffer = self._buffer
+        max_frame_bytes = self._max_frame_bytes
+        while True:
+            newline = buffer.find(b"\n", self._scan)
+            if newline == -1:
+                self._scan = len(buffer)
+                if self._discarding:
+                    self._start = self._scan
+                elif (
+                    max_frame_bytes is not None
+                    and self._scan - self._start > max_frame_bytes
+                ):
+                    self._start = self._scan
+                    self._discarding = True
+                    raise self._too_large()
+                return None
+            start = self._start
+            self._scan = newline + 1
+            if self._discarding:
+                self._start = self._scan
+                self._discarding = False
+                continue
+            end = newline
+            if end > start and buffer[end - 1] == 0x0D:
+                end -= 1
+            if end == start:
+                self._start = self._scan
+                continue
+            if max_frame_bytes is not None and end - start > max_frame_bytes:
+                self._start = self._scan
+                raise self._too_large()
+            return self._take(start, end, self._scan)
+
+    def frame(self, data: bytes) -> bytes:
+        """ Append a line feed. """
+        return data + b"\n"
+
+    def frame_chunks(self, data: bytes) -> typing.Tuple[bytes, ...]:
+        """ Return the message and a line feed. """
+        return (data, b"\n")
+
+    def frame_into(self, buffer: bytearray, data: bytes) -> None:
+        """ Append the message and a line feed to a buffer. """
+        buffer += data
+        buffer += b"\n"
+
+    def reset(self) -> None:
+        """ Discard all buffered data. """
+        super().reset()
+        self._discarding = False
+
+
+class ContentLengthFramer(Framer):
+    """
+    Frames are prefixed with HTTP-style headers, as in the Language Server Protocol.
+
+    Each frame starts with a header block that contains a ``Content-Length`` header and
+    ends with an empty line, followed by exactly that many bytes of payload. Headers
+    other than ``Content-Length`` are ignored. A frame that is too large is rejected as
+    soon as its header arrives, and its payload is skipped as it arrives.
+    """
+
+    def __init__(self, *, max_frame_bytes: typing.Optional[int] = None) -> None:
+        """ Constructor. """
+        super().__init__(max_frame_bytes=max_frame_bytes)
+        self._body_start: typing.Optional[int] = None
+        self._body_length = 0
+        # The number of payload bytes still to skip after a frame that is too large.
+        self._skip = 0
+
+    def feed(self, chunk: Chunk) -> None:
+        """ Append a chunk of received data to the internal buffer. """
+        if self._body_start is not None:
+            self._body_start -= self._start
+        super().feed(chunk)
+
+    def next_frame(self) -> typing.Optional[bytes]:
+        """ Return the next frame body. """
+        buffer = self._buffer
+        max_frame_bytes = self._max_frame_bytes
+        if self._skip:
+            skipped = min(self._skip, len(buffer) - self._start)
+            self._start = self._scan = self._start + skipped
+            self._skip -= skipped
+            if self._skip:
+                return None
+        if self._body_start is None:
+            # The terminator may straddle two chunks, so back up a little.
+            terminator = buffer.find(b"\r\n\r\n", max(self._start, self._scan - 3))
+            if terminator == -1:
+                self._scan = len(buffer)
+                if (
+                    max_frame_bytes is not None
+                    and self._scan - self._start > max_frame_bytes
+                ):
+                    # There is no way to find the start of the next frame.
+                    self.reset()
+                    raise self._too_large()
+                return None
+            with memoryview(buffer) as view:
+                headers = bytes(view[self._start : terminator])
+            match = _CONTENT_LENGTH.search(headers)
+            if match is None:
+                self._start = self._scan = terminator + 4
+                raise JsonRpcParseError("Frame header is missing Content-Length")
+            body_length = int(match.group(1))
+            if max_frame_bytes is not None and body_length > max_frame_bytes:
+                self._start = self._scan = terminator + 4
+                self._skip = body_length
+                raise self._too_large()
+            self._body_start = terminator + 4
+            self._body_length = body_length
+        body_end = self._body_start + self._body_length
+        if len(buffer) < body_end:
+            self._scan = len(buffer)
+            return None
+        frame = self._take(self._body_start, body_end, body_end)
+        self._scan = body_end
+        self._body_start = None
+        return frame
+
+    def frame(self, data: bytes) -> bytes:
+        """ Prepend a header block. """
+        return b"Content-Length: %d\r\n\r\n" % len(data) + data
+
+    def frame_chunks(self, data: bytes) -> typing.Tuple[bytes, ...]:
+        """ Return a header block and the message. """
+        return (b"Content-Length: %d\r\n\r\n" % len(data), data)
+
+    def frame_into(self, buffer: bytearray, data: bytes) -> None:
+        """ Append a header block and the message to a buffer. """
+        buffer += b"Content-Length: %d\r\n\r\n" % len(data)
+        buffer += data
+
+    def reset(self) -> None:
+        """ Discard all buffered data. """
+        super().reset()
+        self._body_start = None
+        self._skip = 0
+
+
+class ConcatenatedJsonFramer(Framer):
+    """
+    Frames are JSON objects or arrays written back to back with no delimiter.
+
+    The end of each frame is found by tracking bracket depth while scanning. A regular
+    expression skips from one bracket to the next, stepping over complete strings, so
+    the Python loop runs once per bracket rather than once per byte. The scanner keeps
+    its depth and string state between chunks, so a frame split across many chunks is
+    still scanned only once. Whitespace between frames is ignored.
+
+    The end of a frame that is too large cannot be found without scanning all of it, so
+    if such a frame is incomplete, the whole buffer is discarded, and the stream cannot
+    be resumed after it.
+    """
+
+    trailer = b""
+
+    def __init__(self, *, max_frame_bytes: typing.Optional[int] = None) -> None:
+        """ Constructor. """
+        super().__init__(max_frame_bytes=max_frame_bytes)
+        self._depth = 0
+        self._in_string = False
+
+    def next_frame(self) -> typing.Optional[bytes]:
+        """ Return the next complete JSON value. """
+        buffer = self._buffer
+        end = len(buffer)
+        pos = self._scan
+        while pos < end:
+            if self._depth == 0:
+                match = _NON_WHITESPACE.search(buffer, pos)
+                if match is None:
+                    self._start = pos = end
+                    break
+                pos = match.start()
+                if buffer[pos] not in (_OPEN_BRACE, _OPEN_BRACKET):
+                    self.reset()
+                    raise JsonRpcParseError(
+                        "Expected a JSON object or array at the start of a frame"
+                    )
+                self._start = pos
+                self._depth = 1
+                pos += 1
+            elif self._in_string:
+                pos = _SKIP_STRING.match(buffer, pos).end()  # type: ignore
+                if pos == end or buffer[pos] == _BACKSLASH:
+                    break
+                self._in_string = False
+                pos += 1
+            else:
+                pos = _SKIP_TO_BRACKET.match(buffer, pos).end()  # type: ignore
+                if pos == end:
+                    break
+                byte = buffer[pos]
+                pos += 1
+                if byte == _QUOTE:
+                    self._in_string = True
+                elif byte == _OPEN_BRACE or byte == _OPEN_BRACKET:
+                    self._depth += 1
+                else:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        self._scan = pos
+                        break
+        self._scan = pos
+        max_frame_bytes = self._max_frame_bytes
+        if max_frame_bytes is not None and pos - self._start > max_frame_bytes:
+            if self._depth == 0:
+                self._start = pos
+            else:
+                self.reset()
+            raise self._too_large()
+        if self._depth == 0 and pos > self._start:
+            return self._take(self._start, pos, pos)
+        return None
+
+    def frame(self, data: bytes) -> bytes:
+        """ Concatenated framing does not need a delimiter. """
+        return data
+
+    def frame_chunks(self, data: bytes) -> typing.Tuple[bytes, ...]:
+        """ Return the message. """
+        return (data,)
+
+    def frame_into(self, buffer: bytearray, data: bytes) -> None:
+        """ Append the message to a buffer. """
+        buffer += data
+
+    def reset(self) -> None:
+        """ Discard all buffered data. """
+        super().reset()
+        self._depth = 0
+        self._in_string = False
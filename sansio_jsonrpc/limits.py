@@ -0,0 +1,135 @@
+from __future__ import annotations
+import dataclasses
+import re
+import typing
+
+from .envelope import strip_to_brackets
+from .exc import JsonRpcInvalidRequestError, JsonRpcParseError
+
+# An escape sequence, which counts as one character of a string.
+_ESCAPE = re.compile(rb"\\(?:u[0-9A-Fa-f]{4}|[\s\S])")
+# Maps objects to arrays, because only the nesting matters for the depth check.
+_BRACES_TO_BRACKETS = bytes.maketrans(b"{}", b"[]")
+
+
+@dataclasses.dataclass(frozen=True)
+class Limits:
+    """
+    Limits on the size and shape of received messages.
+
+    Pass an instance to :class:`JsonRpcPeer` to reject oversized messages before they
+    are decoded. The frame size is checked first, in constant time, so every other check
+    runs in time proportional to ``max_frame_bytes`` rather than to the size of the
+    input. Each limit defaults to None, which means unlimited. A message that exceeds a
+    limit raises ``JsonRpcInvalidRequestError``.
+    """
+
+    #: The maximum size of an encoded message.
+    max_frame_bytes: typing.Optional[int] = None
+    #: The maximum nesting depth of objects and arrays. A message object has depth 1.
+    max_depth: typing.Optional[int] = None
+    #: The maximum number of messages in a batch.
+    max_batch_length: typing.Optional[int] = None
+    #: The maximum length of an encoded string, not counting quotes. Each escape
+    #: sequence counts as one character, so this is close to the decoded length.
+    max_string_length: typing.Optional[int] = None
+
+    def check(self, data: bytes) -> None:
+        """
+        Check an encoded message before it is decoded.
+
+        The cheap checks come first, and each check is skipped when the size of the
+        data alone proves that it cannot fail. In particular, small messages cannot
+        contain a long string, and a message of ``n`` bytes cannot be nested deeper than
+        ``n / 2`` levels.
+
+        :raises JsonRpcInvalidRequestError: if the data exceeds a limit
+        :raises JsonRpcParseError: if the depth check finds unmatched brackets
+        """
+        size = len(data)
+        if self.max_frame_bytes is not None and size > self.max_frame_bytes:
+            raise JsonRpcInvalidRequestError(
+                f"Message exceeds {self.max_frame_bytes} bytes."
+            )
+        max_depth = self.max_depth
+        if max_depth is not None and size > 2 * max_depth:
+            self._check_depth(data, max_depth)
+        max_string_length = self.max_string_length
+        if max_string_length is not None and size > max_string_length + 2:
+            if self._has_long_string(data, max_string_length):
+                raise JsonRpcInvalidRequestError(
+                    f"Message contains a string longer than {max_string_length} "
+                    "characters."
+                )
+
+    def check_batch(self, batch: typing.Sized) -> None:
+        """
+        Check a decoded batch array before its messages are parsed.
+
+        :raises JsonRpcInvalidRequestError: if the batch is too long
+        """
+        if self.max_batch_length is not None and len(batch) > self.max_batch_length:
+            raise JsonRpcInvalidRequestError(
+                f"Batch exceeds {self.max_batch_length} messages."
+            )
+
+    @staticmethod
+    def _has_long_string(data: bytes, max_length: int) -> bool:
+        """
+        True if encoded JSON contains a string longer than ``max_length``.
+
+        Once every escape sequence is replaced by a single byte, the quotes that remain
+        are exactly the ones that start and end strings, so a long string is a long run
+        of bytes without quotes that follows an odd number of quotes. Any run longer
+        than ``max_length`` covers one of the offsets probed below, so only the runs
+        around those offsets are measured, and the quotes in front of a run are only
+        counted if it is long enough.
+        """
+        if b"\\" in data:
+            data = _ESCAPE.sub(b"_", data)
+        quotes = 0
+        counted = 0
+        for pos in range(max_length, len(data), max_length + 1):
+            start = data.rfind(b'"', 0, pos + 1) + 1
+            end = data.find(b'"', pos)
+            if end == -1:
+                end = len(data)
+            if end - start > max_length:
+                quotes += data.count(b'"', counted, start)
+                counted = start
+                if quotes % 2:
+                    return True
+        return False
+
+    @staticmethod
+    def _check_depth(data: bytes, max_depth: int) -> None:
+        """
+        Check the nesting depth without decoding.
+
+        Each replace() removes the innermost level of brackets, because a pair that only
+        becomes adjacent during a replace() is not matched by it. So if any adjacent
+        pair remains after ``max_depth`` passes, the data is nested deeper than that.
+        If brackets remain but no adjacent pair does, then the brackets do not match.
+        That is rejected here too, because an unterminated stack of brackets makes some
+        JSON decoders recurse until they crash. Braces are treated as brackets, so a
+        brace that closes a bracket is left for the decoder to reject.
+
+        :raises JsonRpcInvalidRequestError: if the data is nested too deeply
+        :raises JsonRpcParseError: if the brackets do not match
+        """
+        brackets = strip_to_brackets(data).translate(_BRACES_TO_BRACKETS)
+        if b"[" * (max_depth + 1) in brackets:
+            # The common case of a deep message, which is found with a single search.
+            raise JsonRpcInvalidRequestError(
+                f"Message is nested deeper than {max_depth} levels."
+            )
+        for _ in range(max_depth):
+            if not brackets:
+                return
+            brackets = brackets.replace(b"[]", b"")
+        if b"[]" in brackets:
+            raise JsonRpcInvalidRequestError(
+                f"Message is nested deeper than {max_depth} levels."
+            )
+        if brackets:
+            raise JsonRpcParseError("Invalid JSON format")
@@ -1,15 +1,32 @@
 from __future__ import annotations
-from dataclasses import dataclass
+import collections
+import functools
 import itertools
-import json
 import typing
 
+from .codec import JsonCodec, default_codec
+from .compression import Compression
+from .envelope import find_payload
 from .exc import (
     JsonRpcError,
+    JsonRpcException,
     JsonRpcInternalError,
     JsonRpcInvalidRequestError,
     JsonRpcParseError,
+    _InternedError,
 )
+from .framing import (
+    Chunk,
+    ConcatenatedJsonFramer,
+    ContentLengthFramer,
+    Framer,
+    NewlineFramer,
+)
+from .limits import Limits
+from .metrics import PeerMetrics
+from .pending import PendingRequests
+from .streaming import encode_chunks
+from .tracing import RequestTrace, RequestTracer
 from .types import (
     JsonDict,
     JsonList,
@@ -17,12 +34,30 @@ from .types import (
     JsonRpcId,
     JsonRpcParams,
 )
+from .util import slotted_dataclass
 
 
 class MissingId:
-    """ A sentinel class used to indicate that a request is missing an ID. """
+    """
+    A sentinel class used to indicate that a request is missing an ID.
+
+    This class is a singleton: ``MissingId()`` always returns ``MISSING_ID``.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls) -> MissingId:
+        return MISSING_ID
+
+    def __reduce__(self) -> typing.Tuple[type, tuple]:
+        return (MissingId, ())
+
+    def __repr__(self) -> str:
+        """ Return string representation. """
+        return "MissingId()"
+
 
-    pass
+MISSING_ID: MissingId = object.__new__(MissingId)
 
 
 def validate_json_rpc_id(id_: JsonRpcId, exc: typing.Callable):
@@ -41,7 +76,18 @@ def validate_json_rpc_id(id_: JsonRpcId, exc: typing.Callable):
         raise exc("`id` must be a number, string, or null.")
 
 
-@dataclass
+def validate_json_rpc_method(
+    method: str, params: typing.Optional[JsonRpcParams], exc: typing.Callable
+):
+    """ Validation routine for the method and params fields of a request. """
+    if not isinstance(method, str):
+        raise exc("`method` must be a string.")
+
+    if not (params is None or isinstance(params, (dict, list))):
+        raise exc("`params` must a list or object.")
+
+
+@slotted_dataclass
 class JsonRpcRequest:
     """ Represents a JSON RPC request. """
 
@@ -53,27 +99,43 @@ class JsonRpcRequest:
     @property
     def is_notification(self):
         """ True if this request is a notification. """
-        return isinstance(self.id, MissingId)
+        return self.id is MISSING_ID
 
     def __post_init__(self):
         """ Validation logic. """
         if not self.is_notification:
             validate_json_rpc_id(self.id, JsonRpcInvalidRequestError)
 
-        if not isinstance(self.method, str):
-            raise JsonRpcInvalidRequestError("`method` must be a string.")
-
-        if not (self.params is None or isinstance(self.params, (dict, list))):
-            raise JsonRpcInvalidRequestError("`params` must a list or object.")
+        validate_json_rpc_method(self.method, self.params, JsonRpcInvalidRequestError)
 
         if self.jsonrpc != "2.0":
             raise JsonRpcInvalidRequestError('`jsonrpc` must be "2.0".')
 
+    @classmethod
+    def _unchecked(
+        cls,
+        id_: typing.Union[JsonRpcId, MissingId],
+        method: str,
+        params: typing.Optional[JsonRpcParams],
+    ) -> JsonRpcRequest:
+        """
+        Create a request without running validation.
+
+        This is only for requests that the library builds from values it already
+        trusts, or from received values that it has already checked.
+        """
+        req = object.__new__(cls)
+        req.id = id_
+        req.method = method
+        req.params = params
+        req.jsonrpc = "2.0"
+        return req
+
     def to_json_dict(self) -> JsonDict:
         """ Convert to a JSON dictionary. """
         dict_ = typing.cast(JsonDict, {"method": self.method, "jsonrpc": self.jsonrpc})
-        if not isinstance(self.id, MissingId):
-            dict_["id"] = self.id
+        if self.id is not MISSING_ID:
+            dict_["id"] = typing.cast(JsonRpcId, self.id)
         if self.params is not None:
             dict_["params"] = self.params
         return dict_
@@ -81,7 +143,7 @@ class JsonRpcRequest:
     @classmethod
     def from_json_dict(cls, json_dict: JsonDict) -> JsonRpcRequest:
         """ Create a new request from a JSON dictionary. """
-        id_ = typing.cast(typing.Optional[JsonRpcId], json_dict.get("id", MissingId()))
+        id_ = typing.cast(typing.Optional[JsonRpcId], json_dict.get("id", MISSING_ID))
         params: typing.Optional[JsonDict]
         if "params" in json_dict:
             params = typing.cast(JsonDict, json_dict["params"])
@@ -91,15 +153,15 @@ class JsonRpcRequest:
             id=id_,
             method=typing.cast(str, json_dict["method"]),
             params=params,
-            jsonrpc=typing.cast(str, json_dict["jsonrpc"]),
+            jsonrpc=typing.cast(str, json_dict.get("jsonrpc")),
         )
 
 
 # This type is not defined in the types module because it relies on the class above.
-JsonRpcRequestHandler = typing.Callable[[JsonRpcRequest], None]
+JsonRpcRequestHandler = typing.Callable[[JsonRpcRequest], JsonPrimitive]
 
 
-@dataclass
+@slotted_dataclass
 class JsonRpcResponse:
     """ Represents a JSON RPC response. """
 
@@ -113,9 +175,10 @@ class JsonRpcResponse:
         if self.id is not None:
             validate_json_rpc_id(self.id, JsonRpcInternalError)
 
-        if (self.result is None) == (self.error is None):
+        # A success response may have a null result, so a missing error is enough.
+        if self.result is not None and self.error is not None:
             raise JsonRpcInternalError(
-                "Response must contain one of `result` or `error`."
+                "Response must not contain both `result` and `error`."
             )
 
         if self.result and not isinstance(
@@ -126,6 +189,27 @@ class JsonRpcResponse:
         if self.error and not isinstance(self.error, JsonRpcError):
             raise JsonRpcInternalError("`error` must be a JsonRpcError.")
 
+    @classmethod
+    def _unchecked(
+        cls,
+        id_: typing.Optional[JsonRpcId],
+        result: typing.Optional[JsonPrimitive] = None,
+        error: typing.Optional[JsonRpcError] = None,
+    ) -> JsonRpcResponse:
+        """
+        Create a response without running validation.
+
+        This is only for error responses that the library builds itself, where the ID
+        comes from a request that was already validated, and for received responses
+        whose fields have already been checked.
+        """
+        resp = object.__new__(cls)
+        resp.id = id_
+        resp.result = result
+        resp.error = error
+        resp.jsonrpc = "2.0"
+        return resp
+
     @property
     def success(self):
         """ True if the response contains an error. """
@@ -161,6 +245,484 @@ class JsonRpcResponse:
 
 # This type is not defined in the types module because it relies on the class above.
 JsonRpcResponseCallback = typing.Callable[[JsonRpcResponse], None]
+JsonRpcMessage = typing.Union[JsonRpcRequest, JsonRpcResponse]
+
+
+# Marks a lazy payload that has not been decoded yet.
+_UNDECODED: typing.Any = object()
+_REQUEST_PARAMS = JsonRpcRequest.__dict__["params"]
+_RESPONSE_RESULT = JsonRpcResponse.__dict__["result"]
+
+
+class LazyJsonRpcRequest(JsonRpcRequest):
+    """
+    A request whose params are decoded the first time they are accessed.
+
+    :meth:`JsonRpcPeer.parse` returns these when the peer is created with
+    ``lazy=True``. Until ``params`` is read, the request only holds the encoded
+    params, available as ``raw_params``, and :meth:`JsonRpcPeer.encode` copies them
+    into its output unchanged. Assigning ``params`` replaces the encoded params.
+    """
+
+    __slots__ = ("_raw", "_codec")
+    _raw: typing.Optional[bytes]
+    _codec: JsonCodec
+
+    @property  # type: ignore
+    def params(self) -> typing.Optional[JsonRpcParams]:  # type: ignore
+        """
+        The params, decoded on first access.
+
+        :raises JsonRpcParseError: if the encoded params are not valid JSON
+        """
+        params = _REQUEST_PARAMS.__get__(self)
+        if params is _UNDECODED:
+            params = self._codec.decode(typing.cast(bytes, self._raw))
+            _REQUEST_PARAMS.__set__(self, params)
+            self._raw = None
+        return params
+
+    @params.setter
+    def params(self, params: typing.Optional[JsonRpcParams]) -> None:
+        _REQUEST_PARAMS.__set__(self, params)
+        self._raw = None
+
+    @property
+    def raw_params(self) -> typing.Optional[bytes]:
+        """ The encoded params, or None once they have been decoded or replaced. """
+        return self._raw
+
+    def _envelope_json_dict(self) -> JsonDict:
+        """ Like :meth:`to_json_dict`, but without the params. """
+        dict_ = typing.cast(JsonDict, {"method": self.method, "jsonrpc": self.jsonrpc})
+        if self.id is not MISSING_ID:
+            dict_["id"] = typing.cast(JsonRpcId, self.id)
+        return dict_
+
+
+class LazyJsonRpcResponse(JsonRpcResponse):
+    """
+    A response whose result is decoded the first time it is accessed.
+
+    This is the response counterpart of :class:`LazyJsonRpcRequest`. The encoded
+    result is available as ``raw_result`` until it is decoded or replaced.
+    """
+
+    __slots__ = ("_raw", "_codec")
+    _raw: typing.Optional[bytes]
+    _codec: JsonCodec
+
+    @property  # type: ignore
+    def result(self) -> typing.Optional[JsonPrimitive]:  # type: ignore
+        """
+        The result, decoded on first access.
+
+        :raises JsonRpcParseError: if the encoded result is not valid JSON
+        """
+        result = _RESPONSE_RESULT.__get__(self)
+        if result is _UNDECODED:
+            result = self._codec.decode(typing.cast(bytes, self._raw))
+            _RESPONSE_RESULT.__set__(self, result)
+            self._raw = None
+        return result
+
+    @result.setter
+    def result(self, result: typing.Optional[JsonPrimitive]) -> None:
+        _RESPONSE_RESULT.__set__(self, result)
+        self._raw = None
+
+    @property
+    def raw_result(self) -> typing.Optional[bytes]:
+        """ The encoded result, or None once it has been decoded or replaced. """
+        return self._raw
+
+    def _envelope_json_dict(self) -> JsonDict:
+        """ Like :meth:`to_json_dict`, but without the result. """
+        return typing.cast(JsonDict, {"id": self.id, "jsonrpc": self.jsonrpc})
+
+
+_LazyMessage = typing.Union[LazyJsonRpcRequest, LazyJsonRpcResponse]
+
+
+class EncodedResult(bytes):
+    """
+    A result that is already encoded with the peer's codec.
+
+    A request handler can return one of these, e.g. when the result was encoded by a
+    worker process, and :meth:`JsonRpcPeer.respond_with_result` copies it into the
+    response without decoding it. With a binary codec, or in a batch, the result is
+    decoded and encoded again.
+    """
+
+    __slots__ = ()
+
+
+def _count_message(
+    metrics: PeerMetrics, direction: str, message: JsonRpcMessage
+) -> None:
+    """ Count a message in a peer's metrics. """
+    if isinstance(message, JsonRpcRequest):
+        kind = "notification" if message.id is MISSING_ID else "request"
+        metrics.count_message(direction, kind, message.method)
+    elif message.error is None:
+        metrics.count_message(direction, "result")
+    else:
+        metrics.count_message(direction, "error", code=message.error.code)
+
+
+class JsonRpcBatch(list):
+    """
+    The messages parsed from a batch array.
+
+    This is a list of requests and/or responses. Array elements that are not valid
+    messages do not abort the batch: each of them is recorded in ``errors`` instead, so
+    that a server can answer them as the spec requires.
+    """
+
+    def __init__(
+        self,
+        messages: typing.Iterable[JsonRpcMessage] = (),
+        errors: typing.Iterable[JsonRpcError] = (),
+    ):
+        """ Constructor. """
+        super().__init__(messages)
+        self.errors: typing.List[JsonRpcError] = list(errors)
+
+
+class JsonRpcRequestBatch:
+    """
+    Collects requests and notifications so they can be sent as one batch array.
+
+    Create instances with :meth:`JsonRpcPeer.request_batch`. The whole batch is
+    serialized by a single encoder call.
+    """
+
+    def __init__(self, peer: JsonRpcPeer):
+        """ Constructor. """
+        self._peer = peer
+        self._messages: typing.List[JsonDict] = []
+
+    def __len__(self) -> int:
+        """ The number of messages in the batch. """
+        return len(self._messages)
+
+    def request(
+        self,
+        method: str,
+        params: typing.Optional[JsonRpcParams] = None,
+        *,
+        timeout: typing.Optional[float] = None,
+    ) -> JsonRpcId:
+        """
+        Add a request to the batch.
+
+        :param timeout: See :meth:`JsonRpcPeer.request`.
+        :returns: the request ID, which correlates the request with its response
+        """
+        request_id = next(self._peer._id_gen)
+        validate_json_rpc_method(method, params, JsonRpcInvalidRequestError)
+        req = JsonRpcRequest._unchecked(request_id, method, params)
+        self._messages.append(req.to_json_dict())
+        self._peer._track(request_id, method, timeout)
+        return request_id
+
+    def notify(
+        self, method: str, params: typing.Optional[JsonRpcParams] = None
+    ) -> None:
+        """ Add a notification to the batch. """
+        validate_json_rpc_method(method, params, JsonRpcInvalidRequestError)
+        req = JsonRpcRequest._unchecked(MISSING_ID, method, params)
+        self._messages.append(req.to_json_dict())
+
+    def encode(self) -> bytes:
+        """
+        Return a network representation of the batch.
+
+        :raises RuntimeError: if the batch is empty, since the spec does not allow empty
+            batch arrays
+        """
+        if not self._messages:
+            raise RuntimeError("A batch must contain at least one message.")
+        return self._peer._encode_batch(self._messages)
+
+
+class JsonRpcResponseBatch:
+    """
+    Collects the responses to a batch of requests so they can be sent as one array.
+
+    Create instances with :meth:`JsonRpcPeer.response_batch`. Following the spec,
+    notifications never get a response, and a batch without any responses encodes to
+    an empty byte string, meaning that nothing should be sent at all.
+    """
+
+    def __init__(self, peer: JsonRpcPeer):
+        """ Constructor. """
+        self._peer = peer
+        self._responses: typing.List[JsonDict] = []
+        # The traces of the requests answered so far, and when they were answered.
+        self._traces: typing.List[typing.Tuple[RequestTrace, float]] = []
+
+    def __len__(self) -> int:
+        """ The number of responses in the batch. """
+        return len(self._responses)
+
+    def add_result(self, request: JsonRpcRequest, result: JsonPrimitive) -> None:
+        """ Add a success response to a request, unless it is a notification. """
+        if request.is_notification:
+            return
+        if type(result) is EncodedResult:
+            # orjson only accepts the exact bytes type.
+            result = self._peer._codec.decode(bytes(typing.cast(EncodedResult, result)))
+        resp = JsonRpcResponse(id=typing.cast(JsonRpcId, request.id), result=result)
+        self._responses.append(resp.to_json_dict())
+        if self._peer._tracer is not None:
+            self._take_trace(request)
+
+    def add_error(
+        self, request: typing.Optional[JsonRpcRequest], error: JsonRpcError
+    ) -> None:
+        """
+        Add an error response to the given request, unless it is a notification.
+
+        :param request: If a request ID could be parsed, pass the request object.
+            Otherwise pass None.
+        :param error: The error information to respond with.
+        """
+        request_id: typing.Optional[JsonRpcId]
+        if request is None:
+            request_id = None
+        elif request.is_notification:
+            return
+        else:
+            request_id = typing.cast(JsonRpcId, request.id)
+        resp = JsonRpcResponse._unchecked(request_id, error=error)
+        self._responses.append(resp.to_json_dict())
+        if request is not None and self._peer._tracer is not None:
+            self._take_trace(request)
+
+    def _take_trace(self, request: JsonRpcRequest) -> None:
+        """ Stop tracing a request, so that its trace finishes when the batch does. """
+        tracer = typing.cast(RequestTracer, self._peer._tracer)
+        trace = tracer._take(typing.cast(JsonRpcId, request.id))
+        if trace is not None:
+            self._traces.append((trace, tracer.clock()))
+
+    def encode(self) -> bytes:
+        """
+        Return a network representation of the batch.
+
+        :returns: the encoded array, or ``b""`` if there is nothing to send
+        """
+        if not self._responses:
+            return b""
+        peer = self._peer
+        data = peer._encode_batch(self._responses)
+        if self._traces:
+            tracer = typing.cast(RequestTracer, peer._tracer)
+            encoded_at = tracer.clock()
+            for trace, handled_at in self._traces:
+                tracer._finish(trace, handled_at, encoded_at, len(data))
+            self._traces = []
+        return data
+
+
+class JsonRpcOutput:
+    """
+    Collects framed outgoing messages so that they can be sent with one write.
+
+    Create instances with :meth:`JsonRpcPeer.output`. Each method encodes a message
+    like the peer method of the same name and frames it with the peer's framer. If the
+    output was created with a buffer, the framed message is appended to that buffer, so
+    many messages end up in one contiguous ``bytearray``. Otherwise the output keeps a
+    list of chunks for a vectored write such as ``writelines()`` or
+    ``socket.sendmsg()``, and the encoded messages are never copied.
+    """
+
+    def __init__(self, peer: JsonRpcPeer, buffer: typing.Optional[bytearray] = None):
+        """ Constructor. """
+        self._peer = peer
+        self._buffer = buffer
+        self._chunks: typing.List[bytes] = []
+        self._add: typing.Callable[[bytes], None]
+        if buffer is None:
+            frame_chunks = peer._framer.frame_chunks
+            extend = self._chunks.extend
+            self._add = lambda data: extend(frame_chunks(data))
+            self._start = 0
+        else:
+            self._add = functools.partial(peer._framer.frame_into, buffer)
+            self._start = len(buffer)
+
+    def __len__(self) -> int:
+        """ The number of bytes that were added. """
+        if self._buffer is None:
+            return sum(map(len, self._chunks))
+        return len(self._buffer) - self._start
+
+    @property
+    def buffer(self) -> typing.Optional[bytearray]:
+        """ The buffer that framed messages are appended to, if there is one. """
+        return self._buffer
+
+    @property
+    def chunks(self) -> typing.List[bytes]:
+        """ The chunks to write, unless this output appends to a buffer. """
+        return self._chunks
+
+    def add(self, data: bytes) -> None:
+        """ Frame and add a message that is already encoded, e.g. a batch. """
+        self._add(data)
+
+    def request(
+        self,
+        method: str,
+        params: typing.Optional[JsonRpcParams] = None,
+        *,
+        timeout: typing.Optional[float] = None,
+    ) -> JsonRpcId:
+        """ Add a new request, see :meth:`JsonRpcPeer.request`, and return its ID. """
+        request_id, data = self._peer.request(method, params, timeout=timeout)
+        self._add(data)
+        return request_id
+
+    def notify(
+        self, method: str, params: typing.Optional[JsonRpcParams] = None
+    ) -> None:
+        """ Add a notification. """
+        self._add(self._peer.notify(method, params))
+
+    def respond_with_result(
+        self, request: JsonRpcRequest, result: JsonPrimitive
+    ) -> None:
+        """ Add a success response to a given request. """
+        self._add(self._peer.respond_with_result(request, result))
+
+    def respond_with_error(
+        self, request: typing.Optional[JsonRpcRequest], error: JsonRpcError
+    ) -> None:
+        """ Add an error response, see :meth:`JsonRpcPeer.respond_with_error`. """
+        self._add(self._peer.respond_with_error(request, error))
+
+    def clear(self) -> None:
+        """
+        Forget the chunks, or remove the added bytes from the buffer, after they have
+        been written. The list of chunks is emptied in place.
+        """
+        if self._buffer is None:
+            self._chunks.clear()
+        else:
+            del self._buffer[self._start :]
+
+
+class JsonRpcPreparedCall:
+    """
+    A method whose request envelope has been serialized in advance.
+
+    Create instances with :meth:`JsonRpcPeer.prepare`. The constant parts of the
+    message, such as ``{"method":"...","jsonrpc":"2.0","id":``, are encoded once, so
+    each call only encodes the params and the ID and joins them with the cached bytes.
+    The output is identical to :meth:`JsonRpcPeer.request` and
+    :meth:`JsonRpcPeer.notify`. If the peer's codec does not produce output that can
+    be split this way, the prepared call simply uses those methods instead.
+    """
+
+    def __init__(self, peer: JsonRpcPeer, method: str):
+        """ Constructor. """
+        validate_json_rpc_method(method, None, JsonRpcInvalidRequestError)
+        self._peer = peer
+        self._encode = peer._codec.encode
+        self.method = method
+
+        def encode_probe(id_, params):
+            req = JsonRpcRequest._unchecked(id_, method, params)
+            return self._encode(req.to_json_dict())
+
+        # Encode sample messages and find the constant parts around the ID and params.
+        request = encode_probe(0, None)
+        request_params = encode_probe(0, [])
+        notify = encode_probe(MISSING_ID, None)
+        notify_params = encode_probe(MISSING_ID, [])
+        self._request_prefix = request[:-2]
+        self._request_sep = request_params[len(request) - 1 : -3]
+        self._notify_prefix = notify[:-1]
+        self._notify_sep = notify_params[len(notify) - 1 : -3]
+        self._templated = (
+            request.endswith(b"0}")
+            and request_params
+            == self._request_prefix + b"0" + self._request_sep + b"[]}"
+            and notify.endswith(b"}")
+            and notify_params == self._notify_prefix + self._notify_sep + b"[]}"
+        )
+
+    def __repr__(self) -> str:
+        """ Return string representation. """
+        return f"JsonRpcPreparedCall(method={self.method!r})"
+
+    def request(
+        self,
+        params: typing.Optional[JsonRpcParams] = None,
+        *,
+        timeout: typing.Optional[float] = None,
+    ) -> typing.Tuple[JsonRpcId, bytes]:
+        """
+        Create a new request for this method.
+
+        :param params: Parameters to pass to the remote method.
+        :param timeout: See :meth:`JsonRpcPeer.request`.
+        """
+        if not self._templated:
+            return self._peer.request(self.method, params, timeout=timeout)
+        metrics = self._peer._metrics
+        start = 0.0 if metrics is None else metrics.clock()
+        request_id = next(self._peer._id_gen)
+        id_bytes = b"%d" % request_id
+        if params is None:
+            data = b"".join((self._request_prefix, id_bytes, b"}"))
+        elif isinstance(params, (dict, list)):
+            data = b"".join(
+                (
+                    self._request_prefix,
+                    id_bytes,
+                    self._request_sep,
+                    self._encode(params),
+                    b"}",
+                )
+            )
+        else:
+            raise JsonRpcInvalidRequestError("`params` must a list or object.")
+        self._peer._track(request_id, self.method, timeout)
+        if self._peer._compression is not None:
+            data = self._peer._compression.compress(data)
+        if metrics is not None:
+            self._record(metrics, "request", data, start)
+        return request_id, data
+
+    def notify(self, params: typing.Optional[JsonRpcParams] = None) -> bytes:
+        """ Create a notification for this method. """
+        if not self._templated:
+            return self._peer.notify(self.method, params)
+        metrics = self._peer._metrics
+        start = 0.0 if metrics is None else metrics.clock()
+        if params is None:
+            data = self._notify_prefix + b"}"
+        elif isinstance(params, (dict, list)):
+            data = b"".join(
+                (self._notify_prefix, self._notify_sep, self._encode(params), b"}")
+            )
+        else:
+            raise JsonRpcInvalidRequestError("`params` must a list or object.")
+        if self._peer._compression is not None:
+            data = self._peer._compression.compress(data)
+        if metrics is not None:
+            self._record(metrics, "notification", data, start)
+        return data
+
+    def _record(
+        self, metrics: PeerMetrics, kind: str, data: bytes, start: float
+    ) -> None:
+        """ Record an encoded message in the peer's metrics. """
+        metrics.record_encode(len(data), metrics.clock() - start)
+        metrics.count_message("sent", kind, self.method)
 
 
 class JsonRpcPeer:
@@ -179,31 +741,220 @@ class JsonRpcPeer:
     """
 
     def __init__(
-        self, request_handler: typing.Optional[JsonRpcRequestHandler] = None,
+        self,
+        request_handler: typing.Optional[JsonRpcRequestHandler] = None,
+        *,
+        framer: typing.Optional[Framer] = None,
+        codec: typing.Optional[JsonCodec] = None,
+        pending: typing.Optional[PendingRequests] = None,
+        prepared_cache_size: int = 256,
+        lazy: bool = False,
+        limits: typing.Optional[Limits] = None,
+        metrics: typing.Optional[PeerMetrics] = None,
+        tracer: typing.Optional[RequestTracer] = None,
+        compression: typing.Optional[Compression] = None,
     ):
-        """ Constructor """
+        """
+        Constructor
+
+        :param request_handler: Called by :meth:`handle` with each received request.
+            It returns the result, or raises a ``JsonRpcException`` to send an error
+            response. A :class:`JsonRpcDispatcher` is a convenient handler.
+        :param framer: The framing used to split the stream passed to :meth:`feed`
+            into messages. Defaults to back-to-back JSON values with no delimiter, or
+            to a ``Content-Length`` header if the codec is binary or if frames are
+            compressed.
+        :param codec: The JSON backend used to encode and parse messages. Defaults to
+            the fastest JSON backend that is installed. A binary codec, such as
+            :class:`PureMsgpackCodec`, carries the same messages in a more compact
+            format.
+        :param pending: If given, every request created by this peer is added to this
+            tracker, so that responses can be matched to requests and requests
+            without a response can be expired.
+        :param prepared_cache_size: The number of prepared calls that
+            :meth:`prepare` keeps. The least recently used call is evicted first.
+        :param lazy: If True, :meth:`parse` only decodes the envelope of each message.
+            Params and results that are objects or arrays are left encoded until they
+            are accessed, see :class:`LazyJsonRpcRequest`. Batches are always decoded
+            completely.
+        :param limits: Limits on the size and shape of received messages, which are
+            checked before the messages are decoded. The maximum frame size also
+            applies to the default framer. Only the frame size and batch length can be
+            limited if the codec is binary.
+        :param metrics: If given, every message that this peer encodes or parses is
+            counted and timed in this collector.
+        :param tracer: If given, the stages of each received request are timed from
+            its first byte until its response is encoded.
+        :param compression: If given, frames that this peer encodes are compressed,
+            and compressed frames that it parses are decompressed. The maximum frame
+            size limits the decompressed size as well.
+        :raises RuntimeError: if the codec is binary and lazy parsing, a depth limit,
+            or a string length limit is requested, since those scan JSON text, or if
+            frames are compressed but the framer relies on delimiters
+        """
         self._id_gen = itertools.count()
+        self._request_handler = request_handler
+        self._codec = codec or default_codec()
+        if self._codec.binary:
+            if lazy:
+                raise RuntimeError("Lazy parsing requires a JSON text codec.")
+            if limits is not None and (
+                limits.max_depth is not None or limits.max_string_length is not None
+            ):
+                raise RuntimeError(
+                    "Depth and string length limits require a JSON text codec."
+                )
+        if framer is None:
+            max_frame_bytes = None if limits is None else limits.max_frame_bytes
+            if self._codec.binary or compression is not None:
+                framer = ContentLengthFramer(max_frame_bytes=max_frame_bytes)
+            else:
+                framer = ConcatenatedJsonFramer(max_frame_bytes=max_frame_bytes)
+        elif compression is not None and isinstance(
+            framer, (ConcatenatedJsonFramer, NewlineFramer)
+        ):
+            raise RuntimeError("Compression requires a length-prefixed framer.")
+        self._framer = framer
+        self._pending = pending
+        self._prepared: collections.OrderedDict[str, JsonRpcPreparedCall]
+        self._prepared = collections.OrderedDict()
+        self._prepared_cache_size = prepared_cache_size
+        self._lazy = lazy
+        self._limits = limits
+        self._metrics = metrics
+        self._tracer = tracer
+        self._compression = compression
+        # Whether encoding needs more than the codec, so the fast paths are skipped.
+        self._hooked = metrics is not None or compression is not None
+        # The encoded error responses around the ID, by code and message of each
+        # interned error.
+        self._error_templates: typing.Dict[
+            typing.Tuple[int, str], typing.Optional[typing.Tuple[bytes, bytes]]
+        ] = dict()
+        # When the first byte of the next frame, and the latest chunk, were fed.
+        self._frame_fed_at = 0.0
+        self._last_fed_at = 0.0
+
+    @property
+    def codec(self) -> JsonCodec:
+        """ The JSON backend used to encode and parse messages. """
+        return self._codec
+
+    @property
+    def pending(self) -> typing.Optional[PendingRequests]:
+        """ The tracker for outstanding requests, if this peer has one. """
+        return self._pending
+
+    @property
+    def metrics(self) -> typing.Optional[PeerMetrics]:
+        """ The metrics collector, if this peer has one. """
+        return self._metrics
+
+    @property
+    def tracer(self) -> typing.Optional[RequestTracer]:
+        """ The request tracer, if this peer has one. """
+        return self._tracer
+
+    @property
+    def compression(self) -> typing.Optional[Compression]:
+        """ The frame compression, if this peer has one. """
+        return self._compression
+
+    @property
+    def framer(self) -> Framer:
+        """ The framer that splits the stream passed to :meth:`feed`. """
+        return self._framer
 
     def request(
-        self, method: str, params: typing.Optional[JsonRpcParams] = None,
+        self,
+        method: str,
+        params: typing.Optional[JsonRpcParams] = None,
+        *,
+        timeout: typing.Optional[float] = None,
     ) -> typing.Tuple[JsonRpcId, bytes]:
         """
         Create a new request.
 
         :param method: The method to invoke on the JSON-RPC server.
         :param params: Parameters to pass to the remote method.
+        :param timeout: Seconds until the request expires in the pending-request
+            tracker. Defaults to the tracker's default timeout.
+        :raises RuntimeError: if a timeout is given but this peer has no tracker
         """
         request_id = next(self._id_gen)
-        req = JsonRpcRequest(id=request_id, method=method, params=params)
-        bytes_to_send = json.dumps(req.to_json_dict()).encode("utf8")
+        validate_json_rpc_method(method, params, JsonRpcInvalidRequestError)
+        req = JsonRpcRequest._unchecked(request_id, method, params)
+        if self._hooked:
+            bytes_to_send = self.encode(req)
+        else:
+            bytes_to_send = self._codec.encode(req.to_json_dict())
+        self._track(request_id, method, timeout)
         return request_id, bytes_to_send
 
+    def _track(
+        self, request_id: JsonRpcId, method: str, timeout: typing.Optional[float]
+    ) -> None:
+        """ Add a new request to the pending-request tracker, if there is one. """
+        if self._pending is not None:
+            self._pending.add(request_id, method, timeout=timeout)
+        elif timeout is not None:
+            raise RuntimeError("A request timeout requires a pending-request tracker.")
+
     def notify(
         self, method: str, params: typing.Optional[JsonRpcParams] = None
     ) -> bytes:
         """ Create a notification and return a network representation. """
-        req = JsonRpcRequest(id=MissingId(), method=method, params=params)
-        return json.dumps(req.to_json_dict()).encode("utf8")
+        validate_json_rpc_method(method, params, JsonRpcInvalidRequestError)
+        req = JsonRpcRequest._unchecked(MISSING_ID, method, params)
+        if self._hooked:
+            return self.encode(req)
+        return self._codec.encode(req.to_json_dict())
+
+    def prepare(self, method: str) -> JsonRpcPreparedCall:
+        """
+        Return a prepared call for a method that is called often.
+
+        Prepared calls are cached, so preparing the same method again is cheap. The
+        cache is bounded: once it is full, the least recently used call is evicted.
+        """
+        prepared = self._prepared.get(method)
+        if prepared is None:
+            prepared = JsonRpcPreparedCall(self, method)
+            if self._prepared_cache_size > 0:
+                self._prepared[method] = prepared
+                if len(self._prepared) > self._prepared_cache_size:
+                    self._prepared.popitem(last=False)
+        else:
+            self._prepared.move_to_end(method)
+        return prepared
+
+    def output(self, buffer: typing.Optional[bytearray] = None) -> JsonRpcOutput:
+        """
+        Create a collector for framed outgoing messages.
+
+        :param buffer: If given, framed messages are appended to this buffer.
+            Otherwise they are collected as a list of chunks.
+        """
+        return JsonRpcOutput(self, buffer)
+
+    def request_batch(self) -> JsonRpcRequestBatch:
+        """ Create a builder for a batch of requests and notifications. """
+        return JsonRpcRequestBatch(self)
+
+    def response_batch(
+        self, received: typing.Optional[JsonRpcBatch] = None
+    ) -> JsonRpcResponseBatch:
+        """
+        Create a builder for the responses to a batch of requests.
+
+        :param received: The batch returned by :meth:`parse`. If given, an error
+            response is added for each array element that was not a valid request.
+        """
+        batch = JsonRpcResponseBatch(self)
+        if received is not None:
+            for error in received.errors:
+                batch.add_error(None, error)
+        return batch
 
     def respond_with_result(
         self, request: JsonRpcRequest, result: JsonPrimitive
@@ -212,8 +963,90 @@ class JsonRpcPeer:
         Create a success response to a given request and return a network
         representation.
         """
+        if type(result) is EncodedResult:
+            return self._respond_with_encoded(
+                request, typing.cast(EncodedResult, result)
+            )
         resp = JsonRpcResponse(id=typing.cast(JsonRpcId, request.id), result=result)
-        return json.dumps(resp.to_json_dict()).encode("utf8")
+        if self._tracer is not None:
+            return self._respond_traced(request, resp)
+        if self._hooked:
+            return self.encode(resp)
+        return self._codec.encode(resp.to_json_dict())
+
+    def _respond_with_encoded(
+        self, request: JsonRpcRequest, result: EncodedResult
+    ) -> bytes:
+        """ Create a success response that copies an encoded result into its output. """
+        if self._codec.binary:
+            decoded = self._codec.decode(bytes(result))
+            return self.respond_with_result(request, decoded)
+        resp = LazyJsonRpcResponse._unchecked(
+            typing.cast(JsonRpcId, request.id), result=_UNDECODED
+        )
+        lazy_resp = typing.cast(LazyJsonRpcResponse, resp)
+        lazy_resp._raw = result
+        lazy_resp._codec = self._codec
+        if self._tracer is not None:
+            return self._respond_traced(request, resp)
+        return self.encode(resp)
+
+    def respond_with_result_stream(
+        self,
+        request: JsonRpcRequest,
+        result: typing.Any,
+        *,
+        chunk_size: int = 65536,
+    ) -> typing.Iterator[bytes]:
+        """
+        Create a success response to a given request, and encode it incrementally.
+
+        The envelope is yielded first, before any of the result is encoded. Then the
+        result is encoded and yielded in chunks of about ``chunk_size`` bytes, so the
+        whole encoded response never exists in memory at once. Large lists and
+        objects in the result are encoded one item at a time, and the result may also
+        be an iterator, e.g. a generator, which is encoded as an array.
+
+        The chunks are already framed, so they can be written to the stream as they
+        are. This requires a framer that does not need to know the size of a frame in
+        advance, i.e. not :class:`ContentLengthFramer`.
+
+        :raises RuntimeError: if the codec is binary, or the framer needs the size of
+            each frame
+        """
+        trailer = self._framer.trailer
+        if trailer is None:
+            raise RuntimeError("Streaming requires a framer without a length prefix.")
+        if self._codec.binary:
+            raise RuntimeError("Streaming requires a JSON text codec.")
+        return self._stream_result(request, result, trailer, chunk_size)
+
+    def _stream_result(
+        self,
+        request: JsonRpcRequest,
+        result: typing.Any,
+        trailer: bytes,
+        chunk_size: int,
+    ) -> typing.Iterator[bytes]:
+        """ Yield the chunks of a streamed response, see above. """
+        trace = None
+        if self._tracer is not None:
+            trace = self._tracer._take(typing.cast(JsonRpcId, request.id))
+            handled_at = self._tracer.clock()
+        envelope = self._codec.encode({"id": request.id, "jsonrpc": "2.0"}).rstrip()
+        prefix = envelope[:-1] + b',"result":'
+        size = 0
+        for chunk in encode_chunks(
+            self._codec, result, prefix, b"}" + trailer, chunk_size
+        ):
+            size += len(chunk)
+            yield chunk
+        if self._metrics is not None:
+            self._metrics.bytes_sent += size
+            self._metrics.count_message("sent", "result")
+        if trace is not None:
+            tracer = typing.cast(RequestTracer, self._tracer)
+            tracer._finish(trace, handled_at, tracer.clock(), size)
 
     def respond_with_error(
         self, request: typing.Optional[JsonRpcRequest], error: JsonRpcError
@@ -231,38 +1064,509 @@ class JsonRpcPeer:
             request_id = None
         else:
             request_id = typing.cast(JsonRpcId, request.id)
-        resp = JsonRpcResponse(id=request_id, error=error)
-        return json.dumps(resp.to_json_dict()).encode("utf8")
+            # The caller passes the request, so the fast paths below must not trust
+            # its ID; a notification has none to respond to.
+            if request_id is not None:
+                validate_json_rpc_id(request_id, JsonRpcInternalError)
+        if type(error) is _InternedError and self._tracer is None and not self._hooked:
+            data = self._respond_with_interned(request_id, error)
+            if data is not None:
+                return data
+        resp = JsonRpcResponse._unchecked(request_id, error=error)
+        if self._tracer is not None:
+            return self._respond_traced(request, resp)
+        if self._hooked:
+            return self.encode(resp)
+        return self._codec.encode(resp.to_json_dict())
+
+    def _respond_with_interned(
+        self, request_id: typing.Optional[JsonRpcId], error: JsonRpcError
+    ) -> typing.Optional[bytes]:
+        """
+        Encode an error response by joining the ID with the cached encoding around it.
+
+        Interned errors never have data, so the cache is keyed by code and message,
+        which stay valid even if an interned error is freed and its id() reused. The
+        encoding around the ID is found by encoding a few sample responses, like
+        :class:`JsonRpcPreparedCall` does for requests.
+
+        :returns: the encoded response, or None if the codec's output cannot be split
+            around the ID
+        """
+        key = (error.code, error.message)
+        if key in self._error_templates:
+            template = self._error_templates[key]
+        else:
+            template = self._error_templates[key] = self._error_template(error)
+        if template is None:
+            return None
+        if type(request_id) is int:
+            id_bytes = b"%d" % typing.cast(int, request_id)
+        elif request_id is None:
+            id_bytes = b"null"
+        else:
+            id_bytes = self._codec.encode(request_id)
+        return b"".join((template[0], id_bytes, template[1]))
+
+    def _error_template(
+        self, error: JsonRpcError
+    ) -> typing.Optional[typing.Tuple[bytes, bytes]]:
+        """ Return the encoding of an error response before and after the ID. """
+        if self._codec.binary:
+            return None
+        encode = self._codec.encode
+
+        def encode_probe(id_):
+            return encode(JsonRpcResponse._unchecked(id_, error=error).to_json_dict())
+
+        zero = encode_probe(0)
+        start = zero.find(b"0")
+        prefix = zero[:start]
+        suffix = zero[start + 1 :]
+        for id_, id_bytes in ((1, b"1"), (None, b"null"), ("a", encode("a"))):
+            if encode_probe(id_) != prefix + id_bytes + suffix:
+                return None
+        return prefix, suffix
+
+    def _respond_traced(
+        self, request: typing.Optional[JsonRpcRequest], response: JsonRpcResponse
+    ) -> bytes:
+        """ Encode a response and finish the trace of its request, if there is one. """
+        tracer = typing.cast(RequestTracer, self._tracer)
+        trace = None if request is None else tracer._take(request.id)  # type: ignore
+        if trace is None:
+            return self.encode(response)
+        handled_at = tracer.clock()
+        data = self.encode(response)
+        tracer._finish(trace, handled_at, tracer.clock(), len(data))
+        return data
+
+    def encode(self, message: JsonRpcMessage) -> bytes:
+        """
+        Return a network representation of a message.
+
+        The params or result of a lazy message that have not been decoded are copied
+        into the output as they were received, without decoding or encoding them.
+        """
+        if self._metrics is not None:
+            return self._encode_measured(message)
+        if self._compression is not None:
+            return self._compression.compress(self._encode(message))
+        return self._encode(message)
+
+    def _encode(self, message: JsonRpcMessage) -> bytes:
+        """ Return a network representation of a message, see :meth:`encode`. """
+        if isinstance(message, (LazyJsonRpcRequest, LazyJsonRpcResponse)):
+            raw = message._raw
+            if raw is not None:
+                if isinstance(message, LazyJsonRpcRequest):
+                    member = b',"params":'
+                else:
+                    member = b',"result":'
+                envelope = self._codec.encode(message._envelope_json_dict()).rstrip()
+                return b"".join((envelope[:-1], member, raw, b"}"))
+        return self._codec.encode(message.to_json_dict())
+
+    def _encode_measured(self, message: JsonRpcMessage) -> bytes:
+        """ Encode a message and record it in the peer's metrics. """
+        metrics = typing.cast(PeerMetrics, self._metrics)
+        start = metrics.clock()
+        data = self._encode(message)
+        if self._compression is not None:
+            data = self._compression.compress(data)
+        metrics.record_encode(len(data), metrics.clock() - start)
+        _count_message(metrics, "sent", message)
+        return data
+
+    def _encode_batch(self, json_dicts: typing.List[JsonDict]) -> bytes:
+        """ Encode a batch array. """
+        if self._metrics is not None:
+            return self._encode_batch_measured(json_dicts)
+        data = self._codec.encode(json_dicts)
+        if self._compression is not None:
+            return self._compression.compress(data)
+        return data
+
+    def _encode_batch_measured(self, json_dicts: typing.List[JsonDict]) -> bytes:
+        """ Encode a batch array and record it in the peer's metrics. """
+        metrics = typing.cast(PeerMetrics, self._metrics)
+        start = metrics.clock()
+        data = self._codec.encode(json_dicts)
+        if self._compression is not None:
+            data = self._compression.compress(data)
+        metrics.record_encode(len(data), metrics.clock() - start)
+        for json_dict in json_dicts:
+            if "method" in json_dict:
+                kind = "request" if "id" in json_dict else "notification"
+                method = typing.cast(str, json_dict["method"])
+                metrics.count_message("sent", kind, method)
+            elif "error" in json_dict:
+                error = typing.cast(JsonDict, json_dict["error"])
+                code = typing.cast(int, error["code"])
+                metrics.count_message("sent", "error", code=code)
+            else:
+                metrics.count_message("sent", "result")
+        return data
 
     def parse(
-        self, recv_bytes: bytes
-    ) -> typing.Iterable[typing.Union[JsonRpcRequest, JsonRpcResponse]]:
+        self, recv_bytes: bytes, *, received_at: typing.Optional[float] = None
+    ) -> typing.Iterable[JsonRpcMessage]:
         """
         Parse a network representation.
 
+        If the data is a batch array, then the result is a :class:`JsonRpcBatch`
+        containing every valid message in the array.
+
+        :param received_at: When the first byte of the data was received, according to
+            the tracer's clock. This is only used by the peer's tracer, which otherwise
+            starts each trace when parsing begins.
         :returns: an iterable of parsed objects
         :raises JsonRpcParseError: if the data cannot be parsed
+        :raises JsonRpcInvalidRequestError: if the data is an empty batch array, or a
+            message whose members are missing or have the wrong type, or if it exceeds
+            the peer's limits
         """
+        if self._tracer is not None:
+            return self._parse_traced(recv_bytes, received_at)
+        if self._metrics is not None:
+            return self._parse_measured(recv_bytes)
+        return self._parse(recv_bytes)
 
-        try:
-            recv_str = recv_bytes.decode("utf8")
-        except Exception:
-            raise JsonRpcParseError("Invalid ASCII encoding")
+    def _parse(self, recv_bytes: bytes) -> typing.Iterable[JsonRpcMessage]:
+        """ Parse a network representation, see :meth:`parse`. """
+        if self._compression is not None:
+            max_size = None if self._limits is None else self._limits.max_frame_bytes
+            recv_bytes = self._compression.decompress(recv_bytes, max_size)
+        if self._limits is not None:
+            self._limits.check(recv_bytes)
 
         try:
-            recv_dict = json.loads(recv_str)
-        except:
-            raise JsonRpcParseError("Invalid JSON format")
+            if self._lazy:
+                payload = find_payload(recv_bytes)
+                if payload is not None:
+                    return (self._parse_lazy(recv_bytes, *payload),)
+
+            recv_obj = self._codec.decode(recv_bytes)
+
+            if isinstance(recv_obj, list):
+                return self._parse_batch(recv_obj)
 
-        messages: typing.Iterable[typing.Union[JsonRpcRequest, JsonRpcResponse]]
+            message = self._parse_message(recv_obj)
+        except (KeyError, TypeError):
+            # A member is missing, or has the wrong type.
+            raise JsonRpcInvalidRequestError()
+        if message is None:
+            raise self._not_a_message(recv_bytes)
 
-        if "method" in recv_dict:
-            messages = (JsonRpcRequest.from_json_dict(recv_dict),)
-        elif "result" in recv_dict or "error" in recv_dict:
-            messages = (JsonRpcResponse.from_json_dict(recv_dict),)
+        return (message,)
+
+    def _parse_traced(
+        self, recv_bytes: bytes, received_at: typing.Optional[float]
+    ) -> typing.Iterable[JsonRpcMessage]:
+        """ Parse a network representation and start tracing its requests. """
+        tracer = typing.cast(RequestTracer, self._tracer)
+        started_at = tracer.clock()
+        if self._metrics is None:
+            messages = self._parse(recv_bytes)
         else:
-            msg = "Could parse a request or a response: "
-            example = recv_str[:100] + ("..." if len(recv_str) > 100 else "")
-            raise JsonRpcParseError(msg + example)
+            messages = self._parse_measured(recv_bytes)
+        parsed_at = tracer.clock()
+        if received_at is None:
+            received_at = started_at
+        size = len(recv_bytes)
+        for message in messages:
+            if isinstance(message, JsonRpcRequest) and message.id is not MISSING_ID:
+                tracer._begin(
+                    typing.cast(JsonRpcId, message.id),
+                    message.method,
+                    size,
+                    received_at,
+                    started_at,
+                    parsed_at,
+                )
+        return messages
 
+    def _parse_measured(self, recv_bytes: bytes) -> typing.Iterable[JsonRpcMessage]:
+        """ Parse a network representation and record it in the peer's metrics. """
+        metrics = typing.cast(PeerMetrics, self._metrics)
+        start = metrics.clock()
+        try:
+            messages = self._parse(recv_bytes)
+        except JsonRpcException as exc:
+            metrics.count_error("rejected", exc.code)
+            raise
+        finally:
+            metrics.record_parse(len(recv_bytes), metrics.clock() - start)
+        for message in messages:
+            _count_message(metrics, "received", message)
+        if isinstance(messages, JsonRpcBatch):
+            for error in messages.errors:
+                metrics.count_error("rejected", error.code)
         return messages
+
+    def parse_many(
+        self, frames: typing.Iterable[bytes]
+    ) -> typing.Tuple[
+        typing.List[typing.Optional[typing.Iterable[JsonRpcMessage]]],
+        typing.List[typing.Optional[bytes]],
+    ]:
+        """
+        Parse many frames, collecting errors instead of raising them.
+
+        A frame that cannot be parsed does not stop the frames after it. Instead, an
+        error response is encoded for it, ready to be sent back. Frames that fail with
+        the same error share the same encoded response.
+
+        :returns: two lists that are parallel to ``frames``. For each frame, the first
+            list holds what :meth:`parse` returns, or None if parsing failed, and the
+            second list holds None, or the encoded error response if parsing failed.
+        """
+        messages: typing.List[typing.Optional[typing.Iterable[JsonRpcMessage]]] = []
+        errors: typing.List[typing.Optional[bytes]] = []
+        add_messages = messages.append
+        add_error = errors.append
+        encoded_errors: typing.Dict[typing.Tuple[int, str], bytes] = dict()
+        parse = self.parse
+        decode = self._codec.decode
+        parse_message = self._parse_message
+        limits = self._limits
+        inline = (
+            not self._lazy
+            and self._metrics is None
+            and self._tracer is None
+            and self._compression is None
+        )
+        for frame in frames:
+            try:
+                if not inline:
+                    add_messages(parse(frame))
+                else:
+                    # This is parse(), inlined.
+                    if limits is not None:
+                        limits.check(frame)
+                    recv_obj = decode(frame)
+                    message = parse_message(recv_obj)
+                    if message is not None:
+                        add_messages((message,))
+                    elif type(recv_obj) is list:
+                        add_messages(self._parse_batch(recv_obj))
+                    else:
+                        raise self._not_a_message(frame)
+                add_error(None)
+                continue
+            except JsonRpcException as exc:
+                error = exc.get_error()
+            except (KeyError, TypeError):
+                error = JsonRpcInvalidRequestError().get_error()
+            key = (error.code, error.message)
+            encoded = encoded_errors.get(key)
+            if encoded is None:
+                encoded = encoded_errors[key] = self.respond_with_error(None, error)
+            add_messages(None)
+            add_error(encoded)
+        return messages, errors
+
+    def _parse_lazy(
+        self, recv_bytes: bytes, name: bytes, start: int, end: int
+    ) -> JsonRpcMessage:
+        """
+        Parse a message but leave its payload, at ``recv_bytes[start:end]``, encoded.
+
+        The envelope is decoded with an empty object or array in place of the payload,
+        so it is validated as usual without copying the payload more than once.
+        """
+        stand_in = b"{}" if recv_bytes[start] == ord("{") else b"[]"
+        recv_obj = self._codec.decode(
+            b"".join((recv_bytes[:start], stand_in, recv_bytes[end:]))
+        )
+        message: JsonRpcMessage
+        if "method" in recv_obj:
+            if name != b"params":
+                return JsonRpcRequest.from_json_dict(recv_obj)
+            message = LazyJsonRpcRequest.from_json_dict(recv_obj)
+            _REQUEST_PARAMS.__set__(message, _UNDECODED)
+        elif "result" in recv_obj or "error" in recv_obj:
+            if name != b"result":
+                return JsonRpcResponse.from_json_dict(recv_obj)
+            message = LazyJsonRpcResponse.from_json_dict(recv_obj)
+            _RESPONSE_RESULT.__set__(message, _UNDECODED)
+        else:
+            raise self._not_a_message(recv_bytes)
+        lazy_message = typing.cast(_LazyMessage, message)
+        lazy_message._raw = recv_bytes[start:end]
+        lazy_message._codec = self._codec
+        return message
+
+    @staticmethod
+    def _not_a_message(recv_bytes: bytes) -> JsonRpcParseError:
+        """ The error for data that is valid JSON but not a message. """
+        msg = "Could parse a request or a response: "
+        example = recv_bytes[:100].decode("utf8", "replace")
+        example += "..." if len(recv_bytes) > 100 else ""
+        return JsonRpcParseError(msg + example)
+
+    @staticmethod
+    def _parse_message(recv_obj: typing.Any) -> typing.Optional[JsonRpcMessage]:
+        """ Convert a decoded JSON value to a message, or None if it is neither. """
+        if type(recv_obj) is dict and recv_obj.get("jsonrpc") == "2.0":
+            # Fast path: well-formed messages are checked here, with a few type
+            # comparisons, and built without running the validation again.
+            id_ = recv_obj.get("id", MISSING_ID)
+            id_type = type(id_)
+            if id_type is int or id_type is str or id_ is MISSING_ID:
+                method = recv_obj.get("method")
+                if type(method) is str:
+                    params = recv_obj.get("params")
+                    if params is None or type(params) in (dict, list):
+                        return JsonRpcRequest._unchecked(id_, method, params)
+                elif (
+                    method is None
+                    and id_ is not MISSING_ID
+                    and "method" not in recv_obj
+                    and "error" not in recv_obj
+                    and "result" in recv_obj
+                ):
+                    return JsonRpcResponse._unchecked(id_, recv_obj["result"])
+        if not isinstance(recv_obj, dict):
+            return None
+        if "method" in recv_obj:
+            return JsonRpcRequest.from_json_dict(recv_obj)
+        if "result" in recv_obj or "error" in recv_obj:
+            return JsonRpcResponse.from_json_dict(recv_obj)
+        return None
+
+    def _parse_batch(self, recv_list: JsonList) -> JsonRpcBatch:
+        """ Convert a decoded batch array to messages. """
+        if not recv_list:
+            raise JsonRpcInvalidRequestError("Batch array must not be empty.")
+        if self._limits is not None:
+            self._limits.check_batch(recv_list)
+        batch = JsonRpcBatch()
+        for item in recv_list:
+            try:
+                message = self._parse_message(item)
+            except JsonRpcException as exc:
+                batch.errors.append(exc.get_error())
+                continue
+            except (KeyError, TypeError):
+                message = None
+            if message is None:
+                error = JsonRpcInvalidRequestError("Invalid batch element.")
+                batch.errors.append(error.get_error())
+            else:
+                batch.append(message)
+        return batch
+
+    def feed(self, chunk: Chunk) -> typing.Iterator[JsonRpcMessage]:
+        """
+        Buffer a chunk of a stream and parse any messages it completes.
+
+        Unlike :meth:`parse`, the chunk does not need to contain a whole message: it may
+        contain part of a message, or several messages, or both. The chunk is appended
+        to the framer's buffer immediately, and the returned iterator yields 0-n
+        messages as it parses the complete frames in that buffer.
+
+        If a frame cannot be parsed, the iterator raises ``JsonRpcParseError``. Frames
+        after the bad one stay buffered, so iterating over ``feed(b"")`` resumes with
+        them.
+
+        :returns: an iterator of parsed objects
+        :raises JsonRpcParseError: if a frame cannot be parsed
+        :raises JsonRpcInvalidRequestError: if a frame exceeds the peer's limits
+        """
+        return itertools.chain.from_iterable(self.feed_frames(chunk))
+
+    def feed_frames(
+        self, chunk: Chunk
+    ) -> typing.Iterator[typing.Iterable[JsonRpcMessage]]:
+        """
+        Like :meth:`feed`, but yield what :meth:`parse` returns for each frame.
+
+        This keeps the messages of a batch together in a :class:`JsonRpcBatch`, so
+        that a server can answer them with one batch.
+        """
+        if self._tracer is not None:
+            self._last_fed_at = self._tracer.clock()
+            if not self._framer.buffered:
+                self._frame_fed_at = self._last_fed_at
+        self._framer.feed(chunk)
+        return self._parse_buffered()
+
+    def _parse_buffered(self) -> typing.Iterator[typing.Iterable[JsonRpcMessage]]:
+        """ Parse each complete frame in the framer's buffer. """
+        next_frame = self._framer.next_frame
+        frame = next_frame()
+        while frame is not None:
+            if self._tracer is None:
+                yield self.parse(frame)
+            else:
+                # The rest of the buffer arrived by the latest chunk at the latest.
+                received_at = self._frame_fed_at
+                self._frame_fed_at = self._last_fed_at
+                yield self.parse(frame, received_at=received_at)
+            frame = next_frame()
+
+    def handle(self, recv_bytes: bytes) -> bytes:
+        """
+        Parse requests, pass them to the request handler, and encode the responses.
+
+        This runs the whole server-side cycle in one call. Parse errors, and errors
+        raised by the handler, are turned into error responses. Any other exception
+        raised by the handler is reported as an internal error. Notifications are
+        handled but not answered, and received responses are ignored.
+
+        :returns: the bytes to send back, or ``b""`` if there is nothing to send
+        :raises RuntimeError: if this peer does not have a request handler
+        """
+        handler = self._request_handler
+        if handler is None:
+            raise RuntimeError("handle() requires a request handler.")
+
+        try:
+            messages = self.parse(recv_bytes)
+        except JsonRpcException as exc:
+            return self.respond_with_error(None, exc.get_error())
+
+        if isinstance(messages, JsonRpcBatch):
+            batch = self.response_batch(messages)
+            for message in messages:
+                if isinstance(message, JsonRpcRequest):
+                    result, error = self._call_handler(handler, message)
+                    if error is None:
+                        try:
+                            batch.add_result(message, result)
+                            continue
+                        except JsonRpcException as exc:
+                            error = exc.get_error()
+                    batch.add_error(message, error)
+            return batch.encode()
+
+        for message in messages:
+            if isinstance(message, JsonRpcRequest):
+                result, error = self._call_handler(handler, message)
+                if message.is_notification:
+                    return b""
+                if error is None:
+                    try:
+                        return self.respond_with_result(message, result)
+                    except JsonRpcException as exc:
+                        error = exc.get_error()
+                return self.respond_with_error(message, error)
+        return b""
+
+    @staticmethod
+    def _call_handler(
+        handler: JsonRpcRequestHandler, request: JsonRpcRequest
+    ) -> typing.Tuple[JsonPrimitive, typing.Optional[JsonRpcError]]:
+        """
+        Call the handler.
+
+        :returns: the result and None, or None and an error if the handler failed
+        """
+        try:
+            return handler(request), None
+        except JsonRpcException as exc:
+            return None, exc.get_error()
+        except Exception:
+            return None, JsonRpcInternalError().get_error()
+
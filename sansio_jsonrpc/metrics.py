@@ -0,0 +1,198 @@
+from __future__ import annotations
+import bisect
+import time
+import typing
+
+from .exc import error_class
+from .pending import Clock
+from .types import JsonDict
+
+
+#: The upper bounds, in seconds, of the default latency buckets.
+LATENCY_BUCKETS = (
+    1e-6,
+    2.5e-6,
+    5e-6,
+    1e-5,
+    2.5e-5,
+    5e-5,
+    1e-4,
+    2.5e-4,
+    5e-4,
+    1e-3,
+    2.5e-3,
+    5e-3,
+    1e-2,
+    2.5e-2,
+    5e-2,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+)
+
+#: The method label for methods that exceed ``max_methods``.
+OTHER_METHOD = "(other)"
+
+
+def error_label(code: int) -> str:
+    """
+    Return the name of the exception class registered for an error code.
+
+    Codes in the reserved range without a registered subclass are labeled
+    ``JsonRpcReservedError``, and other unregistered codes are labeled
+    ``JsonRpcApplicationError``, so the number of labels is bounded by the number of
+    exception classes.
+    """
+    return error_class(code).__name__
+
+
+class Histogram:
+    """
+    Counts observations in fixed buckets.
+
+    Each observation is counted in the first bucket whose upper bound is greater than or
+    equal to it, or in the overflow bucket at the end.
+    """
+
+    __slots__ = ("bounds", "counts", "count", "sum")
+
+    def __init__(self, bounds: typing.Sequence[float]):
+        """
+        Constructor
+
+        :param bounds: The upper bounds of the buckets, in ascending order.
+        """
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """ Count one observation. """
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def to_json_dict(self) -> JsonDict:
+        """ Convert to a JSON dictionary. """
+        return {
+            "bounds": list(self.bounds),
+            "counts": list(self.counts),
+            "count": self.count,
+            "sum": self.sum,
+        }
+
+
+class PeerMetrics:
+    """
+    Collects counters and latency histograms for a :class:`JsonRpcPeer`.
+
+    Pass an instance to the peer's constructor. The peer counts each message that it
+    encodes as sent and each message that it parses as received, by kind and method,
+    and it times each frame that it encodes or parses. A peer without metrics skips all
+    of this at the cost of one comparison per call.
+
+    The kinds are ``request``, ``notification``, ``result``, and ``error``. Error
+    responses are also counted by :func:`error_label`, as are received frames that
+    fail to parse, under the direction ``rejected``.
+
+    Nothing is exported automatically: a scraper polls :meth:`snapshot` instead.
+    """
+
+    def __init__(
+        self,
+        *,
+        clock: Clock = time.perf_counter,
+        latency_buckets: typing.Sequence[float] = LATENCY_BUCKETS,
+        max_methods: int = 1000,
+    ):
+        """
+        Constructor
+
+        :param clock: Returns the current time in seconds. It is read twice for each
+            frame, so it should be fast and precise.
+        :param latency_buckets: The upper bounds of the latency buckets, in seconds.
+        :param max_methods: The number of distinct method names that are counted
+            separately. Later methods are counted as ``OTHER_METHOD``, so that a peer
+            that sends random method names cannot grow the counters without bound.
+        """
+        self.clock = clock
+        self._latency_buckets = tuple(latency_buckets)
+        self._max_methods = max_methods
+        self.reset()
+
+    def reset(self) -> None:
+        """ Set every counter and histogram back to zero. """
+        self._messages: typing.Dict[
+            typing.Tuple[str, str, typing.Optional[str]], int
+        ] = dict()
+        self._errors: typing.Dict[typing.Tuple[str, str], int] = dict()
+        self._methods: typing.Set[str] = set()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.encode_latency = Histogram(self._latency_buckets)
+        self.parse_latency = Histogram(self._latency_buckets)
+
+    def record_encode(self, size: int, seconds: float) -> None:
+        """ Record a frame that was encoded. """
+        self.bytes_sent += size
+        self.encode_latency.observe(seconds)
+
+    def record_parse(self, size: int, seconds: float) -> None:
+        """ Record a frame that was parsed, whether or not parsing succeeded. """
+        self.bytes_received += size
+        self.parse_latency.observe(seconds)
+
+    def count_message(
+        self,
+        direction: str,
+        kind: str,
+        method: typing.Optional[str] = None,
+        code: typing.Optional[int] = None,
+    ) -> None:
+        """
+        Count a message.
+
+        :param direction: ``sent`` or ``received``.
+        :param kind: See the class docstring.
+        :param method: The method of a request or notification.
+        :param code: The error code of an error response.
+        """
+        if method is not None and method not in self._methods:
+            if len(self._methods) < self._max_methods:
+                self._methods.add(method)
+            else:
+                method = OTHER_METHOD
+        key = (direction, kind, method)
+        self._messages[key] = self._messages.get(key, 0) + 1
+        if code is not None:
+            self.count_error(direction, code)
+
+    def count_error(self, direction: str, code: int) -> None:
+        """ Count an error by its label. """
+        key = (direction, error_label(code))
+        self._errors[key] = self._errors.get(key, 0) + 1
+
+    def snapshot(self) -> JsonDict:
+        """
+        Return a copy of every counter and histogram.
+
+        The snapshot contains only JSON types, so it can be encoded as is. Counters are
+        cumulative until :meth:`reset` is called.
+        """
+        return {
+            "messages": [
+                {"direction": direction, "kind": kind, "method": method, "count": count}
+                for (direction, kind, method), count in self._messages.items()
+            ],
+            "errors": [
+                {"direction": direction, "error": label, "count": count}
+                for (direction, label), count in self._errors.items()
+            ],
+            "bytes": {"sent": self.bytes_sent, "received": self.bytes_received},
+            "latency": {
+                "encode": self.encode_latency.to_json_dict(),
+                "parse": self.parse_latency.to_json_dict(),
+            },
+        }
@@ -0,0 +1,203 @@
+from __future__ import annotations
+import collections
+import heapq
+import itertools
+import time
+import typing
+
+from .types import JsonRpcId
+from .util import slotted_dataclass
+
+if typing.TYPE_CHECKING:
+    from .main import JsonRpcResponse
+
+
+Clock = typing.Callable[[], float]
+UnexpectedResponseHandler = typing.Callable[["JsonRpcResponse", bool], None]
+
+
+@slotted_dataclass
+class PendingRequest:
+    """ A request that has been sent but has not received a response yet. """
+
+    id: JsonRpcId
+    method: str
+    sent_at: float
+    deadline: typing.Optional[float] = None
+    #: Arbitrary caller data, e.g. a future to resolve when the response arrives.
+    context: typing.Any = None
+
+
+class PendingRequests:
+    """
+    Tracks outstanding requests so that responses can be matched to them.
+
+    Requests are stored in a dict keyed by request ID, so matching a response is O(1).
+    Requests with a deadline are also pushed onto a heap ordered by deadline, so
+    collecting expired requests costs O(log n) per expired request. Entries for
+    requests that were answered in time are removed from the heap lazily.
+
+    The tracker only reads time through its clock, and it never sleeps or schedules
+    anything: the caller decides when to call :meth:`expire`, typically by arming a
+    timer for :meth:`next_deadline`. The clock can be replaced to run on an event
+    loop's time, or on a fake time in tests.
+    """
+
+    def __init__(
+        self,
+        *,
+        clock: Clock = time.monotonic,
+        default_timeout: typing.Optional[float] = None,
+        recent_limit: int = 1024,
+        unexpected_response_handler: typing.Optional[UnexpectedResponseHandler] = None,
+    ):
+        """
+        Constructor
+
+        :param clock: Returns the current time in seconds.
+        :param default_timeout: The timeout used when :meth:`add` is not given one.
+            None means that requests never expire.
+        :param recent_limit: How many completed request IDs to remember in order to
+            tell a duplicate response apart from an orphan response.
+        :param unexpected_response_handler: Called with the response and a flag that
+            is True for a duplicate and False for an orphan whenever :meth:`match`
+            receives a response that does not match a pending request.
+        """
+        self.clock = clock
+        self._default_timeout = default_timeout
+        self._table: typing.Dict[JsonRpcId, PendingRequest] = dict()
+        self._heap: typing.List[typing.Tuple[float, int, PendingRequest]] = list()
+        self._seq = itertools.count()
+        # Heap entries whose request is no longer pending.
+        self._stale = 0
+        self._recent: typing.Deque[JsonRpcId] = collections.deque()
+        self._recent_set: typing.Set[JsonRpcId] = set()
+        self._recent_limit = recent_limit
+        self._unexpected_response_handler = unexpected_response_handler
+        #: The number of responses whose ID was never pending or was forgotten.
+        self.orphan_count = 0
+        #: The number of responses whose ID was recently completed or expired.
+        self.duplicate_count = 0
+
+    def __len__(self) -> int:
+        """ The number of pending requests. """
+        return len(self._table)
+
+    def __contains__(self, request_id: JsonRpcId) -> bool:
+        """ True if a request with this ID is pending. """
+        return request_id in self._table
+
+    def __iter__(self) -> typing.Iterator[PendingRequest]:
+        """ Iterate over a snapshot of the pending requests. """
+        return iter(list(self._table.values()))
+
+    def get(self, request_id: JsonRpcId) -> typing.Optional[PendingRequest]:
+        """ Return the pending request with this ID, or None. """
+        return self._table.get(request_id)
+
+    def add(
+        self,
+        request_id: JsonRpcId,
+        method: str,
+        *,
+        timeout: typing.Optional[float] = None,
+        context: typing.Any = None,
+    ) -> PendingRequest:
+        """
+        Start tracking a request.
+
+        :param timeout: Seconds until the request expires. Defaults to the tracker's
+            default timeout.
+        :raises RuntimeError: if a request with the same ID is already pending
+        """
+        if request_id in self._table:
+            raise RuntimeError(f"Request ID {request_id!r} is already pending.")
+        now = self.clock()
+        if timeout is None:
+            timeout = self._default_timeout
+        deadline = None if timeout is None else now + timeout
+        pending = PendingRequest(request_id, method, now, deadline, context)
+        self._table[request_id] = pending
+        if deadline is not None:
+            heapq.heappush(self._heap, (deadline, next(self._seq), pending))
+        return pending
+
+    def match(self, response: JsonRpcResponse) -> typing.Optional[PendingRequest]:
+        """
+        Stop tracking the request that a response answers, and return it.
+
+        If no request with the response's ID is pending, then the response is
+        counted as a duplicate (if the ID was completed recently) or an orphan,
+        the unexpected response handler is called, and None is returned.
+        """
+        pending = self._table.pop(response.id, None)
+        if pending is None:
+            duplicate = response.id in self._recent_set
+            if duplicate:
+                self.duplicate_count += 1
+            else:
+                self.orphan_count += 1
+            if self._unexpected_response_handler is not None:
+                self._unexpected_response_handler(response, duplicate)
+            return None
+        self._complete(pending)
+        return pending
+
+    def cancel(self, request_id: JsonRpcId) -> typing.Optional[PendingRequest]:
+        """ Stop tracking a request without a response, and return it. """
+        pending = self._table.pop(request_id, None)
+        if pending is not None:
+            self._complete(pending)
+        return pending
+
+    def next_deadline(self) -> typing.Optional[float]:
+        """ Return the earliest deadline of any pending request, or None. """
+        heap = self._heap
+        while heap and self._table.get(heap[0][2].id) is not heap[0][2]:
+            heapq.heappop(heap)
+            self._stale -= 1
+        return heap[0][0] if heap else None
+
+    def expire(self, now: typing.Optional[float] = None) -> typing.List[PendingRequest]:
+        """
+        Stop tracking every request whose deadline has passed, and return them.
+
+        :param now: The current time. Defaults to reading the tracker's clock.
+        """
+        if now is None:
+            now = self.clock()
+        expired = list()
+        heap = self._heap
+        table = self._table
+        while heap and heap[0][0] <= now:
+            pending = heapq.heappop(heap)[2]
+            if table.get(pending.id) is pending:
+                del table[pending.id]
+                self._remember(pending.id)
+                expired.append(pending)
+            else:
+                self._stale -= 1
+        return expired
+
+    def _complete(self, pending: PendingRequest) -> None:
+        """ Bookkeeping for a request that left the table before its deadline. """
+        self._remember(pending.id)
+        if pending.deadline is not None:
+            self._stale += 1
+            # Keep the heap proportional to the number of pending requests.
+            if self._stale > 64 and self._stale > len(self._heap) // 2:
+                table = self._table
+                self._heap = [
+                    entry for entry in self._heap if table.get(entry[2].id) is entry[2]
+                ]
+                heapq.heapify(self._heap)
+                self._stale = 0
+
+    def _remember(self, request_id: JsonRpcId) -> None:
+        """ Remember a completed ID so that a duplicate response can be detected. """
+        if self._recent_limit <= 0 or request_id in self._recent_set:
+            return
+        if len(self._recent) >= self._recent_limit:
+            self._recent_set.discard(self._recent.popleft())
+        self._recent.append(request_id)
+        self._recent_set.add(request_id)
@@ -0,0 +1,246 @@
+from __future__ import annotations
+import time
+import typing
+
+from .envelope import scan_members
+from .exc import JsonRpcInternalError, JsonRpcInvalidRequestError
+from .main import (
+    JsonRpcPeer,
+    JsonRpcResponse,
+    validate_json_rpc_id,
+    validate_json_rpc_method,
+)
+from .pending import Clock, PendingRequest, PendingRequests
+from .types import JsonRpcId
+
+
+#: Identifies a downstream client, e.g. its connection object.
+Client = typing.Hashable
+
+_QUOTE = ord('"')
+
+
+class JsonRpcProxy:
+    """
+    Forwards requests from many downstream clients over one upstream connection.
+
+    Each request that is forwarded upstream gets a fresh ID from the upstream peer, so
+    that requests from different clients cannot collide, and the response gets the
+    original ID back on its way downstream. The mapping from upstream IDs to clients and
+    original IDs is kept in a :class:`PendingRequests` table, so it costs one small
+    slotted object per request in flight.
+
+    If a frame is a single object with plain member names, the ID is replaced directly
+    in the frame bytes: the rest of the frame, including the params or result, is
+    copied to the output without being decoded or encoded. Other frames, such as
+    batches, are decoded, rewritten, and encoded again. So are small frames, because
+    for them a full decode is faster than locating the ID.
+    """
+
+    def __init__(
+        self,
+        upstream: JsonRpcPeer,
+        *,
+        timeout: typing.Optional[float] = None,
+        clock: Clock = time.monotonic,
+        rewrite_threshold: int = 2048,
+    ):
+        """
+        Constructor
+
+        :param upstream: The peer for the upstream connection. Upstream IDs come from
+            the same sequence as the IDs of the peer's own requests, and its codec is
+            used whenever a frame has to be decoded.
+        :param timeout: Seconds until a forwarded request that has not received a
+            response is removed by :meth:`expire`. None means that requests never
+            expire.
+        :param clock: Returns the current time in seconds.
+        :param rewrite_threshold: Frames of at least this many bytes have their IDs
+            replaced in place. Smaller frames are decoded.
+        """
+        self._upstream = upstream
+        self._codec = upstream.codec
+        self._rewrite_threshold = rewrite_threshold
+        self._mappings = PendingRequests(
+            clock=clock, default_timeout=timeout, recent_limit=0
+        )
+        #: The number of frames above the rewrite threshold that were decoded because
+        #: their ID could not be replaced in place.
+        self.fallback_count = 0
+
+    def __len__(self) -> int:
+        """ The number of forwarded requests that are waiting for a response. """
+        return len(self._mappings)
+
+    def forward_request(
+        self, client: Client, data: bytes, *, timeout: typing.Optional[float] = None
+    ) -> bytes:
+        """
+        Rewrite a request or batch received from a client, to be sent upstream.
+
+        Notifications do not get a response, so they are returned unchanged.
+
+        :param client: The client that sent the request. It is returned by
+            :meth:`forward_response` along with the response.
+        :param timeout: Overrides the proxy's timeout for these requests.
+        :raises JsonRpcParseError: if the frame has to be decoded and is not valid JSON
+        :raises JsonRpcInvalidRequestError: if the frame has to be decoded and contains
+            a request with an invalid ID or method
+        """
+        if len(data) < self._rewrite_threshold:
+            return self._forward_decoded_request(client, data, timeout)
+        members = scan_members(data)
+        if members is not None and b"method" in members:
+            id_span = members.get(b"id")
+            if id_span is None:
+                return data
+            id_start, id_end = id_span
+            method_start, method_end = members[b"method"]
+            raw_id = data[id_start:id_end]
+            if (
+                data[id_start] == _QUOTE or raw_id.lstrip(b"-").isdigit()
+            ) and data[method_start] == _QUOTE:
+                method = data[method_start + 1 : method_end - 1]
+                upstream_id = self._add(
+                    client, raw_id, method.decode("utf8", "replace"), timeout
+                )
+                return b"".join((data[:id_start], b"%d" % upstream_id, data[id_end:]))
+        self.fallback_count += 1
+        return self._forward_decoded_request(client, data, timeout)
+
+    def _forward_decoded_request(
+        self, client: Client, data: bytes, timeout: typing.Optional[float]
+    ) -> bytes:
+        """ Rewrite the IDs in a frame by decoding it. """
+        recv_obj = self._codec.decode(data)
+        messages = recv_obj if isinstance(recv_obj, list) else [recv_obj]
+        requests = [
+            message
+            for message in messages
+            if isinstance(message, dict) and "method" in message and "id" in message
+        ]
+        # Validate everything first, so that an error does not leave mappings behind.
+        for request in requests:
+            validate_json_rpc_id(request["id"], JsonRpcInvalidRequestError)
+            validate_json_rpc_method(
+                request["method"], request.get("params"), JsonRpcInvalidRequestError
+            )
+        if not requests:
+            return data
+        encode = self._codec.encode
+        for request in requests:
+            raw_id = encode(request["id"])
+            request["id"] = self._add(client, raw_id, request["method"], timeout)
+        return encode(recv_obj)
+
+    def _add(
+        self,
+        client: Client,
+        raw_id: bytes,
+        method: str,
+        timeout: typing.Optional[float],
+    ) -> int:
+        """ Allocate an upstream ID and map it to the client and original ID. """
+        upstream_id = next(self._upstream._id_gen)
+        context = (client, raw_id)
+        self._mappings.add(upstream_id, method, timeout=timeout, context=context)
+        return upstream_id
+
+    def forward_response(
+        self, data: bytes
+    ) -> typing.Optional[typing.List[typing.Tuple[Client, bytes]]]:
+        """
+        Rewrite a response or batch received from upstream, to be sent to its client.
+
+        :returns: a list of clients and the bytes to send to each of them, or None if
+            the frame does not answer any forwarded request. Such a frame may be a
+            response to one of the upstream peer's own requests, or a request. If only
+            part of a batch answers forwarded requests, the other elements are dropped.
+        :raises JsonRpcParseError: if the frame has to be decoded and is not valid JSON
+        """
+        if len(data) < self._rewrite_threshold:
+            return self._forward_decoded_response(data)
+        members = scan_members(data)
+        if members is not None:
+            if b"method" in members or b"id" not in members:
+                return None
+            id_start, id_end = members[b"id"]
+            raw_id = data[id_start:id_end]
+            if raw_id.isdigit():
+                mapping = self._mappings.cancel(int(raw_id))
+                if mapping is None:
+                    return None
+                client, original_id = mapping.context
+                response = b"".join((data[:id_start], original_id, data[id_end:]))
+                return [(client, response)]
+        self.fallback_count += 1
+        return self._forward_decoded_response(data)
+
+    def _forward_decoded_response(
+        self, data: bytes
+    ) -> typing.Optional[typing.List[typing.Tuple[Client, bytes]]]:
+        """ Restore the IDs in a frame by decoding it. """
+        recv_obj = self._codec.decode(data)
+        is_batch = isinstance(recv_obj, list)
+        groups: typing.Dict[Client, typing.List[typing.Any]] = dict()
+        for response in recv_obj if is_batch else [recv_obj]:
+            if not isinstance(response, dict) or "method" in response:
+                continue
+            upstream_id = response.get("id")
+            if type(upstream_id) not in (int, float):
+                continue
+            mapping = self._mappings.cancel(typing.cast(JsonRpcId, upstream_id))
+            if mapping is None:
+                continue
+            client, original_id = mapping.context
+            response["id"] = self._codec.decode(original_id)
+            groups.setdefault(client, []).append(response)
+        if not groups:
+            return None
+        encode = self._codec.encode
+        return [
+            (client, encode(responses if is_batch else responses[0]))
+            for client, responses in groups.items()
+        ]
+
+    def next_deadline(self) -> typing.Optional[float]:
+        """ Return the earliest deadline of any forwarded request, or None. """
+        return self._mappings.next_deadline()
+
+    def expire(
+        self, now: typing.Optional[float] = None
+    ) -> typing.List[typing.Tuple[Client, bytes]]:
+        """
+        Forget every forwarded request whose deadline has passed.
+
+        A response that arrives later is not forwarded.
+
+        :param now: The current time. Defaults to reading the proxy's clock.
+        :returns: a list of clients and the error response to send to each of them
+        """
+        error = JsonRpcInternalError("The upstream peer did not respond in time.")
+        return [
+            (mapping.context[0], self._error_response(mapping, error))
+            for mapping in self._mappings.expire(now)
+        ]
+
+    def drop_client(self, client: Client) -> int:
+        """
+        Forget every forwarded request from a client, e.g. when it disconnects.
+
+        :returns: the number of requests that were forgotten
+        """
+        dropped = 0
+        for mapping in self._mappings:
+            if mapping.context[0] == client:
+                self._mappings.cancel(mapping.id)
+                dropped += 1
+        return dropped
+
+    def _error_response(
+        self, mapping: PendingRequest, exc: JsonRpcInternalError
+    ) -> bytes:
+        """ Encode an error response to a forwarded request. """
+        original_id = self._codec.decode(mapping.context[1])
+        response = JsonRpcResponse._unchecked(original_id, error=exc.get_error())
+        return self._codec.encode(response.to_json_dict())
@@ -0,0 +1,279 @@
+from __future__ import annotations
+import heapq
+import itertools
+import math
+import time
+import typing
+
+from .envelope import scan_items, scan_members
+from .exc import JsonRpcDeadlineExceededError
+from .main import JsonRpcBatch, JsonRpcMessage, JsonRpcPeer, JsonRpcRequest
+from .pending import Clock
+
+
+Work = typing.Iterable[JsonRpcMessage]
+
+# Requests that expect a response are handled before notifications.
+REQUEST_LANE = 0
+NOTIFICATION_LANE = 1
+
+
+class JsonRpcScheduler:
+    """
+    Queues received requests in order of priority and deadline, and drops them when
+    they expire.
+
+    JSON-RPC has no deadline field, so the scheduler reads a timeout and a priority
+    from extension members of each request, e.g. ``{"jsonrpc": "2.0", "id": 1,
+    "method": "search", "timeout": 0.5, "priority": 1}``. The timeout is the number of
+    seconds that the caller will wait, and the deadline is that long after the request
+    is pushed, so the two peers do not need to agree on the time.
+
+    :meth:`pop` returns requests with a higher priority first, and among those the one
+    with the earliest deadline, and notifications only when no request is queued.
+    Queued work is stored in a heap ordered that way, and in a second heap ordered by
+    deadline, so that pushing, popping, and dropping an expired request each cost
+    O(log n). Entries that leave one heap are removed from the other lazily.
+
+    An expired request is answered with a ``JsonRpcDeadlineExceededError`` instead of
+    being handled. The scheduler only reads time through its clock, and it never
+    sleeps or schedules anything: the caller collects these responses with
+    :meth:`expire`, typically by arming a timer for :meth:`next_deadline`.
+    """
+
+    def __init__(
+        self,
+        peer: JsonRpcPeer,
+        *,
+        clock: Clock = time.monotonic,
+        timeout_member: typing.Optional[str] = "timeout",
+        priority_member: typing.Optional[str] = "priority",
+        default_timeout: typing.Optional[float] = None,
+        default_priority: float = 0,
+    ):
+        """
+        Constructor
+
+        :param peer: The peer that parses received data and encodes error responses.
+        :param clock: Returns the current time in seconds.
+        :param timeout_member: The name of the extension member that holds a request's
+            timeout, or None to ignore timeouts in requests.
+        :param priority_member: The name of the extension member that holds a request's
+            priority, or None to ignore priorities in requests. Higher numbers are
+            handled first.
+        :param default_timeout: The timeout of a request that does not have one. None
+            means that such requests never expire.
+        :param default_priority: The priority of a request that does not have one.
+        """
+        self._peer = peer
+        self._clock = clock
+        self._timeout_name = None if timeout_member is None else timeout_member.encode()
+        self._priority_name = (
+            None if priority_member is None else priority_member.encode()
+        )
+        self._default_timeout = default_timeout
+        self._default_priority = default_priority
+        self._error = JsonRpcDeadlineExceededError().get_error()
+        # The queued work, keyed by sequence number.
+        self._queued: typing.Dict[int, Work] = dict()
+        self._work_heap: typing.List[typing.Tuple[int, float, float, int]] = list()
+        self._deadline_heap: typing.List[typing.Tuple[float, int]] = list()
+        self._seq = itertools.count()
+        # Heap entries whose work is no longer queued.
+        self._stale_work = 0
+        self._stale_deadlines = 0
+        # Responses to expired requests that have not been collected yet.
+        self._responses: typing.List[bytes] = list()
+        #: The number of requests and notifications that were dropped because they
+        #: expired.
+        self.expired_count = 0
+
+    def __len__(self) -> int:
+        """ The number of queued frames. """
+        return len(self._queued)
+
+    def push(
+        self, recv_bytes: bytes, now: typing.Optional[float] = None
+    ) -> typing.Optional[Work]:
+        """
+        Parse received data and queue the requests in it.
+
+        A batch is queued as a whole, because its responses must be sent together. It
+        takes the earliest timeout and the highest priority of its requests. Work whose
+        timeout is zero or less is dropped right away, like in :meth:`pop`.
+
+        The members are read from the data as it was received, so they are ignored if
+        the peer uses compression, and the defaults apply.
+
+        :param now: When the data was received. Defaults to reading the scheduler's
+            clock.
+        :returns: None if the data was queued, or what :meth:`JsonRpcPeer.parse`
+            returns if the data does not contain requests, e.g. responses
+        :raises JsonRpcParseError: if the data cannot be parsed
+        :raises JsonRpcInvalidRequestError: if the data is an empty batch array, or if
+            it exceeds the peer's limits
+        """
+        if now is None:
+            now = self._clock()
+        messages = self._peer.parse(recv_bytes)
+        lane = None
+        for message in messages:
+            if isinstance(message, JsonRpcRequest):
+                if not message.is_notification:
+                    lane = REQUEST_LANE
+                    break
+                lane = NOTIFICATION_LANE
+        if lane is None:
+            return messages
+
+        timeout = self._default_timeout
+        priority = self._default_priority
+        if self._peer.compression is None and (
+            self._timeout_name is not None or self._priority_name is not None
+        ):
+            items: typing.Iterable[bytes] = (recv_bytes,)
+            if isinstance(messages, JsonRpcBatch):
+                items = (recv_bytes[start:end] for start, end in scan_items(recv_bytes))
+            timeouts = []
+            priorities = []
+            for item in items:
+                members = scan_members(item)
+                if members is not None:
+                    timeouts.append(self._read(item, members, self._timeout_name))
+                    priorities.append(self._read(item, members, self._priority_name))
+            timeout = min(
+                (value for value in timeouts if value is not None), default=timeout
+            )
+            priority = max(
+                (value for value in priorities if value is not None), default=priority
+            )
+
+        if timeout is None:
+            deadline = math.inf
+        else:
+            deadline = now + timeout
+            if deadline <= now:
+                self._expire_work(messages)
+                return None
+        seq = next(self._seq)
+        self._queued[seq] = messages
+        heapq.heappush(self._work_heap, (lane, -priority, deadline, seq))
+        if timeout is not None:
+            heapq.heappush(self._deadline_heap, (deadline, seq))
+        return None
+
+    @staticmethod
+    def _read(
+        data: bytes,
+        members: typing.Dict[bytes, typing.Tuple[int, int]],
+        name: typing.Optional[bytes],
+    ) -> typing.Optional[float]:
+        """ Return the number in a member, or None if it is missing or not a number. """
+        span = None if name is None else members.get(name)
+        if span is None:
+            return None
+        try:
+            value = float(data[span[0] : span[1]])
+        except ValueError:
+            return None
+        return None if math.isnan(value) else value
+
+    def pop(self, now: typing.Optional[float] = None) -> typing.Optional[Work]:
+        """
+        Remove the next work to handle from the queue and return it.
+
+        Expired work that is reached first is dropped, and its responses are returned
+        by the next call to :meth:`expire`.
+
+        :param now: The current time. Defaults to reading the scheduler's clock.
+        :returns: what :meth:`JsonRpcPeer.parse` returned for the data, or None if
+            nothing is queued
+        """
+        if now is None:
+            now = self._clock()
+        heap = self._work_heap
+        queued = self._queued
+        while heap:
+            _, _, deadline, seq = heapq.heappop(heap)
+            messages = queued.pop(seq, None)
+            if messages is None:
+                self._stale_work -= 1
+                continue
+            if deadline != math.inf:
+                self._stale_deadlines += 1
+                self._compact()
+                if deadline <= now:
+                    self._expire_work(messages)
+                    continue
+            return messages
+        return None
+
+    def next_deadline(self) -> typing.Optional[float]:
+        """ Return the earliest deadline of any queued work, or None. """
+        heap = self._deadline_heap
+        while heap and heap[0][1] not in self._queued:
+            heapq.heappop(heap)
+            self._stale_deadlines -= 1
+        return heap[0][0] if heap else None
+
+    def expire(self, now: typing.Optional[float] = None) -> typing.List[bytes]:
+        """
+        Drop every queued request whose deadline has passed.
+
+        :param now: The current time. Defaults to reading the scheduler's clock.
+        :returns: the encoded error responses to the dropped requests, and to expired
+            requests that :meth:`pop` dropped, ready to send
+        """
+        if now is None:
+            now = self._clock()
+        heap = self._deadline_heap
+        queued = self._queued
+        while heap and heap[0][0] <= now:
+            seq = heapq.heappop(heap)[1]
+            messages = queued.pop(seq, None)
+            if messages is None:
+                self._stale_deadlines -= 1
+            else:
+                self._stale_work += 1
+                self._expire_work(messages)
+        self._compact()
+        responses = self._responses
+        self._responses = list()
+        return responses
+
+    def _expire_work(self, messages: Work) -> None:
+        """ Encode error responses to expired work, to be returned by expire(). """
+        peer = self._peer
+        if isinstance(messages, JsonRpcBatch):
+            batch = peer.response_batch(messages)
+            for message in messages:
+                if isinstance(message, JsonRpcRequest):
+                    self.expired_count += 1
+                    batch.add_error(message, self._error)
+            data = batch.encode()
+        else:
+            data = b""
+            for message in messages:
+                if isinstance(message, JsonRpcRequest):
+                    self.expired_count += 1
+                    if not message.is_notification:
+                        data = peer.respond_with_error(message, self._error)
+        if data:
+            self._responses.append(data)
+
+    def _compact(self) -> None:
+        """ Keep both heaps proportional to the number of queued frames. """
+        queued = self._queued
+        if self._stale_work > 64 and self._stale_work > len(self._work_heap) // 2:
+            self._work_heap = [entry for entry in self._work_heap if entry[3] in queued]
+            heapq.heapify(self._work_heap)
+            self._stale_work = 0
+        if (
+            self._stale_deadlines > 64
+            and self._stale_deadlines > len(self._deadline_heap) // 2
+        ):
+            self._deadline_heap = [
+                entry for entry in self._deadline_heap if entry[1] in queued
+            ]
+            heapq.heapify(self._deadline_heap)
+            self._stale_deadlines = 0
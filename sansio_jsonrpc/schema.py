@@ -0,0 +1,166 @@
+from __future__ import annotations
+import dataclasses
+import typing
+
+from .exc import JsonRpcInvalidParamsError
+from .types import JsonRpcParams
+
+
+Validator = typing.Callable[[typing.Optional[JsonRpcParams]], None]
+
+# The decoded types that each schema type accepts. A JSON number with a fraction
+# decodes to a float, but one without decodes to an int, so floats accept both.
+_ACCEPTED_TYPES: typing.Dict[typing.Any, typing.Tuple[type, ...]] = {
+    bool: (bool,),
+    int: (int,),
+    float: (float, int),
+    str: (str,),
+    list: (list,),
+    dict: (dict,),
+    None: (type(None),),
+    type(None): (type(None),),
+}
+_TYPE_NAMES = {
+    bool: "a boolean",
+    int: "an integer",
+    float: "a number",
+    str: "a string",
+    list: "an array",
+    dict: "an object",
+    type(None): "null",
+}
+
+
+@dataclasses.dataclass(frozen=True)
+class ParamsSchema:
+    """
+    Describes the params of a method: their names, types, and which are required.
+
+    The params can be passed by position, in the order of ``params``, or by name. Each
+    type is one of ``bool``, ``int``, ``float``, ``str``, ``list``, ``dict``, or
+    ``None``, or a tuple of them, or ``typing.Any`` to accept any value. ``float``
+    accepts integers too, but ``int`` does not accept booleans.
+
+    Pass a schema to :meth:`JsonRpcDispatcher.register`, which compiles it with
+    :func:`compile_schema`.
+    """
+
+    #: The names of the params, in positional order, and their types.
+    params: typing.Mapping[str, typing.Any]
+    #: The names of the params that can be omitted.
+    optional: typing.Collection[str] = ()
+    #: If True, named params that are not in the schema are allowed.
+    extra: bool = False
+
+
+def _accepted_types(method: str, name: str, spec: typing.Any) -> typing.Optional[set]:
+    """ Return the set of types that a schema type accepts, or None for any type. """
+    if spec is typing.Any or spec is object:
+        return None
+    types: set = set()
+    for item in spec if isinstance(spec, tuple) else (spec,):
+        try:
+            types.update(_ACCEPTED_TYPES[item])
+        except (KeyError, TypeError):
+            raise ValueError(
+                f"Param {name!r} of method {method!r} has a type that is not a JSON "
+                f"type: {item!r}"
+            ) from None
+    return types
+
+
+def compile_schema(method: str, schema: ParamsSchema) -> Validator:
+    """
+    Generate a function that checks params against a schema.
+
+    The function is generated once, as source code with one straight-line check per
+    param, so that checking a request costs no loops over the schema and no lookups of
+    what each param should be. Each check compares the exact type of a value to the
+    accepted types, which is cheaper than ``isinstance()``.
+
+    :returns: a function that raises ``JsonRpcInvalidParamsError`` if the params do
+        not match the schema
+    :raises ValueError: if the schema contains a type that is not a JSON type, or an
+        optional name that is not a param
+    """
+    names = list(schema.params)
+    optional = set(schema.optional)
+    if not optional <= set(names):
+        raise ValueError(
+            f"The schema of method {method!r} has optional names that are not params: "
+            f"{sorted(optional - set(names))}"
+        )
+    required = [name for name in names if name not in optional]
+    min_positional = max(
+        (index + 1 for index, name in enumerate(names) if name not in optional),
+        default=0,
+    )
+    accepted_types = [
+        _accepted_types(method, name, schema.params[name]) for name in names
+    ]
+    # The error messages are interned, so that the errors are not allocated again,
+    # and peers cache their encodings.
+    prefix = f"Invalid params for method {method!r}"
+    messages: typing.Dict[typing.Optional[int], str] = {None: prefix}
+    for index, accepted in enumerate(accepted_types):
+        if accepted is not None:
+            expected = " or ".join(sorted({_TYPE_NAMES[t] for t in accepted}))
+            messages[index] = f"{prefix}: {names[index]!r} must be {expected}"
+    for message in messages.values():
+        JsonRpcInvalidParamsError.intern(message)
+
+    def invalid(index: typing.Optional[int]) -> JsonRpcInvalidParamsError:
+        return JsonRpcInvalidParamsError(messages[index])
+
+    namespace: typing.Dict[str, typing.Any] = {
+        "_invalid": invalid,
+        "_required": frozenset(required),
+        "_names": frozenset(names),
+    }
+
+    def type_check(index: int, value: str) -> typing.Optional[str]:
+        """ Return an expression that is true if a value has a wrong type. """
+        accepted = accepted_types[index]
+        if accepted is None:
+            return None
+        if len(accepted) == 1:
+            namespace[f"_t{index}"] = next(iter(accepted))
+            return f"type({value}) is not _t{index}"
+        namespace[f"_t{index}"] = frozenset(accepted)
+        return f"type({value}) not in _t{index}"
+
+    lines = ["def validate(params):", "    if type(params) is list:"]
+    lines.append("        count = len(params)")
+    lines.append(
+        f"        if count < {min_positional} or count > {len(names)}:"
+        " raise _invalid(None)"
+    )
+    for index in range(len(names)):
+        check = type_check(index, f"params[{index}]")
+        if check is None:
+            continue
+        if index < min_positional:
+            lines.append(f"        if {check}: raise _invalid({index})")
+        else:
+            lines.append(f"        if count > {index} and {check}:")
+            lines.append(f"            raise _invalid({index})")
+    lines.append("        return")
+    lines.append("    if type(params) is dict:")
+    if required:
+        lines.append("        if not params.keys() >= _required: raise _invalid(None)")
+    if not schema.extra:
+        lines.append("        if not params.keys() <= _names: raise _invalid(None)")
+    for index, name in enumerate(names):
+        check = type_check(index, f"params[{name!r}]")
+        if check is None:
+            continue
+        if name in optional:
+            lines.append(f"        if {name!r} in params and {check}:")
+        else:
+            lines.append(f"        if {check}:")
+        lines.append(f"            raise _invalid({index})")
+    lines.append("        return")
+    if required:
+        lines.append("    if params is None: raise _invalid(None)")
+    exec("\n".join(lines), namespace)
+    return namespace["validate"]
@@ -0,0 +1,135 @@
+from __future__ import annotations
+import collections.abc
+import typing
+
+from .codec import JsonCodec
+from .envelope import scan_items
+
+
+#: Lists and objects with more items than this are encoded one item at a time, so
+#: that no single encoding call produces more than a few items' worth of output.
+STREAM_THRESHOLD = 64
+#: Lists and objects this close to the top of the value are encoded one item at a
+#: time whatever their size, so that e.g. ``{"rows": [...]}`` is streamed too.
+STREAM_DEPTH = 2
+#: The number of consecutive small items in a list that are encoded in one call.
+RUN_LENGTH = 32
+
+
+def _is_streamed(value: typing.Any, depth: int) -> bool:
+    """ True if a value is a container that should be encoded item by item. """
+    type_ = type(value)
+    if type_ is list or type_ is dict:
+        return depth < STREAM_DEPTH or len(value) > STREAM_THRESHOLD
+    return isinstance(value, collections.abc.Iterator)
+
+
+def _pieces(codec: JsonCodec, value: typing.Any, depth: int) -> typing.Iterator[bytes]:
+    """
+    Encode a value as a sequence of pieces that concatenate to its JSON text.
+
+    Lists and objects near the top of the value, and large ones anywhere, are walked
+    one item at a time, and any other value is encoded in one call. An iterator is
+    encoded as an array of the items that it yields.
+    """
+    if not _is_streamed(value, depth):
+        yield codec.encode(value)
+        return
+    encode = codec.encode
+    depth += 1
+    if type(value) is dict:
+        separator = b"{"
+        for key, item in value.items():
+            if type(key) is str:
+                yield separator + encode(key) + b":"
+            else:
+                # The codec converts the key, or rejects it, as it would in any object.
+                yield separator + encode({key: 0})[1:-2]
+            separator = b","
+            if _is_streamed(item, depth):
+                yield from _pieces(codec, item, depth)
+            else:
+                yield encode(item)
+        yield b"}" if separator == b"," else b"{}"
+        return
+    # Consecutive items that are not streamed are encoded together, as an array
+    # without its brackets, which costs one encoding call per run instead of per item.
+    separator = b"["
+    run: typing.List[typing.Any] = []
+    for item in value:
+        if _is_streamed(item, depth):
+            if run:
+                yield separator + encode(run)[1:-1]
+                separator = b","
+                run = []
+            yield separator
+            yield from _pieces(codec, item, depth)
+            separator = b","
+        else:
+            run.append(item)
+            if len(run) == RUN_LENGTH:
+                yield separator + encode(run)[1:-1]
+                separator = b","
+                run = []
+    if run:
+        yield separator + encode(run)[1:-1] + b"]"
+    else:
+        yield b"]" if separator == b"," else b"[]"
+
+
+def encode_chunks(
+    codec: JsonCodec, value: typing.Any, prefix: bytes, suffix: bytes, chunk_size: int
+) -> typing.Iterator[bytes]:
+    """
+    Encode a value between a prefix and a suffix, as chunks of about ``chunk_size``.
+
+    Pieces are collected until they add up to ``chunk_size`` bytes, so a chunk exceeds
+    that by at most one piece. A piece is a run of up to ``RUN_LENGTH`` small list
+    items, or one value that is not walked, so it is only large if the items are, e.g.
+    long strings. The prefix is yielded on its own first, before any of the value is
+    encoded.
+
+    :raises RuntimeError: if the codec is binary
+    """
+    if codec.binary:
+        raise RuntimeError("Streaming requires a JSON text codec.")
+    yield prefix
+    pending: typing.List[bytes] = []
+    size = 0
+    for piece in _pieces(codec, value, 0):
+        pending.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield b"".join(pending)
+            pending = []
+            size = 0
+    pending.append(suffix)
+    yield b"".join(pending)
+
+
+def iter_items(
+    codec: JsonCodec, data: bytes, start: int = 0
+) -> typing.Iterator[typing.Any]:
+    """
+    Decode the items of an encoded array a few at a time.
+
+    The items are located with :func:`scan_items`, and each run of ``RUN_LENGTH``
+    items is decoded with one call when the iterator reaches it, so only that many
+    decoded items need to be in memory at a time.
+
+    :param start: The offset of the array in the data.
+    :raises JsonRpcParseError: when the iterator reaches a run that is not valid
+    """
+    decode = codec.decode
+    run_start = run_end = 0
+    count = 0
+    for item_start, item_end in scan_items(data, start):
+        if count == 0:
+            run_start = item_start
+        run_end = item_end
+        count += 1
+        if count == RUN_LENGTH:
+            yield from decode(b"".join((b"[", data[run_start:run_end], b"]")))
+            count = 0
+    if count:
+        yield from decode(b"".join((b"[", data[run_start:run_end], b"]")))
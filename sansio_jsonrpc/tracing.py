@@ -0,0 +1,156 @@
+from __future__ import annotations
+import random
+import time
+import typing
+
+from .pending import Clock
+from .types import JsonRpcId
+from .util import slotted_dataclass
+
+
+@slotted_dataclass
+class RequestTrace:
+    """
+    The timeline of one received request, from its first byte to its encoded response.
+
+    Every timestamp comes from the tracer's clock. If several requests arrive in one
+    batch array, they share the frame's size and its receive and parse stages. Their
+    responses share the size of the response batch, and each encode stage lasts until
+    the whole batch is encoded.
+    """
+
+    id: JsonRpcId
+    method: str
+    #: The size of the frame that contained the request.
+    request_size: int
+    #: When the first byte of the frame was fed to the peer, or else when parsing began.
+    received_at: float
+    parse_started_at: float
+    parsed_at: float
+    #: When the response was handed to the peer to be encoded.
+    handled_at: typing.Optional[float] = None
+    encoded_at: typing.Optional[float] = None
+    #: The size of the frame that contained the response.
+    response_size: typing.Optional[int] = None
+
+    @property
+    def stages(self) -> typing.Dict[str, float]:
+        """ The seconds spent in each stage, or in each stage so far. """
+        stages = {
+            "receive": self.parse_started_at - self.received_at,
+            "parse": self.parsed_at - self.parse_started_at,
+        }
+        if self.handled_at is not None:
+            stages["handle"] = self.handled_at - self.parsed_at
+            if self.encoded_at is not None:
+                stages["encode"] = self.encoded_at - self.handled_at
+        return stages
+
+    @property
+    def duration(self) -> typing.Optional[float]:
+        """ The seconds from receiving the request to encoding its response. """
+        if self.encoded_at is None:
+            return None
+        return self.encoded_at - self.received_at
+
+
+TraceCallback = typing.Callable[[RequestTrace], None]
+
+
+class RequestTracer:
+    """
+    Times each stage of the requests that a :class:`JsonRpcPeer` receives and answers.
+
+    Pass an instance to the peer's constructor. When the peer parses a request that
+    has an ID, the tracer decides whether to sample it. A sampled request is timed
+    until the peer encodes a response with the same ID, and then its trace is passed to
+    the callbacks. Notifications are not traced, since they never get a response.
+
+    The tracer only reads time through its clock, so it works the same on a real clock,
+    an event loop's clock, or a fake clock in tests.
+    """
+
+    def __init__(
+        self,
+        *,
+        clock: Clock = time.monotonic,
+        sample_rate: float = 1.0,
+        slow_threshold: typing.Optional[float] = None,
+        slow_callback: typing.Optional[TraceCallback] = None,
+        trace_callback: typing.Optional[TraceCallback] = None,
+        max_active: int = 10_000,
+        random: typing.Callable[[], float] = random.random,
+    ):
+        """
+        Constructor
+
+        :param clock: Returns the current time in seconds. It must be monotonic.
+        :param sample_rate: The fraction of requests to trace, from 0 to 1.
+        :param slow_threshold: The number of seconds from receiving a request to
+            encoding its response above which the request is slow.
+        :param slow_callback: Called with the trace of each sampled request that is
+            slow.
+        :param trace_callback: Called with the trace of each sampled request.
+        :param max_active: The number of requests that are traced at the same time.
+            If a request is never answered, its trace is eventually discarded to make
+            room for newer requests, oldest first.
+        :param random: Returns a random float in ``[0, 1)`` to sample requests.
+        """
+        self.clock = clock
+        self._sample_rate = sample_rate
+        self._slow_threshold = slow_threshold
+        self._slow_callback = slow_callback
+        self._trace_callback = trace_callback
+        self._max_active = max_active
+        self._random = random
+        self._active: typing.Dict[JsonRpcId, RequestTrace] = dict()
+
+    def __len__(self) -> int:
+        """ The number of sampled requests that have not been answered yet. """
+        return len(self._active)
+
+    def get(self, request_id: JsonRpcId) -> typing.Optional[RequestTrace]:
+        """ Return the trace of a request that has not been answered yet, or None. """
+        return self._active.get(request_id)
+
+    def _begin(
+        self,
+        request_id: JsonRpcId,
+        method: str,
+        size: int,
+        received_at: float,
+        parse_started_at: float,
+        parsed_at: float,
+    ) -> None:
+        """ Start tracing a parsed request if it is sampled. """
+        if self._sample_rate < 1.0 and self._random() >= self._sample_rate:
+            return
+        active = self._active
+        active.pop(request_id, None)
+        if len(active) >= self._max_active:
+            del active[next(iter(active))]
+        active[request_id] = RequestTrace(
+            request_id, method, size, received_at, parse_started_at, parsed_at
+        )
+
+    def _take(self, request_id: JsonRpcId) -> typing.Optional[RequestTrace]:
+        """ Stop tracing a request that is being answered, and return its trace. """
+        if not self._active:
+            return None
+        return self._active.pop(request_id, None)
+
+    def _finish(
+        self, trace: RequestTrace, handled_at: float, encoded_at: float, size: int
+    ) -> None:
+        """ Complete a trace and pass it to the callbacks. """
+        trace.handled_at = handled_at
+        trace.encoded_at = encoded_at
+        trace.response_size = size
+        if self._trace_callback is not None:
+            self._trace_callback(trace)
+        if (
+            self._slow_callback is not None
+            and self._slow_threshold is not None
+            and encoded_at - trace.received_at > self._slow_threshold
+        ):
+            self._slow_callback(trace)
@@ -0,0 +1,35 @@
+import dataclasses
+import sys
+import typing
+
+
+T = typing.TypeVar("T")
+
+
+def _slotted_dataclass(cls: typing.Type[T]) -> typing.Type[T]:
+    """
+    Like ``@dataclass``, but the class gets ``__slots__`` instead of a ``__dict__``.
+
+    This is ``@dataclass(slots=True)``, which requires Python 3.10, with a fallback for
+    older versions that rebuilds the class with a ``__slots__`` entry for each field.
+    Field defaults keep working because they are bound to the generated ``__init__``.
+    """
+    if sys.version_info >= (3, 10):
+        return dataclasses.dataclass(slots=True)(cls)  # type: ignore
+    cls = dataclasses.dataclass(cls)
+    field_names = tuple(field.name for field in dataclasses.fields(cls))
+    namespace = dict(cls.__dict__)
+    for name in field_names + ("__dict__", "__weakref__"):
+        namespace.pop(name, None)
+    namespace["__slots__"] = field_names
+    # mypy cannot represent the type of type(cls) for a class given as Type[T].
+    metaclass: typing.Callable[..., typing.Type[T]] = type(cls)
+    return metaclass(cls.__name__, cls.__bases__, namespace)
+
+
+if typing.TYPE_CHECKING:
+    # Type checkers only recognize the fields of classes that are decorated with
+    # ``dataclass`` itself.
+    from dataclasses import dataclass as slotted_dataclass
+else:
+    slotted_dataclass = _slotted_dataclass
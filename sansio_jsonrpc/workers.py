@@ -0,0 +1,229 @@
+from __future__ import annotations
+import concurrent.futures
+import functools
+import typing
+
+from .codec import JsonCodec, default_codec
+from .dispatch import Binder, Handler, compile_binder
+from .exc import JsonRpcMethodNotFoundError
+from .main import EncodedResult, JsonRpcRequest, LazyJsonRpcRequest
+from .schema import ParamsSchema
+from .types import JsonPrimitive
+
+
+INLINE = "inline"
+THREAD = "thread"
+PROCESS = "process"
+
+# The binders of the methods that have run in this process, so that each function's
+# signature and schema are compiled once per worker process rather than once per call.
+_process_binders: typing.Dict[typing.Tuple[typing.Callable, str], Binder] = dict()
+
+
+def _call_inline(binder: Binder, request: JsonRpcRequest) -> JsonPrimitive:
+    """ Call the function of an inline method. """
+    return binder(request.params)
+
+
+def _run_in_process(
+    func: typing.Callable,
+    name: str,
+    schema: typing.Optional[ParamsSchema],
+    codec: JsonCodec,
+    raw_params: typing.Optional[bytes],
+) -> EncodedResult:
+    """ Decode the params, call the function, and encode its result, in a worker. """
+    binder = _process_binders.get((func, name))
+    if binder is None:
+        binder = _process_binders[func, name] = compile_binder(name, func, schema)
+    params = None if raw_params is None else codec.decode(raw_params)
+    return EncodedResult(codec.encode(binder(params)))
+
+
+def _run_in_thread(
+    binder: Binder, codec: JsonCodec, request: JsonRpcRequest
+) -> EncodedResult:
+    """ Call the function and encode its result, in a worker thread. """
+    return EncodedResult(codec.encode(binder(request.params)))
+
+
+class JsonRpcWorkerPool:
+    """
+    Routes requests to registered functions, some of which run on worker pools.
+
+    Each method is registered to run inline, on a thread pool, or on a process pool.
+    Inline methods are called like :class:`JsonRpcDispatcher` calls them. Thread and
+    process methods are submitted to a ``concurrent.futures`` executor, and the call
+    returns a ``concurrent.futures.Future`` right away.
+
+    A process worker receives the encoded params rather than a pickled copy of the
+    decoded params. If the peer is created with ``lazy=True``, these are the bytes
+    that were received, so the I/O thread never decodes them. The worker encodes the
+    result as well, and the future's value is an :class:`EncodedResult` that
+    :meth:`JsonRpcPeer.respond_with_result` copies into the response. Thread workers
+    decode the params of a lazy request and encode the result in the same way.
+
+    The response is encoded with the request's ID by the thread that owns the peer, so
+    the peer is never used by more than one thread. :class:`JsonRpcProtocol` does this
+    when a pool is its peer's request handler. :meth:`JsonRpcPeer.handle` cannot wait
+    for a future, so only inline methods work with it.
+    """
+
+    def __init__(
+        self,
+        *,
+        codec: typing.Optional[JsonCodec] = None,
+        thread_pool: typing.Optional[concurrent.futures.Executor] = None,
+        process_pool: typing.Optional[concurrent.futures.Executor] = None,
+    ):
+        """
+        Constructor
+
+        :param codec: The codec that encodes the params and results that are passed to
+            and from workers. It must be the codec of the peer that the pool is the
+            request handler of. Defaults to the same codec that a peer defaults to.
+        :param thread_pool: The executor for methods that run on a thread.
+        :param process_pool: The executor for methods that run in a process. The
+            functions, params, and results must be picklable.
+        """
+        self._codec = codec or default_codec()
+        self._thread_pool = thread_pool
+        self._process_pool = process_pool
+        self._routes: typing.Dict[
+            str, typing.Callable[[JsonRpcRequest], typing.Any]
+        ] = dict()
+        self._modes: typing.Dict[str, str] = dict()
+
+    def __contains__(self, method: str) -> bool:
+        """ True if a function is registered for this method name. """
+        return method in self._routes
+
+    @property
+    def methods(self) -> typing.Dict[str, str]:
+        """ The registered method names, mapped to where they run. """
+        return dict(self._modes)
+
+    @typing.overload
+    def register(
+        self,
+        func: Handler,
+        *,
+        name: typing.Optional[str] = None,
+        run: str = INLINE,
+        schema: typing.Optional[ParamsSchema] = None,
+    ) -> Handler:
+        ...
+
+    @typing.overload
+    def register(
+        self,
+        func: None = None,
+        *,
+        name: typing.Optional[str] = None,
+        run: str = INLINE,
+        schema: typing.Optional[ParamsSchema] = None,
+    ) -> typing.Callable[[Handler], Handler]:
+        ...
+
+    def register(
+        self,
+        func: typing.Optional[Handler] = None,
+        *,
+        name: typing.Optional[str] = None,
+        run: str = INLINE,
+        schema: typing.Optional[ParamsSchema] = None,
+    ) -> typing.Union[Handler, typing.Callable[[Handler], Handler]]:
+        """
+        Register a function to handle a method.
+
+        This can be called directly or used as a decorator, with or without
+        arguments.
+
+        :param func: The function. It receives the request params as positional
+            arguments (for a list) or keyword arguments (for a dict), and returns the
+            result. It may raise any ``JsonRpcException`` to send an error response.
+            For ``run="process"``, it must be a module-level function.
+        :param name: The method name. Defaults to the function's name.
+        :param run: Where the function runs: ``"inline"``, ``"thread"``, or
+            ``"process"``.
+        :param schema: If given, the params are checked against this
+            :class:`ParamsSchema` where the function runs, before it is called.
+        :raises ValueError: if ``run`` is not one of those values
+        :raises RuntimeError: if the pool does not have an executor for ``run``
+        """
+        if func is None:
+            return lambda func: self.register(func, name=name, run=run, schema=schema)
+        method = name or func.__name__
+        route: typing.Callable[[JsonRpcRequest], typing.Any]
+        if run == INLINE:
+            binder = compile_binder(method, func, schema)
+            route = functools.partial(_call_inline, binder)
+        elif run == THREAD:
+            if self._thread_pool is None:
+                raise RuntimeError(f"Method {method!r} requires a thread pool.")
+            route = functools.partial(
+                self._submit_to_thread,
+                self._thread_pool,
+                compile_binder(method, func, schema),
+            )
+        elif run == PROCESS:
+            if self._process_pool is None:
+                raise RuntimeError(f"Method {method!r} requires a process pool.")
+            route = functools.partial(
+                self._submit_to_process, self._process_pool, func, method, schema
+            )
+        else:
+            raise ValueError(f"Cannot run a method {run!r}.")
+        self._routes[method] = route
+        self._modes[method] = run
+        return func
+
+    def unregister(self, method: str) -> None:
+        """ Remove the function registered for a method. """
+        del self._routes[method]
+        del self._modes[method]
+
+    def __call__(self, request: JsonRpcRequest) -> typing.Any:
+        """
+        Call or submit the function registered for a request's method.
+
+        :returns: the result of an inline method, or a future of the
+            :class:`EncodedResult` of a thread or process method
+        :raises JsonRpcMethodNotFoundError: if no function is registered
+        :raises JsonRpcInvalidParamsError: if the params do not fit an inline function;
+            for other functions, the future raises it
+        """
+        route = self._routes.get(request.method)
+        if route is None:
+            # Like JsonRpcDispatcher, raise the interned error.
+            raise JsonRpcMethodNotFoundError()
+        return route(request)
+
+    def _submit_to_thread(
+        self,
+        pool: concurrent.futures.Executor,
+        binder: Binder,
+        request: JsonRpcRequest,
+    ) -> concurrent.futures.Future:
+        """ Submit a request to the thread pool. """
+        return pool.submit(_run_in_thread, binder, self._codec, request)
+
+    def _submit_to_process(
+        self,
+        pool: concurrent.futures.Executor,
+        func: typing.Callable,
+        method: str,
+        schema: typing.Optional[ParamsSchema],
+        request: JsonRpcRequest,
+    ) -> concurrent.futures.Future:
+        """ Submit a request's encoded params to the process pool. """
+        raw_params: typing.Optional[bytes] = None
+        if isinstance(request, LazyJsonRpcRequest):
+            raw_params = request.raw_params
+        if raw_params is None:
+            params = request.params
+            if params is not None:
+                raw_params = self._codec.encode(params)
+        return pool.submit(
+            _run_in_process, func, method, schema, self._codec, raw_params
+        )
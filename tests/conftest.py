@@ -0,0 +1,23 @@
+import pytest
+
+
+class FakeClock:
+    """
+    A clock that only moves when told to.
+
+    If ``step`` is set, the clock also advances by that much each time it is read.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.step = 0.0
+
+    def __call__(self):
+        self.now += self.step
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    """ A fake clock that starts at zero. """
+    return FakeClock()
@@ -0,0 +1,320 @@
+import asyncio
+import socket
+
+import pytest
+
+from sansio_jsonrpc import (
+    JsonRpcDispatcher,
+    JsonRpcMethodNotFoundError,
+    JsonRpcPeer,
+    JsonRpcResponse,
+    NewlineFramer,
+    PendingRequests,
+)
+from sansio_jsonrpc.asyncio import JsonRpcProtocol
+
+
+def make_dispatcher():
+    dispatcher = JsonRpcDispatcher()
+
+    @dispatcher.register
+    def add(a, b):
+        return a + b
+
+    @dispatcher.register
+    async def sleep_and_echo(delay, value):
+        await asyncio.sleep(delay)
+        return value
+
+    @dispatcher.register
+    def nothing():
+        return None
+
+    @dispatcher.register
+    def opaque():
+        return object()
+
+    return dispatcher
+
+
+async def connect(server_peer, client_peer=None, **kwargs):
+    """ A helper that connects two protocols over a local socket pair. """
+    loop = asyncio.get_event_loop()
+    client_sock, server_sock = socket.socketpair()
+    _, server = await loop.connect_accepted_socket(
+        lambda: JsonRpcProtocol(server_peer, **kwargs), sock=server_sock
+    )
+    _, client = await loop.create_connection(
+        lambda: JsonRpcProtocol(client_peer), sock=client_sock
+    )
+    return client, server
+
+
+def test_request():
+    async def main():
+        client, server = await connect(JsonRpcPeer(make_dispatcher()))
+        assert await client.request("add", [1, 2]) == 3
+        with pytest.raises(JsonRpcMethodNotFoundError):
+            await client.request("missing")
+        client.close()
+        await server.wait_closed()
+
+    asyncio.run(main())
+
+
+def test_pipelined_requests_resolve_out_of_order():
+    async def main():
+        client, _ = await connect(JsonRpcPeer(make_dispatcher()))
+        finished = []
+
+        async def call(delay, value):
+            result = await client.request("sleep_and_echo", [delay, value])
+            finished.append(result)
+            return result
+
+        results = await asyncio.gather(*(call(0.05 - i / 100, i) for i in range(5)))
+        assert results == [0, 1, 2, 3, 4]
+        assert finished == [4, 3, 2, 1, 0]
+        assert len(client.peer.pending) == 0
+        client.close()
+
+    asyncio.run(main())
+
+
+def test_writes_are_coalesced():
+    async def main():
+        client, _ = await connect(JsonRpcPeer(make_dispatcher()))
+        writes = []
+        writelines = client.transport.writelines
+        client.transport.writelines = lambda frames: (
+            writes.append(len(frames)),
+            writelines(frames),
+        )
+        results = await asyncio.gather(*(client.request("add", [i, 1]) for i in range(100)))
+        assert results == list(range(1, 101))
+        assert writes == [100]
+        client.close()
+
+    asyncio.run(main())
+
+
+def test_notify():
+    async def main():
+        received = asyncio.Event()
+
+        def handler(request):
+            assert request.method == "ping"
+            received.set()
+
+        client, _ = await connect(JsonRpcPeer(handler))
+        await client.notify("ping", {"n": 1})
+        await asyncio.wait_for(received.wait(), 1)
+        client.close()
+
+    asyncio.run(main())
+
+
+def test_timeout():
+    async def main():
+        client, _ = await connect(JsonRpcPeer(make_dispatcher()))
+        with pytest.raises(asyncio.TimeoutError):
+            await client.request("sleep_and_echo", [1, None], timeout=0.02)
+        assert len(client.peer.pending) == 0
+        assert await client.request("add", [2, 2], timeout=1) == 4
+        client.close()
+
+    asyncio.run(main())
+
+
+def test_cancelled_request_is_forgotten():
+    async def main():
+        client, _ = await connect(JsonRpcPeer(make_dispatcher()))
+        task = asyncio.ensure_future(client.request("sleep_and_echo", [1, None]))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert len(client.peer.pending) == 0
+        client.close()
+
+    asyncio.run(main())
+
+
+def test_connection_lost():
+    async def main():
+        client, server = await connect(JsonRpcPeer(make_dispatcher()))
+        task = asyncio.ensure_future(client.request("sleep_and_echo", [1, None]))
+        await asyncio.sleep(0.01)
+        server.close()
+        with pytest.raises(ConnectionError):
+            await task
+        await client.wait_closed()
+        with pytest.raises(ConnectionError):
+            await client.request("add", [1, 2])
+
+    asyncio.run(main())
+
+
+def test_requests_without_tracker():
+    async def main():
+        client, _ = await connect(JsonRpcPeer(), JsonRpcPeer())
+        with pytest.raises(RuntimeError):
+            await client.request("add", [1, 2])
+        client.close()
+
+    asyncio.run(main())
+
+
+def test_reading_pauses_while_handlers_are_busy():
+    async def main():
+        release = asyncio.Event()
+
+        async def handler(request):
+            await release.wait()
+            return request.params
+
+        client, server = await connect(JsonRpcPeer(handler), max_tasks=2)
+        calls = [
+            asyncio.ensure_future(client.request("echo", [i])) for i in range(3)
+        ]
+        await asyncio.sleep(0.05)
+        assert server._reading_paused
+        assert not server.transport.is_reading()
+        release.set()
+        assert await asyncio.gather(*calls) == [[0], [1], [2]]
+        assert not server._reading_paused
+        client.close()
+
+    asyncio.run(main())
+
+
+def test_write_back_pressure():
+    async def main():
+        release = asyncio.Event()
+
+        async def handler(request):
+            await release.wait()
+
+        server_peer = JsonRpcPeer(handler)
+        client, server = await connect(server_peer, max_tasks=1)
+        client.transport.set_write_buffer_limits(high=1024, low=256)
+        payload = "x" * 4096
+        sent = 0
+
+        async def flood():
+            nonlocal sent
+            while True:
+                await client.notify("put", [payload])
+                sent += 1
+
+        flooding = asyncio.ensure_future(flood())
+        await asyncio.sleep(0.1)
+        # The server stopped reading, so the socket buffers and then the client's
+        # write buffer filled up, and notify() is now waiting for it to drain.
+        assert client._writing_paused
+        stalled = sent
+        await asyncio.sleep(0.05)
+        assert sent == stalled
+        release.set()
+        await asyncio.sleep(0.1)
+        assert sent > stalled
+        flooding.cancel()
+        client.close()
+
+    asyncio.run(main())
+
+
+def test_batches_and_parse_errors():
+    async def main():
+        loop = asyncio.get_event_loop()
+        raw, server_sock = socket.socketpair()
+        raw.setblocking(False)
+        peer = JsonRpcPeer(make_dispatcher(), framer=NewlineFramer())
+        await loop.connect_accepted_socket(lambda: JsonRpcProtocol(peer), sock=server_sock)
+        parser = JsonRpcPeer(framer=NewlineFramer())
+
+        async def exchange(data, count):
+            await loop.sock_sendall(raw, data)
+            messages = []
+            while len(messages) < count:
+                data = await asyncio.wait_for(loop.sock_recv(raw, 65536), 1)
+                assert data, "The server closed the connection."
+                messages.extend(parser.feed(data))
+            return messages
+
+        batch = (
+            b'[{"jsonrpc": "2.0", "id": 1, "method": "add", "params": [1, 2]},'
+            b'{"jsonrpc": "2.0", "id": 2, "method": "sleep_and_echo",'
+            b' "params": [0.01, "a"]},'
+            b'{"jsonrpc": "2.0", "method": "add", "params": [1, 2]}]\n'
+        )
+        responses = await exchange(batch, 2)
+        assert responses == [
+            JsonRpcResponse(id=1, result=3),
+            JsonRpcResponse(id=2, result="a"),
+        ]
+
+        # A bad frame gets an error response, and the frames after it still work.
+        bad = b'{"jsonrpc": \n{"jsonrpc": "2.0", "id": 3, "method": "add", "params": [2, 2]}\n'
+        error, result = await exchange(bad, 2)
+        assert error.id is None and error.error.code == -32700
+        assert result == JsonRpcResponse(id=3, result=4)
+
+        # So does a malformed response, e.g. one without an ID.
+        bad = (
+            b'{"jsonrpc": "2.0", "result": 1}\n'
+            b'{"jsonrpc": "2.0", "id": 4, "method": "add", "params": [3, 3]}\n'
+        )
+        error, result = await exchange(bad, 2)
+        assert error.id is None and error.error.code == -32600
+        assert result == JsonRpcResponse(id=4, result=6)
+        raw.close()
+
+    asyncio.run(main())
+
+
+def test_null_results():
+    async def main():
+        loop = asyncio.get_event_loop()
+        raw, server_sock = socket.socketpair()
+        raw.setblocking(False)
+        peer = JsonRpcPeer(make_dispatcher(), framer=NewlineFramer())
+        await loop.connect_accepted_socket(lambda: JsonRpcProtocol(peer), sock=server_sock)
+        parser = JsonRpcPeer(framer=NewlineFramer())
+
+        async def exchange(data, count):
+            await loop.sock_sendall(raw, data)
+            messages = []
+            while len(messages) < count:
+                data = await asyncio.wait_for(loop.sock_recv(raw, 65536), 1)
+                messages.extend(parser.feed(data))
+            return messages
+
+        single = b'{"jsonrpc": "2.0", "id": 1, "method": "nothing"}\n'
+        assert await exchange(single, 1) == [JsonRpcResponse(id=1, result=None)]
+
+        # Each call in a batch is answered on its own, even if its result is not JSON,
+        # both when the batch is answered right away and after an awaited handler.
+        calls = (
+            b'{"jsonrpc": "2.0", "id": 1, "method": "nothing"},'
+            b'{"jsonrpc": "2.0", "id": 2, "method": "opaque"}'
+        )
+        first, second = await exchange(b"[%s]\n" % calls, 2)
+        assert first == JsonRpcResponse(id=1, result=None)
+        assert second.id == 2 and second.error.code == -32603
+        awaited = (
+            b'{"jsonrpc": "2.0", "id": 3, "method": "sleep_and_echo", "params": [0, null]}'
+        )
+        first, second, third = await exchange(b"[%s,%s]\n" % (calls, awaited), 3)
+        assert first == JsonRpcResponse(id=1, result=None)
+        assert second.id == 2 and second.error.code == -32603
+        assert third == JsonRpcResponse(id=3, result=None)
+        raw.close()
+
+    asyncio.run(main())
+
+
+def test_default_peer():
+    protocol = JsonRpcProtocol()
+    assert isinstance(protocol.peer.pending, PendingRequests)
+    assert protocol.transport is None
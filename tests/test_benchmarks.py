@@ -0,0 +1,22 @@
+from benchmarks.suite import build_cases, measure
+from sansio_jsonrpc.codec import StdlibJsonCodec
+
+
+def test_benchmark_cases_run():
+    """ Every benchmark case runs without errors and reports sane numbers. """
+    cases = build_cases()
+    names = [f"{case.group}/{case.name}" for case in cases]
+    assert len(names) == len(set(names))
+    for case in cases:
+        if "huge" in case.name:
+            continue
+        result = measure(case, min_time=0.001)
+        assert result.ns_per_op > 0
+        assert result.messages_per_sec > 0
+
+
+def test_benchmark_deep_case_stdlib_codec():
+    """ The stdlib codec recurses while decoding, unlike orjson. """
+    cases = build_cases(StdlibJsonCodec())
+    (case,) = [c for c in cases if f"{c.group}/{c.name}" == "limits/unlimited/deep"]
+    assert measure(case, min_time=0.001).ns_per_op > 0
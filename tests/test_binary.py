@@ -0,0 +1,161 @@
+import pytest
+
+from sansio_jsonrpc import (
+    ContentLengthFramer,
+    JsonRpcParseError,
+    JsonRpcPeer,
+    Limits,
+)
+from sansio_jsonrpc.binary import (
+    MsgpackCodec,
+    PureMsgpackCodec,
+    default_binary_codec,
+    msgpack,
+)
+
+
+CODECS = [PureMsgpackCodec]
+if msgpack is not None:
+    CODECS.append(MsgpackCodec)
+
+VALUES = [
+    None,
+    True,
+    False,
+    0,
+    127,
+    128,
+    255,
+    256,
+    2 ** 16,
+    2 ** 32,
+    2 ** 64 - 1,
+    -1,
+    -32,
+    -33,
+    -129,
+    -(2 ** 15) - 1,
+    -(2 ** 31) - 1,
+    -(2 ** 63),
+    1.5,
+    -0.1,
+    "",
+    "a" * 31,
+    "a" * 32,
+    "café" * 100,
+    "x" * 70_000,
+    [],
+    list(range(16)),
+    list(range(70_000)),
+    [0.5 * i for i in range(20)],
+    list(range(120, 136)),
+    [1.5] * 7 + [1],
+    [1] * 7 + [-1],
+    {},
+    {str(i): i for i in range(16)},
+    {"jsonrpc": "2.0", "id": 1, "result": {"rows": [{"a": [1, None, "b"]}]}},
+]
+
+
+@pytest.fixture(params=CODECS, ids=lambda cls: cls.name)
+def codec(request):
+    return request.param()
+
+
+@pytest.mark.parametrize("value", VALUES, ids=repr)
+def test_round_trip(codec, value):
+    data = codec.encode(value)
+    assert codec.decode(data) == value
+    assert codec.decode(bytearray(data)) == value
+
+
+def test_known_encodings():
+    codec = PureMsgpackCodec()
+    assert codec.encode({"a": [1, -1, None, True]}) == b"\x81\xa1a\x94\x01\xff\xc0\xc3"
+    assert codec.encode(1.0) == b"\xcb\x3f\xf0\x00\x00\x00\x00\x00\x00"
+    assert codec.encode(-33) == b"\xd0\xdf"
+    assert codec.encode(300) == b"\xcd\x01\x2c"
+    # A single-precision float is accepted when decoding.
+    assert codec.decode(b"\xca\x3f\xc0\x00\x00") == 1.5
+
+
+@pytest.mark.skipif(msgpack is None, reason="msgpack is not installed")
+@pytest.mark.parametrize("value", VALUES, ids=repr)
+def test_pure_codec_matches_msgpack(value):
+    assert PureMsgpackCodec().encode(value) == MsgpackCodec().encode(value)
+
+
+@pytest.mark.parametrize(
+    "value", [2 ** 64, -(2 ** 63) - 1, b"bytes", {1: 2}, object()], ids=repr
+)
+def test_encode_unsupported(value):
+    with pytest.raises(TypeError):
+        PureMsgpackCodec().encode(value)
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"",
+        b"\x92\x01",
+        b"\xa3ab",
+        b"\xcd\x01",
+        b"\x01\x02",
+        b"\xc1",
+        b"\xc4\x01a",
+        b"\xd4\x01\x00",
+        b"\x81\x01\x02",
+        b"\x91" * 100_000,
+        b"\x98" + b"\x01" * 7,
+        b"\x98" + b"\xcb\x00\x00\x00\x00\x00\x00\x00\x00" * 7 + b"\xcb",
+    ],
+)
+def test_decode_invalid(codec, data):
+    with pytest.raises(JsonRpcParseError) as exc_info:
+        codec.decode(data)
+    assert exc_info.value.message == "Invalid MessagePack format"
+
+
+def test_decode_invalid_utf8(codec):
+    with pytest.raises(JsonRpcParseError) as exc_info:
+        codec.decode(b"\xa1\xff")
+    assert exc_info.value.message == "Invalid ASCII encoding"
+
+
+def test_default_binary_codec():
+    expected = PureMsgpackCodec if msgpack is None else MsgpackCodec
+    assert type(default_binary_codec()) is expected
+
+
+def test_peer(codec):
+    peer = JsonRpcPeer(codec=codec)
+    assert isinstance(peer.framer, ContentLengthFramer)
+    req_id, data = peer.request("hello", {"n": [1.5, 2]})
+    (request,) = peer.parse(data)
+    assert request.id == req_id
+    assert request.params == {"n": [1.5, 2]}
+    response = peer.respond_with_result(request, {"sum": 3.5})
+    (message,) = peer.parse(response)
+    assert message.result == {"sum": 3.5}
+    stream = peer.framer.frame(data) + peer.framer.frame(response)
+    assert len(list(peer.feed(stream))) == 2
+
+
+def test_peer_prepared_call(codec):
+    """ A prepared call cannot splice binary output, so it encodes each request. """
+    peer = JsonRpcPeer(codec=codec)
+    prepared = peer.prepare("hello")
+    assert not prepared._templated
+    req_id, data = prepared.request([1])
+    (request,) = peer.parse(data)
+    assert request.id == req_id
+    assert request.params == [1]
+
+
+def test_peer_rejects_text_features():
+    with pytest.raises(RuntimeError):
+        JsonRpcPeer(codec=PureMsgpackCodec(), lazy=True)
+    with pytest.raises(RuntimeError):
+        JsonRpcPeer(codec=PureMsgpackCodec(), limits=Limits(max_depth=10))
+    peer = JsonRpcPeer(codec=PureMsgpackCodec(), limits=Limits(max_frame_bytes=10))
+    assert peer.framer._max_frame_bytes == 10
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from sansio_jsonrpc import JsonRpcParseError, JsonRpcPeer
+from sansio_jsonrpc.codec import OrjsonCodec, StdlibJsonCodec, default_codec, orjson
+
+
+CODECS = [StdlibJsonCodec]
+if orjson is not None:
+    CODECS.append(OrjsonCodec)
+
+
+@pytest.fixture(params=CODECS, ids=lambda cls: cls.name)
+def codec(request):
+    return request.param()
+
+
+def test_codec_round_trip(codec):
+    obj = {"jsonrpc": "2.0", "id": 1, "result": {"text": "café", "n": [1, 2.5]}}
+    data = codec.encode(obj)
+    assert isinstance(data, bytes)
+    assert json.loads(data) == obj
+    assert codec.decode(data) == obj
+    assert codec.decode(bytearray(data)) == obj
+
+
+def test_codec_compact(codec):
+    assert codec.encode({"a": [1, 2]}) == b'{"a":[1,2]}'
+
+
+def test_codec_invalid_utf8(codec):
+    with pytest.raises(JsonRpcParseError) as exc_info:
+        codec.decode(b'"\xff"')
+    assert exc_info.value.message == "Invalid ASCII encoding"
+
+
+def test_codec_invalid_json(codec):
+    with pytest.raises(JsonRpcParseError) as exc_info:
+        codec.decode(b"{")
+    assert exc_info.value.message == "Invalid JSON format"
+
+
+def test_codec_deeply_nested_json(codec):
+    with pytest.raises(JsonRpcParseError) as exc_info:
+        codec.decode(b"[" * 100_000)
+    assert exc_info.value.message == "Invalid JSON format"
+
+
+def test_peer_uses_codec(codec):
+    peer = JsonRpcPeer(codec=codec)
+    assert peer.codec is codec
+    req_id, bytes_to_send = peer.request(method="hello_world", params=[1])
+    assert bytes_to_send == (
+        b'{"method":"hello_world","jsonrpc":"2.0","id":0,"params":[1]}'
+    )
+    (req,) = peer.parse(bytes_to_send)
+    assert req.params == [1]
+
+
+def test_default_codec():
+    expected = StdlibJsonCodec if orjson is None else OrjsonCodec
+    assert type(default_codec()) is expected
+    assert type(JsonRpcPeer().codec) is expected
@@ -0,0 +1,153 @@
+import zlib
+
+import pytest
+
+from sansio_jsonrpc import (
+    Compression,
+    ContentLengthFramer,
+    JsonRpcInvalidRequestError,
+    JsonRpcParseError,
+    JsonRpcPeer,
+    JsonRpcRequest,
+    JsonRpcResponse,
+    Limits,
+    NewlineFramer,
+    PeerMetrics,
+)
+from sansio_jsonrpc.binary import PureMsgpackCodec
+from sansio_jsonrpc.compression import COMPRESSED_FLAG
+
+
+ROWS = [{"name": f"row {i}", "value": i, "enabled": i % 2 == 0} for i in range(50)]
+
+
+def test_compress_round_trip():
+    compression = Compression(["get_rows"], keys=["name", "value", "enabled"])
+    data = JsonRpcPeer().respond_with_result(
+        JsonRpcRequest(id=1, method="get_rows"), ROWS
+    )
+    compressed = compression.compress(data)
+    assert compressed.startswith(COMPRESSED_FLAG)
+    assert len(compressed) < len(data) / 3
+    assert compression.decompress(compressed) == data
+
+
+def test_dictionary_improves_small_frames():
+    data = JsonRpcPeer().respond_with_result(
+        JsonRpcRequest(id=1, method="get_rows"), ROWS[:5]
+    )
+    plain = Compression(threshold=0).compress(data)
+    primed = Compression(keys=["name", "value", "enabled"], threshold=0).compress(data)
+    assert len(primed) < len(plain) < len(data)
+
+
+def test_below_threshold():
+    compression = Compression(threshold=100)
+    data = b'{"jsonrpc":"2.0","id":1,"result":null}'
+    assert compression.compress(data) is data
+    assert compression.decompress(data) is data
+
+
+def test_incompressible_frame():
+    # Random-looking bytes do not shrink, so the frame is sent as it is.
+    data = zlib.compress(bytes(range(256)) * 4)
+    assert Compression(threshold=0).compress(data) is data
+
+
+def test_decompress_invalid():
+    compression = Compression()
+    with pytest.raises(JsonRpcParseError):
+        compression.decompress(COMPRESSED_FLAG + b"not zlib")
+    compressed = compression.compress(b"[" + b"1," * 500 + b"1]")
+    with pytest.raises(JsonRpcParseError):
+        compression.decompress(compressed[:-5])
+    with pytest.raises(JsonRpcParseError):
+        compression.decompress(compressed + b"1")
+
+
+def test_decompress_different_dictionary():
+    compressed = Compression(["a"]).compress(b"[" + b"1," * 500 + b"1]")
+    with pytest.raises(JsonRpcParseError):
+        Compression(["b"]).decompress(compressed)
+
+
+def test_decompress_max_size():
+    data = b"[" + b"0," * 5000 + b"0]"
+    compressed = Compression().compress(data)
+    assert len(compressed) < 100
+    assert Compression().decompress(compressed, len(data)) == data
+    with pytest.raises(JsonRpcInvalidRequestError):
+        Compression().decompress(compressed, len(data) - 1)
+
+
+def test_peer():
+    compression = Compression(["get_rows"], keys=["name", "value", "enabled"])
+    client = JsonRpcPeer(compression=compression)
+    server = JsonRpcPeer(compression=compression)
+    assert isinstance(client.framer, ContentLengthFramer)
+    assert client.compression is compression
+
+    request_id, data = client.request("get_rows", {"limit": 50})
+    assert not data.startswith(COMPRESSED_FLAG)
+    (request,) = server.parse(data)
+    response = server.respond_with_result(request, ROWS)
+    assert response.startswith(COMPRESSED_FLAG)
+    (parsed,) = client.parse(response)
+    assert parsed == JsonRpcResponse(id=request_id, result=ROWS)
+
+    # Compressed frames are framed by length, like any other frame.
+    framed = server.framer.frame(response) * 2
+    assert list(client.feed(framed)) == [parsed, parsed]
+
+
+def test_peer_prepared_call_and_batches():
+    compression = Compression(threshold=64)
+    peer = JsonRpcPeer(compression=compression)
+    data = peer.prepare("put_rows").notify(ROWS)
+    assert data.startswith(COMPRESSED_FLAG)
+    (notification,) = peer.parse(data)
+    assert notification.params == ROWS
+
+    batch = peer.request_batch()
+    for row in ROWS[:10]:
+        batch.notify("put_row", row)
+    data = batch.encode()
+    assert data.startswith(COMPRESSED_FLAG)
+    assert [message.params for message in peer.parse(data)] == ROWS[:10]
+
+    messages, errors = peer.parse_many([data, compression.compress(b"[]")])
+    assert len(messages[0]) == 10
+    assert errors[0] is None and errors[1] is not None
+
+
+def test_peer_metrics_count_compressed_bytes():
+    metrics = PeerMetrics()
+    peer = JsonRpcPeer(compression=Compression(), metrics=metrics)
+    data = peer.notify("put_rows", ROWS)
+    assert data.startswith(COMPRESSED_FLAG)
+    peer.parse(data)
+    assert metrics.bytes_sent == metrics.bytes_received == len(data)
+
+
+def test_peer_limits_decompressed_size():
+    compression = Compression()
+    data = compression.compress(JsonRpcPeer().notify("put_rows", ROWS))
+    peer = JsonRpcPeer(compression=compression, limits=Limits(max_frame_bytes=1000))
+    assert len(data) < 1000
+    with pytest.raises(JsonRpcInvalidRequestError):
+        peer.parse(data)
+
+
+def test_peer_binary_codec():
+    codec = PureMsgpackCodec()
+    compression = Compression(codec=codec)
+    peer = JsonRpcPeer(codec=codec, compression=compression)
+    data = peer.notify("put_rows", ROWS)
+    assert data.startswith(COMPRESSED_FLAG)
+    (notification,) = peer.parse(data)
+    assert notification.params == ROWS
+
+
+def test_peer_rejects_delimited_framer():
+    with pytest.raises(RuntimeError):
+        JsonRpcPeer(framer=NewlineFramer(), compression=Compression())
@@ -0,0 +1,229 @@
+import json
+
+import pytest
+
+from sansio_jsonrpc import (
+    JsonRpcApplicationError,
+    JsonRpcDispatcher,
+    JsonRpcInvalidParamsError,
+    JsonRpcMethodNotFoundError,
+    JsonRpcPeer,
+    JsonRpcRequest,
+    ParamsSchema,
+)
+from sansio_jsonrpc.streaming import RUN_LENGTH
+
+
+def make_dispatcher():
+    dispatcher = JsonRpcDispatcher()
+
+    @dispatcher.register
+    def add(a, b=0):
+        return a + b
+
+    @dispatcher.register(name="math.sum")
+    def sum_(*values):
+        return sum(values)
+
+    @dispatcher.register
+    def greet(*, name, greeting="Hello"):
+        return f"{greeting}, {name}"
+
+    @dispatcher.register
+    def echo(**kwargs):
+        return kwargs
+
+    def fail():
+        raise JsonRpcApplicationError("Nope", code=1)
+
+    dispatcher.register(fail)
+    return dispatcher
+
+
+def call(dispatcher, method, params=None):
+    return dispatcher(JsonRpcRequest(id=0, method=method, params=params))
+
+
+def test_register():
+    dispatcher = make_dispatcher()
+    assert "add" in dispatcher
+    assert "math.sum" in dispatcher
+    assert "sum_" not in dispatcher
+    dispatcher.unregister("add")
+    assert "add" not in dispatcher
+    assert dispatcher.methods == ["math.sum", "greet", "echo", "fail"]
+
+
+def test_bind_positional():
+    dispatcher = make_dispatcher()
+    assert call(dispatcher, "add", [1]) == 1
+    assert call(dispatcher, "add", [1, 2]) == 3
+    assert call(dispatcher, "math.sum", []) == 0
+    assert call(dispatcher, "math.sum", [1, 2, 3]) == 6
+    assert call(dispatcher, "math.sum") == 0
+    with pytest.raises(JsonRpcInvalidParamsError):
+        call(dispatcher, "add", [])
+    with pytest.raises(JsonRpcInvalidParamsError):
+        call(dispatcher, "add", [1, 2, 3])
+    with pytest.raises(JsonRpcInvalidParamsError):
+        call(dispatcher, "add")
+    with pytest.raises(JsonRpcInvalidParamsError):
+        call(dispatcher, "greet", ["Ada"])
+
+
+def test_bind_named():
+    dispatcher = make_dispatcher()
+    assert call(dispatcher, "add", {"a": 1, "b": 2}) == 3
+    assert call(dispatcher, "greet", {"name": "Ada"}) == "Hello, Ada"
+    assert call(dispatcher, "echo", {"x": 1}) == {"x": 1}
+    with pytest.raises(JsonRpcInvalidParamsError):
+        call(dispatcher, "add", {"b": 2})
+    with pytest.raises(JsonRpcInvalidParamsError):
+        call(dispatcher, "add", {"a": 1, "c": 2})
+    with pytest.raises(JsonRpcInvalidParamsError):
+        call(dispatcher, "math.sum", {"a": 1})
+
+
+def test_method_not_found():
+    with pytest.raises(JsonRpcMethodNotFoundError) as exc_info:
+        call(make_dispatcher(), "nope")
+    # The error is interned, so that peers reuse its encoding.
+    assert exc_info.value.get_error() is JsonRpcMethodNotFoundError.intern()
+
+
+def test_invalid_params_error_is_interned():
+    dispatcher = make_dispatcher()
+    errors = []
+    for params in ([], {"b": 2}):
+        with pytest.raises(JsonRpcInvalidParamsError) as exc_info:
+            call(dispatcher, "add", params)
+        errors.append(exc_info.value.get_error())
+    assert errors[0].message == "Invalid params for method 'add'"
+    assert errors[0] is errors[1] is JsonRpcInvalidParamsError.intern(errors[0].message)
+
+
+def test_handle_request():
+    server = JsonRpcPeer(request_handler=make_dispatcher())
+    response = server.handle(
+        b'{"jsonrpc": "2.0", "id": 1, "method": "add", "params": [2, 3]}'
+    )
+    assert json.loads(response) == {"jsonrpc": "2.0", "id": 1, "result": 5}
+
+
+def test_handle_errors():
+    server = JsonRpcPeer(request_handler=make_dispatcher())
+    response = json.loads(server.handle(b'{"jsonrpc": "2.0", "id": 1, "method": "x"}'))
+    assert response["error"]["code"] == -32601
+    response = json.loads(
+        server.handle(b'{"jsonrpc": "2.0", "id": 2, "method": "add", "params": {}}')
+    )
+    assert response["error"]["code"] == -32602
+    response = json.loads(
+        server.handle(b'{"jsonrpc": "2.0", "id": 3, "method": "fail"}')
+    )
+    assert response["error"] == {"code": 1, "message": "Nope"}
+    response = json.loads(server.handle(b"{"))
+    assert response["id"] is None
+    assert response["error"]["code"] == -32700
+
+
+def test_handle_unexpected_exception():
+    dispatcher = JsonRpcDispatcher()
+    dispatcher.register(lambda: 1 / 0, name="divide")
+    server = JsonRpcPeer(request_handler=dispatcher)
+    response = json.loads(
+        server.handle(b'{"jsonrpc": "2.0", "id": 1, "method": "divide"}')
+    )
+    assert response["error"]["message"] == "Internal JSON-RPC error."
+
+
+def test_handle_notification():
+    calls = []
+    dispatcher = JsonRpcDispatcher()
+    dispatcher.register(calls.append, name="log")
+    server = JsonRpcPeer(request_handler=dispatcher)
+    assert server.handle(b'{"jsonrpc": "2.0", "method": "log", "params": [1]}') == b""
+    assert server.handle(b'{"jsonrpc": "2.0", "method": "nope"}') == b""
+    assert calls == [1]
+
+
+def test_handle_batch():
+    server = JsonRpcPeer(request_handler=make_dispatcher())
+    response = server.handle(
+        b'[{"jsonrpc": "2.0", "id": 1, "method": "add", "params": [1, 1]},'
+        b'{"jsonrpc": "2.0", "method": "add", "params": [1, 1]},'
+        b'{"jsonrpc": "2.0", "id": 2, "method": "nope"}]'
+    )
+    assert [(r["id"], r.get("result")) for r in json.loads(response)] == [
+        (1, 2),
+        (2, None),
+    ]
+
+
+def test_handle_requires_handler():
+    with pytest.raises(RuntimeError):
+        JsonRpcPeer().handle(b"{}")
+
+
+def make_ingest_dispatcher(seen):
+    dispatcher = JsonRpcDispatcher()
+
+    @dispatcher.register(iter_params=True)
+    def ingest(records):
+        count = 0
+        for record in records:
+            seen.append(record)
+            count += 1
+        return count
+
+    @dispatcher.register(iter_params="records")
+    def ingest_into(table, records):
+        return [table, sum(1 for _ in records)]
+
+    return dispatcher
+
+
+@pytest.mark.parametrize("lazy", [True, False])
+def test_iter_params(lazy):
+    seen = []
+    server = JsonRpcPeer(make_ingest_dispatcher(seen), lazy=lazy)
+    data = server.handle(
+        b'{"jsonrpc": "2.0", "id": 1, "method": "ingest",'
+        b' "params": [{"n": 1}, [2], "three", 4, null]}'
+    )
+    assert json.loads(data)["result"] == 5
+    assert seen == [{"n": 1}, [2], "three", 4, None]
+    data = server.handle(
+        b'{"jsonrpc": "2.0", "id": 2, "method": "ingest_into",'
+        b' "params": {"records": [{"n": 1}, {"n": 2}], "table": "t"}}'
+    )
+    assert json.loads(data)["result"] == ["t", 2]
+    data = server.handle(
+        b'{"jsonrpc": "2.0", "id": 3, "method": "ingest_into",'
+        b' "params": {"records": {"n": 1}, "table": "t"}}'
+    )
+    assert json.loads(data)["error"]["code"] == -32602
+
+
+def test_iter_params_decodes_items_lazily():
+    seen = []
+    server = JsonRpcPeer(make_ingest_dispatcher(seen), lazy=True)
+    items = b", ".join(str(i).encode() for i in range(RUN_LENGTH))
+    data = server.handle(
+        b'{"jsonrpc": "2.0", "id": 1, "method": "ingest",'
+        b' "params": [' + items + b', {"bad": }]}'
+    )
+    assert json.loads(data)["error"]["code"] == -32700
+    assert seen == list(range(RUN_LENGTH))
+
+
+def test_iter_params_registration():
+    dispatcher = make_ingest_dispatcher([])
+    assert "ingest" in dispatcher
+    assert sorted(dispatcher.methods) == ["ingest", "ingest_into"]
+    dispatcher.unregister("ingest")
+    assert "ingest" not in dispatcher
+    with pytest.raises(KeyError):
+        dispatcher.unregister("ingest")
+    with pytest.raises(ValueError):
+        dispatcher.register(len, iter_params=True, schema=ParamsSchema({"a": list}))
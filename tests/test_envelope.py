@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+from sansio_jsonrpc import JsonRpcParseError
+from sansio_jsonrpc.envelope import find_payload
+
+
+def payload(data):
+    """ A helper that returns the name and bytes of the payload that was found. """
+    name, start, end = find_payload(data)
+    return name, data[start:end]
+
+
+def test_find_payload_last_member():
+    data = b'{"jsonrpc":"2.0","id":1,"method":"foo","params":{"a":[1,{"b":2}]}}'
+    assert payload(data) == (b"params", b'{"a":[1,{"b":2}]}')
+
+
+def test_find_payload_before_scalar_members():
+    data = b'{ "params" : [1, "]", "\\"}"] , "id" : "x,\\"y" , "n": -1.5e3 }\n'
+    assert payload(data) == (b"params", b'[1, "]", "\\"}"]')
+
+
+def test_find_payload_after_container_members():
+    data = b'{"error_data":{"x":[1]},"result":{"a":"{"},"jsonrpc":"2.0","id":1}'
+    assert payload(data) == (b"result", b'{"a":"{"}')
+
+
+def test_find_payload_before_container_members():
+    # The quick check from the end of the message fails, so the payload is scanned.
+    data = b'{"result":{"a":1},"meta":{"b":2},"id":1}'
+    assert payload(data) == (b"result", b'{"a":1}')
+    data = b'{"result":[{"a":1},{"b":2}],"meta":[3],"id":1}'
+    assert payload(data) == (b"result", b'[{"a":1},{"b":2}]')
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b'[{"params": [1]}]',
+        b'{"jsonrpc": "2.0", "method": "foo"}',
+        b'{"jsonrpc": "2.0", "id": 1, "result": "[1]"}',
+        b'{"jsonrpc": "2.0", "id": 1, "result": null}',
+        b'{"jsonrpc": "2.0", "method": "foo", "data": {"params": [1]}}',
+        b'{"jsonrpc": "2.0", "method": "foo", "params"',
+        b"not json",
+        b"",
+    ],
+)
+def test_find_payload_not_found(data):
+    assert find_payload(data) is None
+
+
+def test_find_payload_unterminated():
+    with pytest.raises(JsonRpcParseError):
+        find_payload(b'{"params": [1, [2]')
+    with pytest.raises(JsonRpcParseError):
+        find_payload(b'{"params": [1, "2]}')
+
+
+def test_find_payload_matches_json_module():
+    rows = [{"s": 'a\\"[{', "n": [1, 2.5, None], "o": {"t": True}}] * 50
+    for params in (rows, {"rows": rows}, [], {}, [[[]]]):
+        for extra in ("", ', "meta": {"a": [1]}', ', "meta": "]"'):
+            data = (
+                '{"jsonrpc": "2.0", "params": %s%s, "id": 7}'
+                % (json.dumps(params), extra)
+            ).encode()
+            _, raw = payload(data)
+            assert json.loads(raw) == params
@@ -1,9 +1,14 @@
+import copy
+import pickle
+
 import pytest
 
 from sansio_jsonrpc import (
     JsonRpcApplicationError,
     JsonRpcError,
     JsonRpcException,
+    JsonRpcInternalError,
+    JsonRpcInvalidParamsError,
     JsonRpcParseError,
     JsonRpcReservedError,
 )
@@ -124,3 +129,76 @@ def test_application_error_must_use_unreserved_code():
         class MyAppError(JsonRpcApplicationError):
             ERROR_CODE = -32768
             ERROR_MESSAGE = "Default message"
+
+
+def test_error_codes_are_unique():
+    assert JsonRpcInternalError.ERROR_CODE == -32603
+    assert JsonRpcInvalidParamsError.ERROR_CODE == -32602
+    err = JsonRpcError(code=-32603, message="Internal error")
+    assert type(JsonRpcException.exc_from_error(err)) is JsonRpcInternalError
+
+    with pytest.raises(RuntimeError):
+
+        class MyParseError(JsonRpcReservedError):
+            ERROR_CODE = -32700
+
+    # A subclass that inherits its code does not take over the code.
+    class DetailedParseError(JsonRpcParseError):
+        pass
+
+    err = JsonRpcError(code=-32700, message="Parse error")
+    assert type(JsonRpcException.exc_from_error(err)) is JsonRpcParseError
+
+
+def test_redefined_error_class_replaces_registration():
+    classes = []
+    for _ in range(2):
+
+        class MyRedefinedError(JsonRpcApplicationError):
+            ERROR_CODE = 3
+
+        classes.append(MyRedefinedError)
+    err = JsonRpcError(code=3, message="Application error")
+    assert type(JsonRpcException.exc_from_error(err)) is classes[1]
+
+
+def test_exc_from_error_reuses_error():
+    err = JsonRpcError(code=-32700, message="Parse error", data={"foo": "bar"})
+    exc = JsonRpcException.exc_from_error(err)
+    assert exc.get_error() is err
+    assert exc.args == JsonRpcParseError("Parse error", {"foo": "bar"}).args
+
+    # The code of an unregistered application error is kept.
+    err = JsonRpcError(code=12345, message="Application error")
+    exc = JsonRpcException.exc_from_error(err)
+    assert type(exc) is JsonRpcApplicationError
+    assert exc.code == 12345
+    assert exc.args == ("Application error",)
+
+    # An empty message is replaced with the default message.
+    exc = JsonRpcException.exc_from_error(JsonRpcError(code=-32700, message=""))
+    assert exc.message == JsonRpcParseError.ERROR_MESSAGE
+
+
+def test_interned_errors():
+    error = JsonRpcParseError().get_error()
+    assert JsonRpcParseError().get_error() is error
+    assert JsonRpcParseError(JsonRpcParseError.ERROR_MESSAGE).get_error() is error
+    assert JsonRpcParseError("Invalid JSON format").get_error() is (
+        JsonRpcParseError.intern("Invalid JSON format")
+    )
+    assert (
+        JsonRpcParseError("Other").get_error()
+        is not JsonRpcParseError("Other").get_error()
+    )
+    assert JsonRpcParseError(data={"foo": "bar"}).get_error() is not error
+
+    plain = JsonRpcError(code=-32700, message=JsonRpcParseError.ERROR_MESSAGE)
+    assert error == plain and plain == error
+    assert error != JsonRpcError(code=-32700, message="Other")
+    assert repr(error) == repr(plain)
+    with pytest.raises(AttributeError):
+        error.message = "Other"
+    for copied in (copy.copy(error), pickle.loads(pickle.dumps(error))):
+        assert type(copied) is JsonRpcError
+        assert copied == error
@@ -0,0 +1,182 @@
+import pytest
+
+from sansio_jsonrpc import (
+    ConcatenatedJsonFramer,
+    ContentLengthFramer,
+    JsonRpcInvalidRequestError,
+    JsonRpcParseError,
+    NewlineFramer,
+)
+
+
+def drain(framer):
+    """ A helper that returns all complete frames in a framer's buffer. """
+    frames = []
+    frame = framer.next_frame()
+    while frame is not None:
+        frames.append(frame)
+        frame = framer.next_frame()
+    return frames
+
+
+def feed_bytewise(framer, data):
+    """ A helper that feeds data one byte at a time and collects frames. """
+    frames = []
+    for i in range(len(data)):
+        framer.feed(data[i : i + 1])
+        frames.extend(drain(framer))
+    return frames
+
+
+def test_newline_framer():
+    framer = NewlineFramer()
+    framer.feed(b'{"a": 1}\n{"b": 2}\r\n\n{"c"')
+    assert drain(framer) == [b'{"a": 1}', b'{"b": 2}']
+    assert framer.buffered == 4
+    framer.feed(memoryview(b": 3}\n"))
+    assert drain(framer) == [b'{"c": 3}']
+    assert framer.buffered == 0
+
+
+def test_newline_framer_bytewise():
+    data = b'{"a": 1}\n{"b": 2}\n'
+    assert feed_bytewise(NewlineFramer(), data) == [b'{"a": 1}', b'{"b": 2}']
+
+
+def test_newline_framer_frame():
+    assert NewlineFramer().frame(b"{}") == b"{}\n"
+
+
+def test_content_length_framer():
+    framer = ContentLengthFramer()
+    framer.feed(
+        b"Content-Length: 8\r\n\r\n"
+        b'{"a": 1}'
+        b"content-type: application/json\r\ncontent-length:8\r\n\r\n"
+        b'{"b": 2}'
+        b"Content-Length: 8\r\n\r\n"
+        b'{"c"'
+    )
+    assert drain(framer) == [b'{"a": 1}', b'{"b": 2}']
+    framer.feed(bytearray(b": 3}"))
+    assert drain(framer) == [b'{"c": 3}']
+    assert framer.buffered == 0
+
+
+def test_content_length_framer_bytewise():
+    framer = ContentLengthFramer()
+    data = framer.frame(b'{"a": "\r\n\r\n"}') + framer.frame(b"[]")
+    assert feed_bytewise(framer, data) == [b'{"a": "\r\n\r\n"}', b"[]"]
+
+
+def test_content_length_framer_missing_header():
+    framer = ContentLengthFramer()
+    framer.feed(b"Content-Type: foo\r\n\r\nContent-Length: 2\r\n\r\n{}")
+    with pytest.raises(JsonRpcParseError):
+        framer.next_frame()
+    # The bad header block is discarded and the stream resumes after it.
+    assert drain(framer) == [b"{}"]
+
+
+def test_concatenated_framer():
+    framer = ConcatenatedJsonFramer()
+    framer.feed(b' {"a": "}{\\"]"} [{"b": [1, 2]}]\n{"c": ')
+    assert drain(framer) == [b'{"a": "}{\\"]"}', b'[{"b": [1, 2]}]']
+    framer.feed(b"3}")
+    assert drain(framer) == [b'{"c": 3}']
+    assert framer.buffered == 0
+
+
+def test_concatenated_framer_bytewise():
+    data = b'{"a": "\\\\"}{"b": "\\"}"}[]'
+    assert feed_bytewise(ConcatenatedJsonFramer(), data) == [
+        b'{"a": "\\\\"}',
+        b'{"b": "\\"}"}',
+        b"[]",
+    ]
+
+
+def test_concatenated_framer_rejects_scalar():
+    framer = ConcatenatedJsonFramer()
+    framer.feed(b'{"a": 1} 42 {"b": 2}')
+    assert framer.next_frame() == b'{"a": 1}'
+    with pytest.raises(JsonRpcParseError):
+        framer.next_frame()
+    assert framer.buffered == 0
+
+
+def test_framer_does_not_rescan():
+    """ Each byte is scanned once, even when a frame arrives in many chunks. """
+    framer = NewlineFramer()
+    for _ in range(1000):
+        framer.feed(b"x" * 10)
+        assert framer.next_frame() is None
+        assert framer._scan == len(framer._buffer)
+    framer.feed(b"\n")
+    assert framer.next_frame() == b"x" * 10000
+
+
+def test_newline_framer_max_frame_bytes():
+    framer = NewlineFramer(max_frame_bytes=4)
+    framer.feed(b"[1]\n[1, 2]\n[2]\n")
+    assert framer.next_frame() == b"[1]"
+    with pytest.raises(JsonRpcInvalidRequestError):
+        framer.next_frame()
+    assert drain(framer) == [b"[2]"]
+
+
+def test_newline_framer_max_frame_bytes_partial():
+    """ An oversized line is rejected before it ends, and then skipped. """
+    framer = NewlineFramer(max_frame_bytes=4)
+    framer.feed(b"[1, 2")
+    with pytest.raises(JsonRpcInvalidRequestError):
+        framer.next_frame()
+    assert framer.buffered == 0
+    framer.feed(b", 3]\n[3]\n")
+    assert drain(framer) == [b"[3]"]
+
+
+def test_content_length_framer_max_frame_bytes():
+    framer = ContentLengthFramer(max_frame_bytes=4)
+    framer.feed(b"Content-Length: 6\r\n\r\n[1, 2")
+    with pytest.raises(JsonRpcInvalidRequestError):
+        framer.next_frame()
+    # The oversized body is skipped as it arrives.
+    assert framer.next_frame() is None
+    framer.feed(b"]\r\nContent-Length: 3\r\n\r\n[3]")
+    assert drain(framer) == [b"[3]"]
+
+
+def test_content_length_framer_max_frame_bytes_header():
+    framer = ContentLengthFramer(max_frame_bytes=4)
+    framer.feed(b"X" * 1000)
+    with pytest.raises(JsonRpcInvalidRequestError):
+        framer.next_frame()
+    assert framer.buffered == 0
+
+
+def test_concatenated_framer_max_frame_bytes():
+    framer = ConcatenatedJsonFramer(max_frame_bytes=4)
+    framer.feed(b"[1][1, 2][2]")
+    assert framer.next_frame() == b"[1]"
+    with pytest.raises(JsonRpcInvalidRequestError):
+        framer.next_frame()
+    assert drain(framer) == [b"[2]"]
+    # An incomplete frame cannot be skipped, so the whole buffer is discarded.
+    framer.feed(b"[1, 2, 3")
+    with pytest.raises(JsonRpcInvalidRequestError):
+        framer.next_frame()
+    assert framer.buffered == 0
+
+
+@pytest.mark.parametrize(
+    "framer", [NewlineFramer(), ContentLengthFramer(), ConcatenatedJsonFramer()]
+)
+def test_frame_chunks_and_frame_into(framer):
+    data = b'{"id": 1}'
+    chunks = framer.frame_chunks(data)
+    assert any(chunk is data for chunk in chunks)
+    assert b"".join(chunks) == framer.frame(data)
+    buffer = bytearray(b"before")
+    framer.frame_into(buffer, data)
+    assert buffer == b"before" + framer.frame(data)
@@ -0,0 +1,121 @@
+import json
+
+import pytest
+
+from sansio_jsonrpc import (
+    JsonRpcInvalidRequestError,
+    JsonRpcParseError,
+    JsonRpcPeer,
+    Limits,
+)
+
+
+def nested(depth):
+    """ A helper that encodes a request whose params are nested ``depth`` levels. """
+    params = 0
+    for _ in range(depth - 1):
+        params = [params]
+    return json.dumps({"jsonrpc": "2.0", "id": 1, "method": "a", "params": params})
+
+
+def test_unlimited():
+    Limits().check(nested(500).encode("ascii"))
+
+
+def test_max_frame_bytes():
+    limits = Limits(max_frame_bytes=10)
+    limits.check(b"0123456789")
+    with pytest.raises(JsonRpcInvalidRequestError):
+        limits.check(b"0123456789a")
+
+
+@pytest.mark.parametrize("depth", [1, 2, 5, 6])
+def test_max_depth(depth):
+    # The message object is one level and the params add the rest.
+    Limits(max_depth=depth + 1).check(nested(depth + 1).encode("ascii"))
+    with pytest.raises(JsonRpcInvalidRequestError):
+        Limits(max_depth=depth).check(nested(depth + 1).encode("ascii"))
+
+
+def test_max_depth_ignores_brackets_in_strings():
+    data = b'{"a": "[[[[[[[[\\"{{{{{{", "b": [[{"c": "]]]]"}]]}'
+    Limits(max_depth=4).check(data)
+    with pytest.raises(JsonRpcInvalidRequestError):
+        Limits(max_depth=3).check(data)
+
+
+def test_max_depth_sibling_containers():
+    data = b'{"a": [[1], [2], {"b": [3]}], "c": {"d": [[4]]}}'
+    Limits(max_depth=4).check(data)
+    with pytest.raises(JsonRpcInvalidRequestError):
+        Limits(max_depth=3).check(data)
+
+
+def test_max_depth_unmatched_brackets():
+    with pytest.raises(JsonRpcParseError):
+        Limits(max_depth=2).check(b"[]][[]][[]")
+    with pytest.raises(JsonRpcParseError):
+        Limits(max_depth=2).check(b"][][][][")
+    # An unterminated stack of brackets is too deep even before it is unterminated.
+    with pytest.raises(JsonRpcInvalidRequestError):
+        Limits(max_depth=2).check(b"[[[[[[[[[[")
+
+
+def test_max_string_length():
+    limits = Limits(max_string_length=5)
+    limits.check(b'{"abcde": "vwxyz", "n": 1234567890}')
+    # Each escape sequence counts as one character.
+    limits.check(b'{"a": "\\"\\"\\u0041", "b": "wxyz\\\\"}')
+    with pytest.raises(JsonRpcInvalidRequestError):
+        limits.check(b'{"abcdef": 1}')
+    with pytest.raises(JsonRpcInvalidRequestError):
+        limits.check(b'{"a": 1, "b": "uvwxyz", "c": 2}')
+    with pytest.raises(JsonRpcInvalidRequestError):
+        limits.check(b'{"a": "\\"\\"\\"\\u0041\\t\\""}')
+
+
+def test_max_string_length_unterminated():
+    with pytest.raises(JsonRpcInvalidRequestError):
+        Limits(max_string_length=5).check(b'{"a": "uvwxyz')
+    # A short unterminated string is left for the decoder to reject.
+    Limits(max_string_length=5).check(b'{"a": 12345678, "b": "xy')
+
+
+def test_peer_limits():
+    peer = JsonRpcPeer(limits=Limits(max_frame_bytes=100, max_depth=3))
+    assert peer.framer._max_frame_bytes == 100
+    messages = peer.parse(nested(3).encode("ascii"))
+    assert messages[0].params == [[0]]
+    with pytest.raises(JsonRpcInvalidRequestError):
+        peer.parse(nested(4).encode("ascii"))
+    with pytest.raises(JsonRpcInvalidRequestError):
+        peer.parse(json.dumps({"method": "a", "params": ["x" * 100]}).encode("ascii"))
+
+
+def test_peer_max_frame_bytes_same_error():
+    """ A message that is too large gets the same error from the framer and parse(). """
+    peer = JsonRpcPeer(limits=Limits(max_frame_bytes=100))
+    data = nested(50).encode("ascii")
+    with pytest.raises(JsonRpcInvalidRequestError) as parse_info:
+        peer.parse(data)
+    with pytest.raises(JsonRpcInvalidRequestError) as feed_info:
+        list(peer.feed(data))
+    assert feed_info.value.get_error() == parse_info.value.get_error()
+
+
+def test_peer_max_batch_length():
+    peer = JsonRpcPeer(limits=Limits(max_batch_length=2))
+    request = b'{"jsonrpc": "2.0", "method": "a"}'
+    assert len(peer.parse(b"[%s, %s]" % (request, request))) == 2
+    with pytest.raises(JsonRpcInvalidRequestError):
+        peer.parse(b"[%s, %s, %s]" % (request, request, request))
+
+
+def test_peer_limits_parse_many():
+    peer = JsonRpcPeer(limits=Limits(max_depth=2))
+    frames = [nested(2).encode("ascii"), nested(3).encode("ascii")]
+    messages, errors = peer.parse_many(frames)
+    assert messages[0][0].params == [0]
+    assert messages[1] is None
+    assert errors[0] is None
+    assert json.loads(errors[1])["error"]["code"] == -32600
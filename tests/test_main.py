@@ -1,9 +1,12 @@
+import gc
 import json
 from unittest.mock import Mock
 
 import pytest
 
 from sansio_jsonrpc import *
+from sansio_jsonrpc.codec import OrjsonCodec, StdlibJsonCodec, orjson
+from sansio_jsonrpc.exc import JsonRpcErrorMeta
 
 
 def parse_bytes(b):
@@ -117,8 +120,10 @@ def test_response_result_xor_error():
             error=JsonRpcError(code=-32700, message="An error occurred"),
         )
 
-    with pytest.raises(Exception):
-        resp = JsonRpcResponse(id=0)
+    # Without an error, the response is a success whose result is null.
+    resp = JsonRpcResponse(id=0)
+    assert resp.success
+    assert resp.to_json_dict() == {"id": 0, "jsonrpc": "2.0", "result": None}
 
 
 def test_invalid_response():
@@ -256,6 +261,64 @@ def test_server_handle_invalid_message():
         messages = server.parse(b'{"id": 0, "jsonrpc": "2.0"}')
 
 
+def test_server_handle_missing_jsonrpc():
+    server = JsonRpcPeer(request_handler=lambda request: 1)
+    with pytest.raises(JsonRpcInvalidRequestError):
+        server.parse(b'{"id": 1, "method": "x"}')
+    assert parse_bytes(server.handle(b'{"id": 1, "method": "x"}')) == {
+        "id": None,
+        "error": {"code": -32600, "message": '`jsonrpc` must be "2.0".'},
+        "jsonrpc": "2.0",
+    }
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+@pytest.mark.parametrize(
+    "data",
+    [
+        b'{"jsonrpc": "2.0", "result": 1}',
+        b'{"jsonrpc": "2.0", "id": 1, "error": 5}',
+        b'{"jsonrpc": "2.0", "id": 1, "error": {"code": 1}}',
+    ],
+)
+def test_parse_invalid_message(data, lazy):
+    """ Valid JSON with missing or mistyped members is an invalid request. """
+    peer = JsonRpcPeer(request_handler=lambda request: 1, lazy=lazy)
+    with pytest.raises(JsonRpcInvalidRequestError):
+        peer.parse(data)
+    with pytest.raises(JsonRpcInvalidRequestError):
+        list(peer.feed(data))
+    expected = JsonRpcInvalidRequestError().get_error().to_json_dict()
+    assert parse_bytes(peer.handle(data)) == {
+        "id": None,
+        "error": expected,
+        "jsonrpc": "2.0",
+    }
+
+
+def test_server_handle_null_result():
+    server = JsonRpcPeer(request_handler=lambda request: None)
+    response = server.handle(b'{"jsonrpc": "2.0", "id": 1, "method": "x"}')
+    assert parse_bytes(response) == {
+        "id": 1,
+        "result": None,
+        "jsonrpc": "2.0",
+    }
+    response = server.handle(
+        b'[{"jsonrpc": "2.0", "id": 1, "method": "x"},'
+        b'{"jsonrpc": "2.0", "method": "x"},'
+        b'{"jsonrpc": "2.0", "id": 2, "method": "x"}]'
+    )
+    assert parse_bytes(response) == [
+        {"id": 1, "result": None, "jsonrpc": "2.0"},
+        {"id": 2, "result": None, "jsonrpc": "2.0"},
+    ]
+    # The client accepts the null result as a success.
+    (resp,) = JsonRpcPeer().parse(b'{"jsonrpc": "2.0", "id": 1, "result": null}')
+    assert resp.success
+    assert resp.result is None
+
+
 def test_server_json_parse_error():
     server = JsonRpcPeer()
 
@@ -280,3 +343,439 @@ def test_server_json_parse_error():
         "error": {"code": -32700, "message": "Invalid JSON format"},
         "jsonrpc": "2.0",
     }
+
+
+def test_feed_partial_and_concatenated():
+    peer = JsonRpcPeer()
+    assert list(peer.feed(b'{"id": 0, "result": 1, "json')) == []
+    messages = list(
+        peer.feed(b'rpc": "2.0"}{"id": 1, "method": "foo", "jsonrpc": "2.0"}{"id"')
+    )
+    assert len(messages) == 2
+    assert isinstance(messages[0], JsonRpcResponse)
+    assert messages[0].result == 1
+    assert isinstance(messages[1], JsonRpcRequest)
+    assert messages[1].method == "foo"
+    messages = list(peer.feed(memoryview(b': 2, "result": 2, "jsonrpc": "2.0"}')))
+    assert len(messages) == 1
+    assert messages[0].id == 2
+
+
+def test_feed_with_framer():
+    peer = JsonRpcPeer(framer=ContentLengthFramer())
+    req_id, bytes_to_send = peer.request(method="hello_world")
+    framed = peer.framer.frame(bytes_to_send)
+    messages = list(peer.feed(framed + framed[:10]))
+    assert len(messages) == 1
+    assert messages[0].method == "hello_world"
+    messages = list(peer.feed(framed[10:]))
+    assert len(messages) == 1
+
+
+def test_feed_resumes_after_parse_error():
+    peer = JsonRpcPeer(framer=NewlineFramer())
+    messages = peer.feed(
+        b'{"id": 0, "result": 1, "jsonrpc": "2.0"}\n'
+        b"{nope}\n"
+        b'{"id": 1, "result": 1, "jsonrpc": "2.0"}\n'
+    )
+    assert next(messages).id == 0
+    with pytest.raises(JsonRpcParseError):
+        next(messages)
+    assert [m.id for m in peer.feed(b"")] == [1]
+
+
+def test_feed_frames_keeps_batches_together():
+    peer = JsonRpcPeer(framer=NewlineFramer())
+    frames = list(
+        peer.feed_frames(
+            b'[{"id": 0, "result": 1, "jsonrpc": "2.0"},'
+            b'{"id": 1, "result": 2, "jsonrpc": "2.0"}]\n'
+            b'{"id": 2, "result": 3, "jsonrpc": "2.0"}\n'
+        )
+    )
+    assert len(frames) == 2
+    assert isinstance(frames[0], JsonRpcBatch)
+    assert [m.id for m in frames[0]] == [0, 1]
+    assert [m.id for m in frames[1]] == [2]
+
+
+def test_client_request_batch():
+    client = JsonRpcPeer()
+    batch = client.request_batch()
+    id1 = batch.request(method="foo", params=[1, 2])
+    batch.notify(method="bar")
+    id2 = batch.request(method="baz")
+    assert len(batch) == 3
+    assert id1 != id2
+    assert parse_bytes(batch.encode()) == [
+        {"jsonrpc": "2.0", "id": id1, "method": "foo", "params": [1, 2]},
+        {"jsonrpc": "2.0", "method": "bar"},
+        {"jsonrpc": "2.0", "id": id2, "method": "baz"},
+    ]
+
+
+def test_client_request_batch_empty():
+    client = JsonRpcPeer()
+    with pytest.raises(RuntimeError):
+        client.request_batch().encode()
+
+
+def test_client_parse_batch_responses():
+    client = JsonRpcPeer()
+    messages = client.parse(
+        b'[{"id": 0, "result": 1, "jsonrpc": "2.0"},'
+        b'{"id": 1, "error": {"code": -32601, "message": "Nope"}, "jsonrpc": "2.0"}]'
+    )
+    assert isinstance(messages, JsonRpcBatch)
+    assert [m.id for m in messages] == [0, 1]
+    assert messages[0].result == 1
+    assert messages[1].error.code == -32601
+    assert messages.errors == []
+
+
+def test_server_handle_batch():
+    server = JsonRpcPeer()
+    messages = server.parse(
+        b'[{"id": 0, "method": "foo", "jsonrpc": "2.0"},'
+        b'{"method": "notify", "jsonrpc": "2.0"},'
+        b'1,'
+        b'{"id": 1, "method": "bar", "jsonrpc": "2.0"}]'
+    )
+    assert isinstance(messages, JsonRpcBatch)
+    assert [m.method for m in messages] == ["foo", "notify", "bar"]
+    assert len(messages.errors) == 1
+
+    batch = server.response_batch(messages)
+    for req in messages:
+        if req.method == "bar":
+            batch.add_error(req, JsonRpcMethodNotFoundError().get_error())
+        else:
+            batch.add_result(req, req.method)
+    assert len(batch) == 3
+    assert parse_bytes(batch.encode()) == [
+        {
+            "jsonrpc": "2.0",
+            "id": None,
+            "error": {"code": -32600, "message": "Invalid batch element."},
+        },
+        {"jsonrpc": "2.0", "id": 0, "result": "foo"},
+        {
+            "jsonrpc": "2.0",
+            "id": 1,
+            "error": {
+                "code": -32601,
+                "message": "The method does not exist / is not available.",
+            },
+        },
+    ]
+
+
+def test_server_batch_of_notifications():
+    """ A batch that only contains notifications gets no response at all. """
+    server = JsonRpcPeer()
+    messages = server.parse(b'[{"method": "notify", "jsonrpc": "2.0"}]')
+    batch = server.response_batch(messages)
+    for req in messages:
+        batch.add_result(req, "ignored")
+    assert batch.encode() == b""
+
+
+def test_server_empty_batch():
+    server = JsonRpcPeer()
+    with pytest.raises(JsonRpcInvalidRequestError):
+        server.parse(b"[]")
+
+
+def test_server_parse_non_object():
+    server = JsonRpcPeer()
+    with pytest.raises(JsonRpcParseError):
+        server.parse(b"42")
+
+
+def test_messages_are_slotted():
+    req = JsonRpcRequest(id=0, method="hello_world")
+    resp = JsonRpcResponse(id=0, result=1)
+    err = JsonRpcError(code=1, message="foo")
+    for obj in (req, resp, err):
+        assert not hasattr(obj, "__dict__")
+        with pytest.raises(AttributeError):
+            obj.extra = 1
+    # Defaults and equality still behave like a regular dataclass.
+    assert req.jsonrpc == "2.0"
+    assert req == JsonRpcRequest(id=0, method="hello_world")
+
+
+def test_missing_id_singleton():
+    import pickle
+    from sansio_jsonrpc.main import MISSING_ID, MissingId
+
+    assert MissingId() is MISSING_ID
+    assert pickle.loads(pickle.dumps(MISSING_ID)) is MISSING_ID
+    req = JsonRpcRequest.from_json_dict({"jsonrpc": "2.0", "method": "foo"})
+    assert req.id is MISSING_ID
+    assert req.is_notification
+
+
+def test_client_request_still_validates_method():
+    client = JsonRpcPeer()
+    with pytest.raises(JsonRpcInvalidRequestError):
+        client.request(method=1)
+    with pytest.raises(JsonRpcInvalidRequestError):
+        client.notify(method="foo", params=1)
+
+
+def test_client_request_matches_validated_request():
+    client = JsonRpcPeer()
+    req_id, bytes_to_send = client.request(method="hello_world", params=[1])
+    (req,) = client.parse(bytes_to_send)
+    assert req == JsonRpcRequest(id=req_id, method="hello_world", params=[1])
+
+
+def test_lazy_parse_request():
+    peer = JsonRpcPeer(lazy=True)
+    data = b'{"jsonrpc": "2.0", "id": 3, "method": "rows", "params": {"a": [1, "}"]}}'
+    (req,) = peer.parse(data)
+    assert isinstance(req, LazyJsonRpcRequest)
+    assert req.id == 3
+    assert req.method == "rows"
+    assert req.raw_params == b'{"a": [1, "}"]}'
+    # The raw params are copied into the output as they were received.
+    assert peer.encode(req).endswith(b',"params":{"a": [1, "}"]}}')
+    assert parse_bytes(peer.encode(req))["params"] == {"a": [1, "}"]}
+    # Accessing the params decodes them once.
+    assert req.params == {"a": [1, "}"]}
+    assert req.raw_params is None
+    assert req.to_json_dict()["params"] == {"a": [1, "}"]}
+    req.params = [2]
+    assert parse_bytes(peer.encode(req))["params"] == [2]
+
+
+def test_lazy_parse_response():
+    peer = JsonRpcPeer(lazy=True)
+    data = b'{"id": 1, "result": [1, {"x": "\\"]"}], "jsonrpc": "2.0"}'
+    (resp,) = peer.parse(data)
+    assert isinstance(resp, LazyJsonRpcResponse)
+    assert resp.success
+    assert resp.raw_result == b'[1, {"x": "\\"]"}]'
+    assert parse_bytes(peer.encode(resp)) == {
+        "id": 1,
+        "jsonrpc": "2.0",
+        "result": [1, {"x": '"]'}],
+    }
+    assert resp.result == [1, {"x": '"]'}]
+
+
+def test_lazy_parse_falls_back_to_eager():
+    peer = JsonRpcPeer(lazy=True)
+    # Scalar results, error responses, and requests without params are not lazy.
+    (resp,) = peer.parse(b'{"jsonrpc": "2.0", "id": 1, "result": 5}')
+    assert type(resp) is JsonRpcResponse
+    (resp,) = peer.parse(
+        b'{"jsonrpc": "2.0", "id": 1, "error": {"code": -32601, "message": "x"}}'
+    )
+    assert type(resp) is JsonRpcResponse
+    (req,) = peer.parse(b'{"jsonrpc": "2.0", "id": 1, "method": "foo"}')
+    assert type(req) is JsonRpcRequest
+    batch = peer.parse(b'[{"jsonrpc": "2.0", "method": "foo", "params": [1]}]')
+    assert batch[0].params == [1]
+
+
+def test_lazy_parse_validates_envelope():
+    peer = JsonRpcPeer(lazy=True)
+    with pytest.raises(JsonRpcInvalidRequestError):
+        peer.parse(b'{"jsonrpc": "1.0", "id": 1, "method": "foo", "params": [1]}')
+    with pytest.raises(JsonRpcParseError):
+        peer.parse(b'{"jsonrpc": "2.0", "id": 1, "method": "foo", "params": [1}')
+    with pytest.raises(JsonRpcParseError):
+        peer.parse(b'{"jsonrpc": "2.0", "id": 1, "method": "foo", "params": [1, "]')
+    # Invalid JSON inside the params is only detected when they are decoded.
+    (req,) = peer.parse(b'{"jsonrpc": "2.0", "id": 1, "method": "f", "params": [1,]}')
+    with pytest.raises(JsonRpcParseError):
+        req.params
+
+
+def test_lazy_handle():
+    def handler(request):
+        return sum(request.params)
+
+    server = JsonRpcPeer(request_handler=handler, lazy=True)
+    response = server.handle(
+        b'{"jsonrpc": "2.0", "id": 1, "method": "sum", "params": [1, 2]}'
+    )
+    assert parse_bytes(response) == {"jsonrpc": "2.0", "id": 1, "result": 3}
+
+
+def test_parse_many():
+    peer = JsonRpcPeer()
+    frames = [
+        b'{"jsonrpc": "2.0", "id": 1, "method": "foo"}',
+        b'{"jsonrpc": "2.0", "id": 2, "method": ',
+        b'[{"jsonrpc": "2.0", "method": "bar"}, 1]',
+        b'{"jsonrpc": "2.0", "id": 1, "result": true}',
+        b'{"jsonrpc": "2.0", "id": 3, "method": ',
+        b'{"id": 4, "method": "baz"}',
+        b'{"jsonrpc": "2.0", "id": 5}',
+    ]
+    messages, errors = peer.parse_many(iter(frames))
+    assert len(messages) == len(errors) == len(frames)
+
+    assert messages[0] == (JsonRpcRequest(id=1, method="foo"),)
+    assert errors[0] is None
+    assert isinstance(messages[2], JsonRpcBatch)
+    assert len(messages[2]) == 1
+    assert len(messages[2].errors) == 1
+    assert messages[3] == (JsonRpcResponse(id=1, result=True),)
+
+    assert messages[1] is None
+    assert parse_bytes(errors[1]) == {
+        "jsonrpc": "2.0",
+        "id": None,
+        "error": {"code": -32700, "message": "Invalid JSON format"},
+    }
+    # Identical errors share the same encoded response.
+    assert errors[4] is errors[1]
+    assert parse_bytes(errors[5])["error"]["code"] == -32600
+    assert parse_bytes(errors[6])["error"]["code"] == -32700
+
+
+def test_parse_many_deeply_nested():
+    # The stdlib decoder recurses for each level of nesting.
+    peer = JsonRpcPeer(codec=StdlibJsonCodec())
+    frames = [
+        b'{"jsonrpc": "2.0", "id": 1, "method": "foo"}',
+        b'{"jsonrpc": "2.0", "id": 2, "method": "foo", "params": '
+        + b"[" * 100_000
+        + b"]" * 100_000
+        + b"}",
+        b'{"jsonrpc": "2.0", "id": 3, "method": "foo"}',
+    ]
+    messages, errors = peer.parse_many(frames)
+    assert messages[0] == (JsonRpcRequest(id=1, method="foo"),)
+    assert messages[1] is None
+    assert parse_bytes(errors[1])["error"]["code"] == -32700
+    assert messages[2] == (JsonRpcRequest(id=3, method="foo"),)
+    assert errors[0] is errors[2] is None
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        {"jsonrpc": "2.0", "id": 1, "method": "foo", "params": [1]},
+        {"jsonrpc": "2.0", "id": "a", "method": "foo", "params": None},
+        {"jsonrpc": "2.0", "method": "foo", "params": {"a": 1}},
+        {"jsonrpc": "2.0", "id": 1.0, "method": "foo"},
+        {"jsonrpc": "2.0", "id": 1, "method": "foo", "params": 1},
+        {"jsonrpc": "2.0", "id": True, "method": "foo"},
+        {"jsonrpc": "2.0", "id": 1, "method": 1},
+        {"jsonrpc": "1.0", "id": 1, "method": "foo"},
+        {"id": 1, "method": "foo"},
+        {"jsonrpc": "2.0", "id": 1, "result": [1]},
+        {"jsonrpc": "2.0", "id": None, "result": 1},
+        {"jsonrpc": "2.0", "result": 1},
+        {"jsonrpc": "2.0", "id": 1, "result": None},
+        {"jsonrpc": "2.0", "id": 1, "result": 1, "error": {"code": 1, "message": "x"}},
+        {"jsonrpc": "2.0", "id": 1, "method": "foo", "result": 1},
+    ],
+)
+def test_parse_fast_path_matches_validation(message):
+    """ Messages parsed by the fast path are exactly those the classes accept. """
+    peer = JsonRpcPeer()
+    cls = JsonRpcRequest if "method" in message else JsonRpcResponse
+    try:
+        expected = cls.from_json_dict(message)
+    except JsonRpcException as exc:
+        with pytest.raises(type(exc)):
+            peer.parse(json.dumps(message).encode())
+    except KeyError:
+        with pytest.raises(JsonRpcInvalidRequestError):
+            peer.parse(json.dumps(message).encode())
+    else:
+        assert peer.parse(json.dumps(message).encode()) == (expected,)
+
+
+def test_output_chunks():
+    peer = JsonRpcPeer(framer=NewlineFramer())
+    output = peer.output()
+    request_id = output.request("foo", [1])
+    output.notify("bar")
+    output.respond_with_result(JsonRpcRequest(id=5, method="baz"), 1)
+    output.respond_with_error(None, JsonRpcParseError().get_error())
+    assert len(output.chunks) == 8
+    data = b"".join(output.chunks)
+    assert len(output) == len(data)
+    messages = list(JsonRpcPeer(framer=NewlineFramer()).feed(data))
+    assert [m.id for m in messages][::2] == [request_id, 5]
+    assert messages[1].is_notification and messages[3].id is None
+    output.clear()
+    assert output.chunks == [] and len(output) == 0
+
+
+def test_output_into_buffer():
+    peer = JsonRpcPeer(framer=ContentLengthFramer())
+    buffer = bytearray()
+    output = peer.output(buffer)
+    output.notify("bar")
+    output.add(peer.notify("baz"))
+    assert output.buffer is buffer
+    assert len(output) == len(buffer)
+    assert output.chunks == []
+    messages = list(JsonRpcPeer(framer=ContentLengthFramer()).feed(buffer))
+    assert [m.method for m in messages] == ["bar", "baz"]
+    output.clear()
+    assert buffer == b""
+
+
+class SortedCodec(StdlibJsonCodec):
+    """ A codec whose output cannot be split around the ID. """
+
+    def encode(self, obj):
+        return json.dumps(obj, sort_keys=True).encode("utf8")
+
+
+@pytest.mark.parametrize("codec_cls", [StdlibJsonCodec, OrjsonCodec, SortedCodec])
+def test_respond_with_interned_error(codec_cls):
+    if codec_cls is OrjsonCodec and orjson is None:
+        pytest.skip("orjson is not installed")
+    peer = JsonRpcPeer(codec=codec_cls())
+    interned = JsonRpcMethodNotFoundError().get_error()
+    plain = JsonRpcError(interned.code, interned.message)
+    for id_ in (0, 12345, "abc", "é\"", None):
+        request = None if id_ is None else JsonRpcRequest(id=id_, method="foo")
+        assert peer.respond_with_error(request, interned) == peer.respond_with_error(
+            request, plain
+        )
+    assert len(peer._error_templates) == 1
+
+
+def test_respond_with_error_to_notification():
+    from sansio_jsonrpc.main import MISSING_ID
+
+    peer = JsonRpcPeer()
+    notification = JsonRpcRequest(id=MISSING_ID, method="foo")
+    interned = JsonRpcMethodNotFoundError().get_error()
+    plain = JsonRpcError(interned.code, interned.message)
+    for error in (interned, plain):
+        with pytest.raises(JsonRpcInternalError):
+            peer.respond_with_error(notification, error)
+
+
+def test_respond_with_interned_error_after_free():
+    """ A cached encoding is not reused for a later error that gets the same id(). """
+    peer = JsonRpcPeer()
+    request = JsonRpcRequest(id=1, method="foo")
+    try:
+        for i in range(50):
+            # Defining the class again replaces the earlier class, which is then freed
+            # along with its interned error.
+            class TemporaryError(JsonRpcReservedError):
+                ERROR_CODE = -32099
+                ERROR_MESSAGE = f"Temporary error {i}"
+
+            error = TemporaryError().get_error()
+            response = parse_bytes(peer.respond_with_error(request, error))
+            assert response["error"]["message"] == f"Temporary error {i}"
+            del TemporaryError, error
+            gc.collect()
+    finally:
+        del JsonRpcErrorMeta._error_classes[-32099]
@@ -0,0 +1,215 @@
+"""
+Memory budgets for the operations that a long-lived peer repeats for every message.
+
+Each budget test checks the most memory that one call allocates at a time, and each
+leak test checks that a request/response cycle leaves nothing behind after many
+repetitions. The number of cycles defaults to a quick run, and can be raised with the
+``SANSIO_JSONRPC_MEMORY_CYCLES`` environment variable, e.g. to a million with ``make
+memtest``. When a budget is exceeded, the failure lists the top allocation sites.
+"""
+import gc
+import os
+import sys
+import tracemalloc
+
+import pytest
+
+from sansio_jsonrpc import (
+    JsonRpcDispatcher,
+    JsonRpcException,
+    JsonRpcInvalidParamsError,
+    JsonRpcPeer,
+    PeerMetrics,
+    PendingRequests,
+    RequestTracer,
+)
+from sansio_jsonrpc.codec import OrjsonCodec, StdlibJsonCodec, orjson
+
+
+CODECS = [StdlibJsonCodec]
+if orjson is not None:
+    CODECS.append(OrjsonCodec)
+
+MEMORY_CYCLES = int(os.environ.get("SANSIO_JSONRPC_MEMORY_CYCLES", "3000"))
+# Enough cycles to fill every bounded cache, e.g. the recently completed request IDs.
+# The caches can still replace their contents during the measured cycles, so they are
+# kept small to stay well within the leak budget.
+WARMUP_CYCLES = 2_000
+RECENT_LIMIT = 100
+# The most memory that one operation on a small message may allocate at a time.
+OPERATION_BUDGET = 4 * 1024
+# The most memory that all of the measured cycles together may leave behind.
+LEAK_BUDGET = 64 * 1024
+
+requires_reset_peak = pytest.mark.skipif(
+    sys.version_info < (3, 9), reason="tracemalloc.reset_peak() requires Python 3.9"
+)
+
+
+def make_dispatcher():
+    dispatcher = JsonRpcDispatcher()
+
+    @dispatcher.register
+    def add(a, b):
+        return a + b
+
+    @dispatcher.register
+    def fail():
+        raise JsonRpcInvalidParamsError("Always fails.")
+
+    return dispatcher
+
+
+def report(snapshot, limit=10):
+    """ Format the sites that hold the most memory in a snapshot. """
+    snapshot = snapshot.filter_traces(
+        (tracemalloc.Filter(False, tracemalloc.__file__),)
+    )
+    stats = snapshot.statistics("lineno")
+    lines = [
+        f"{stat.size:>10,} B {stat.count:>6} blocks  {stat.traceback}"
+        for stat in stats[:limit]
+    ]
+    return "\n".join(["Top allocation sites:"] + lines)
+
+
+def check_operation(operation, budget=OPERATION_BUDGET):
+    """ Assert that no call to an operation allocates more than a budget at a time. """
+    for _ in range(100):
+        operation()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        peak = 0
+        for _ in range(100):
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            operation()
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - current)
+        if peak > budget:
+            # Show what one call allocates, by keeping its result alive.
+            tracemalloc.clear_traces()
+            result = operation()  # noqa: F841
+            pytest.fail(
+                f"One call allocated {peak:,} bytes, over the budget of {budget:,} "
+                f"bytes.\n{report(tracemalloc.take_snapshot())}"
+            )
+    finally:
+        tracemalloc.stop()
+
+
+def check_cycles(cycle, budget=LEAK_BUDGET):
+    """ Assert that repeating a cycle does not keep more than a budget of memory. """
+    for _ in range(WARMUP_CYCLES):
+        cycle()
+    gc.collect()
+    # Only allocations made after this point are traced, so whatever is still traced
+    # at the end was allocated by the cycles and is still alive.
+    tracemalloc.start()
+    try:
+        for _ in range(MEMORY_CYCLES):
+            cycle()
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0]
+        if retained > budget:
+            pytest.fail(
+                f"{MEMORY_CYCLES:,} cycles kept {retained:,} bytes, over the budget "
+                f"of {budget:,} bytes.\n{report(tracemalloc.take_snapshot())}"
+            )
+    finally:
+        tracemalloc.stop()
+
+
+@requires_reset_peak
+@pytest.mark.parametrize("codec_cls", CODECS)
+def test_operation_budgets(codec_cls):
+    client = JsonRpcPeer(codec=codec_cls())
+    server = JsonRpcPeer(make_dispatcher(), codec=codec_cls())
+    _, request_bytes = client.request("add", [1, 2])
+    (request,) = server.parse(request_bytes)
+    error = JsonRpcInvalidParamsError().get_error()
+    error_bytes = server.respond_with_error(request, error)
+    (error_response,) = client.parse(error_bytes)
+
+    check_operation(lambda: client.request("add", [1, 2]))
+    check_operation(lambda: server.parse(request_bytes))
+    check_operation(lambda: server.respond_with_result(request, 3))
+    check_operation(lambda: server.respond_with_error(request, error))
+    check_operation(lambda: server.handle(request_bytes))
+    check_operation(lambda: client.parse(error_bytes))
+    check_operation(lambda: JsonRpcException.exc_from_error(error_response.error))
+
+
+def test_budget_failure_report():
+    leaked = []
+    with pytest.raises(pytest.fail.Exception) as exc_info:
+        check_cycles(lambda: leaked.append(bytearray(1024)), budget=1024)
+    assert "Top allocation sites:" in str(exc_info.value)
+    assert "test_memory.py" in str(exc_info.value)
+
+
+def test_request_response_cycles():
+    pending = PendingRequests(recent_limit=RECENT_LIMIT)
+    client = JsonRpcPeer(pending=pending)
+    server = JsonRpcPeer(make_dispatcher())
+
+    def cycle():
+        _, data = client.request("add", [1, 2])
+        (response,) = client.parse(server.handle(data))
+        assert pending.match(response) is not None
+
+    check_cycles(cycle)
+    assert len(pending) == 0
+
+
+def test_error_cycles():
+    pending = PendingRequests(recent_limit=RECENT_LIMIT)
+    client = JsonRpcPeer(pending=pending)
+    server = JsonRpcPeer(make_dispatcher())
+
+    def cycle():
+        for method in ("fail", "missing"):
+            _, data = client.request(method)
+            (response,) = client.parse(server.handle(data))
+            assert pending.match(response) is not None
+            assert isinstance(
+                JsonRpcException.exc_from_error(response.error), JsonRpcException
+            )
+        (response,) = client.parse(server.handle(b'{"jsonrpc": "2.0", "id": '))
+        JsonRpcException.exc_from_error(response.error)
+
+    check_cycles(cycle)
+
+
+def test_expired_request_cycles(clock):
+    pending = PendingRequests(clock=clock, recent_limit=RECENT_LIMIT)
+    client = JsonRpcPeer(pending=pending)
+    server = JsonRpcPeer(make_dispatcher())
+
+    def cycle():
+        _, data = client.request("add", [1, 2], timeout=1)
+        clock.now += 2
+        assert len(pending.expire()) == 1
+        # The late response is recognized as a duplicate and dropped.
+        (response,) = client.parse(server.handle(data))
+        assert pending.match(response) is None
+
+    check_cycles(cycle)
+    assert len(pending) == 0
+
+
+def test_instrumented_cycles():
+    traces = []
+    client = JsonRpcPeer(metrics=PeerMetrics())
+    server = JsonRpcPeer(
+        make_dispatcher(),
+        metrics=PeerMetrics(),
+        tracer=RequestTracer(trace_callback=lambda trace: traces.append(trace)),
+    )
+
+    def cycle():
+        _, data = client.request("add", [1, 2])
+        client.parse(server.handle(data))
+        traces.clear()
+
+    check_cycles(cycle)
@@ -0,0 +1,198 @@
+import json
+
+import pytest
+
+from sansio_jsonrpc import (
+    Histogram,
+    JsonRpcError,
+    JsonRpcMethodNotFoundError,
+    JsonRpcParseError,
+    JsonRpcPeer,
+    JsonRpcRequest,
+    PeerMetrics,
+)
+from sansio_jsonrpc.metrics import OTHER_METHOD, error_label
+
+
+class TickingClock:
+    """ A clock that advances by just under a microsecond each time it is read. """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        self.now += 2 ** -20
+        return self.now
+
+
+def make_metrics(**kwargs):
+    return PeerMetrics(clock=TickingClock(), **kwargs)
+
+
+def messages(snapshot):
+    """ A helper that turns the message counters into a dict. """
+    return {
+        (m["direction"], m["kind"], m["method"]): m["count"]
+        for m in snapshot["messages"]
+    }
+
+
+def errors(snapshot):
+    """ A helper that turns the error counters into a dict. """
+    return {(e["direction"], e["error"]): e["count"] for e in snapshot["errors"]}
+
+
+def test_histogram():
+    histogram = Histogram([1, 2, 4])
+    for value in (0.5, 1, 1.5, 3, 5, 100):
+        histogram.observe(value)
+    assert histogram.to_json_dict() == {
+        "bounds": [1, 2, 4],
+        "counts": [2, 1, 1, 2],
+        "count": 6,
+        "sum": 111.0,
+    }
+
+
+def test_error_label():
+    assert error_label(-32700) == "JsonRpcParseError"
+    assert error_label(-32601) == "JsonRpcMethodNotFoundError"
+    assert error_label(-32099) == "JsonRpcReservedError"
+    assert error_label(42) == "JsonRpcApplicationError"
+
+
+def test_peer_without_metrics():
+    assert JsonRpcPeer().metrics is None
+
+
+def test_sent_messages():
+    metrics = make_metrics()
+    peer = JsonRpcPeer(metrics=metrics)
+    _, data = peer.request("foo", [1])
+    peer.notify("foo")
+    peer.notify("bar")
+    request = JsonRpcRequest(id=1, method="foo")
+    peer.respond_with_result(request, 1)
+    peer.respond_with_error(request, JsonRpcMethodNotFoundError().get_error())
+    peer.respond_with_error(None, JsonRpcError(code=7, message="Nope"))
+
+    snapshot = metrics.snapshot()
+    assert messages(snapshot) == {
+        ("sent", "request", "foo"): 1,
+        ("sent", "notification", "foo"): 1,
+        ("sent", "notification", "bar"): 1,
+        ("sent", "result", None): 1,
+        ("sent", "error", None): 2,
+    }
+    assert errors(snapshot) == {
+        ("sent", "JsonRpcMethodNotFoundError"): 1,
+        ("sent", "JsonRpcApplicationError"): 1,
+    }
+    assert snapshot["bytes"]["received"] == 0
+    assert snapshot["bytes"]["sent"] > len(data)
+    encode = snapshot["latency"]["encode"]
+    assert encode["count"] == 6
+    assert encode["counts"][0] == 6
+    assert encode["sum"] == 6 * 2 ** -20
+    assert snapshot["latency"]["parse"]["count"] == 0
+    # The snapshot only contains JSON types.
+    assert json.loads(json.dumps(snapshot)) == snapshot
+
+
+def test_prepared_and_batch_messages():
+    metrics = make_metrics()
+    peer = JsonRpcPeer(metrics=metrics)
+    prepared = peer.prepare("foo")
+    _, data = prepared.request({"a": 1})
+    prepared.notify()
+    batch = peer.request_batch()
+    batch.request("foo")
+    batch.notify("bar")
+    batch.encode()
+    responses = peer.response_batch()
+    responses.add_result(JsonRpcRequest(id=1, method="foo"), 1)
+    responses.add_error(None, JsonRpcParseError().get_error())
+    responses.encode()
+
+    snapshot = metrics.snapshot()
+    assert messages(snapshot) == {
+        ("sent", "request", "foo"): 2,
+        ("sent", "notification", "foo"): 1,
+        ("sent", "notification", "bar"): 1,
+        ("sent", "result", None): 1,
+        ("sent", "error", None): 1,
+    }
+    assert errors(snapshot) == {("sent", "JsonRpcParseError"): 1}
+    assert snapshot["latency"]["encode"]["count"] == 4
+
+
+def test_received_messages():
+    metrics = make_metrics()
+    peer = JsonRpcPeer(metrics=metrics)
+    data = (
+        b'[{"jsonrpc": "2.0", "id": 1, "method": "foo"},'
+        b'{"jsonrpc": "2.0", "method": "bar"},'
+        b'{"jsonrpc": "2.0", "id": 2, "result": 1},'
+        b'{"jsonrpc": "2.0", "id": 3, "error": {"code": -32601, "message": "x"}},'
+        b"42]"
+    )
+    peer.parse(data)
+    with pytest.raises(JsonRpcParseError):
+        peer.parse(b"{")
+
+    snapshot = metrics.snapshot()
+    assert messages(snapshot) == {
+        ("received", "request", "foo"): 1,
+        ("received", "notification", "bar"): 1,
+        ("received", "result", None): 1,
+        ("received", "error", None): 1,
+    }
+    assert errors(snapshot) == {
+        ("received", "JsonRpcMethodNotFoundError"): 1,
+        ("rejected", "JsonRpcInvalidRequestError"): 1,
+        ("rejected", "JsonRpcParseError"): 1,
+    }
+    assert snapshot["bytes"]["received"] == len(data) + 1
+    assert snapshot["latency"]["parse"]["count"] == 2
+
+
+def test_handle_and_parse_many():
+    metrics = make_metrics()
+    peer = JsonRpcPeer(lambda request: 1, metrics=metrics)
+    peer.handle(b'{"jsonrpc": "2.0", "id": 1, "method": "foo"}')
+    peer.parse_many([b'{"jsonrpc": "2.0", "method": "foo"}', b"{"])
+
+    snapshot = metrics.snapshot()
+    assert messages(snapshot) == {
+        ("received", "request", "foo"): 1,
+        ("received", "notification", "foo"): 1,
+        ("sent", "result", None): 1,
+        ("sent", "error", None): 1,
+    }
+    assert errors(snapshot) == {
+        ("rejected", "JsonRpcParseError"): 1,
+        ("sent", "JsonRpcParseError"): 1,
+    }
+
+
+def test_max_methods():
+    metrics = make_metrics(max_methods=2)
+    peer = JsonRpcPeer(metrics=metrics)
+    for method in ("a", "b", "c", "d", "a"):
+        peer.notify(method)
+    assert messages(metrics.snapshot()) == {
+        ("sent", "notification", "a"): 2,
+        ("sent", "notification", "b"): 1,
+        ("sent", "notification", OTHER_METHOD): 2,
+    }
+
+
+def test_reset():
+    metrics = make_metrics()
+    peer = JsonRpcPeer(metrics=metrics)
+    peer.notify("foo")
+    metrics.reset()
+    snapshot = metrics.snapshot()
+    assert snapshot["messages"] == []
+    assert snapshot["bytes"] == {"sent": 0, "received": 0}
+    assert snapshot["latency"]["encode"]["count"] == 0
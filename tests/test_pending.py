@@ -0,0 +1,115 @@
+import pytest
+
+from sansio_jsonrpc import (
+    JsonRpcPeer,
+    JsonRpcResponse,
+    PendingRequests,
+)
+
+
+def test_match_response(clock):
+    pending = PendingRequests(clock=clock)
+    pending.add(1, "foo", context="ctx")
+    assert len(pending) == 1
+    assert 1 in pending
+    req = pending.match(JsonRpcResponse(id=1, result=True))
+    assert req.id == 1
+    assert req.method == "foo"
+    assert req.context == "ctx"
+    assert len(pending) == 0
+
+
+def test_add_duplicate_id():
+    pending = PendingRequests()
+    pending.add(1, "foo")
+    with pytest.raises(RuntimeError):
+        pending.add(1, "bar")
+
+
+def test_orphan_and_duplicate_responses():
+    unexpected = []
+    pending = PendingRequests(
+        unexpected_response_handler=lambda resp, dup: unexpected.append((resp.id, dup))
+    )
+    pending.add(1, "foo")
+    assert pending.match(JsonRpcResponse(id=1, result=True)) is not None
+    assert pending.match(JsonRpcResponse(id=1, result=True)) is None
+    assert pending.match(JsonRpcResponse(id=2, result=True)) is None
+    assert unexpected == [(1, True), (2, False)]
+    assert pending.duplicate_count == 1
+    assert pending.orphan_count == 1
+
+
+def test_recent_limit():
+    pending = PendingRequests(recent_limit=2)
+    for i in range(3):
+        pending.add(i, "foo")
+        pending.cancel(i)
+    # ID 0 has been forgotten, so its response is an orphan.
+    pending.match(JsonRpcResponse(id=0, result=True))
+    pending.match(JsonRpcResponse(id=2, result=True))
+    assert pending.orphan_count == 1
+    assert pending.duplicate_count == 1
+
+
+def test_expire(clock):
+    pending = PendingRequests(clock=clock, default_timeout=10)
+    pending.add(1, "foo")
+    pending.add(2, "bar", timeout=5)
+    pending.add(3, "baz", timeout=20)
+    pending.add(4, "qux", timeout=1)
+    pending.match(JsonRpcResponse(id=4, result=True))
+    assert pending.next_deadline() == 5
+
+    clock.now = 4
+    assert pending.expire() == []
+    clock.now = 10
+    assert [req.id for req in pending.expire()] == [2, 1]
+    assert pending.next_deadline() == 20
+    assert [req.id for req in pending.expire(now=100)] == [3]
+    assert pending.next_deadline() is None
+    assert len(pending) == 0
+
+    # An expired request's late response counts as a duplicate.
+    pending.match(JsonRpcResponse(id=1, result=True))
+    assert pending.duplicate_count == 1
+
+
+def test_heap_stays_proportional(clock):
+    """ Requests answered before their deadline do not pile up in the heap. """
+    pending = PendingRequests(clock=clock, default_timeout=60)
+    for i in range(10_000):
+        pending.add(i, "foo")
+        pending.match(JsonRpcResponse(id=i, result=True))
+    assert len(pending) == 0
+    assert len(pending._heap) <= 130
+
+
+def test_peer_tracks_requests(clock):
+    peer = JsonRpcPeer(pending=PendingRequests(clock=clock))
+    req_id, _ = peer.request("foo", timeout=3)
+    batch = peer.request_batch()
+    batch_id = batch.request("bar")
+    batch.notify("baz")
+    assert len(peer.pending) == 2
+
+    (resp,) = peer.parse(b'{"jsonrpc": "2.0", "id": %d, "result": 1}' % batch_id)
+    assert peer.pending.match(resp).method == "bar"
+    clock.now = 3
+    assert [req.id for req in peer.pending.expire()] == [req_id]
+
+
+def test_peer_timeout_requires_tracker():
+    peer = JsonRpcPeer()
+    with pytest.raises(RuntimeError):
+        peer.request("foo", timeout=3)
+
+
+def test_iterate_pending():
+    pending = PendingRequests()
+    pending.add(1, "foo")
+    pending.add(2, "bar")
+    # Iterating over a snapshot allows requests to be cancelled along the way.
+    for request in pending:
+        pending.cancel(request.id)
+    assert len(pending) == 0
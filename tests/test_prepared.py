@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from sansio_jsonrpc import (
+    JsonRpcInvalidRequestError,
+    JsonRpcPeer,
+    JsonRpcPreparedCall,
+    PendingRequests,
+)
+from sansio_jsonrpc.codec import OrjsonCodec, StdlibJsonCodec, orjson
+
+
+CODECS = [StdlibJsonCodec]
+if orjson is not None:
+    CODECS.append(OrjsonCodec)
+
+
+class SortedCodec(StdlibJsonCodec):
+    """ A codec whose output cannot be split into a template. """
+
+    def encode(self, obj):
+        return json.dumps(obj, sort_keys=True).encode("utf8")
+
+
+@pytest.mark.parametrize("codec_cls", CODECS + [SortedCodec])
+@pytest.mark.parametrize("method", ["hello_world", "café", 'quote"d'])
+@pytest.mark.parametrize("params", [None, [1, "two"], {"a": {"b": [None]}}])
+def test_prepared_matches_request(codec_cls, method, params):
+    prepared_peer = JsonRpcPeer(codec=codec_cls())
+    plain_peer = JsonRpcPeer(codec=codec_cls())
+    prepared = prepared_peer.prepare(method)
+    for _ in range(3):
+        assert prepared.request(params) == plain_peer.request(method, params)
+    assert prepared.notify(params) == plain_peer.notify(method, params)
+
+
+def test_prepared_is_templated():
+    assert JsonRpcPeer(codec=StdlibJsonCodec()).prepare("foo")._templated
+    assert not JsonRpcPeer(codec=SortedCodec()).prepare("foo")._templated
+
+
+def test_prepared_validation():
+    peer = JsonRpcPeer()
+    with pytest.raises(JsonRpcInvalidRequestError):
+        peer.prepare(1)
+    prepared = peer.prepare("foo")
+    with pytest.raises(JsonRpcInvalidRequestError):
+        prepared.request(1)
+    with pytest.raises(JsonRpcInvalidRequestError):
+        prepared.notify("bar")
+
+
+def test_prepared_shares_ids_and_tracking():
+    peer = JsonRpcPeer(pending=PendingRequests())
+    prepared = peer.prepare("foo")
+    assert peer.request("bar")[0] == 0
+    assert prepared.request(timeout=1)[0] == 1
+    assert peer.request("bar")[0] == 2
+    assert peer.pending.get(1).method == "foo"
+
+
+def test_prepare_cache_lru():
+    peer = JsonRpcPeer(prepared_cache_size=2)
+    foo = peer.prepare("foo")
+    assert isinstance(foo, JsonRpcPreparedCall)
+    bar = peer.prepare("bar")
+    assert peer.prepare("foo") is foo
+    peer.prepare("baz")
+    assert list(peer._prepared) == ["foo", "baz"]
+    assert peer.prepare("foo") is foo
+    assert peer.prepare("bar") is not bar
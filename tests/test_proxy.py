@@ -0,0 +1,147 @@
+import json
+
+import pytest
+
+from sansio_jsonrpc import (
+    JsonRpcInvalidRequestError,
+    JsonRpcParseError,
+    JsonRpcPeer,
+    JsonRpcProxy,
+)
+
+
+def make_proxy(**kwargs):
+    """ A helper that creates a proxy which rewrites every frame in place if it can. """
+    return JsonRpcProxy(JsonRpcPeer(), rewrite_threshold=0, **kwargs)
+
+
+def test_forward_request_in_place():
+    proxy = make_proxy()
+    data = b'{"jsonrpc": "2.0", "id": "a-1", "method": "rows", "params": {"x": [1]}}'
+    forwarded = proxy.forward_request("alice", data)
+    assert forwarded == (
+        b'{"jsonrpc": "2.0", "id": 0, "method": "rows", "params": {"x": [1]}}'
+    )
+    assert len(proxy) == 1
+    assert proxy.fallback_count == 0
+
+    # The original ID is restored exactly as it was received.
+    response = b'{"jsonrpc": "2.0", "result": {"y": 2}, "id": 0}'
+    assert proxy.forward_response(response) == [
+        ("alice", b'{"jsonrpc": "2.0", "result": {"y": 2}, "id": "a-1"}')
+    ]
+    assert len(proxy) == 0
+    assert proxy.fallback_count == 0
+
+
+def test_forward_ids_do_not_collide():
+    upstream = JsonRpcPeer()
+    proxy = JsonRpcProxy(upstream)
+    request = b'{"jsonrpc": "2.0", "id": 1, "method": "foo"}'
+    first = json.loads(proxy.forward_request("alice", request))
+    own_id, _ = upstream.request("bar")
+    second = json.loads(proxy.forward_request("bob", request))
+    assert len({first["id"], own_id, second["id"]}) == 3
+
+    response = b'{"jsonrpc": "2.0", "result": null, "id": %d}'
+    # A response to the upstream peer's own request is not forwarded.
+    assert proxy.forward_response(response % own_id) is None
+    (client, data) = proxy.forward_response(response % second["id"])[0]
+    assert client == "bob"
+    assert json.loads(data)["id"] == 1
+
+
+def test_forward_notification_unchanged():
+    proxy = make_proxy()
+    data = b'{"jsonrpc": "2.0", "method": "foo", "params": [1]}'
+    assert proxy.forward_request("alice", data) is data
+    assert len(proxy) == 0
+
+
+def test_forward_small_frames_decoded():
+    proxy = JsonRpcProxy(JsonRpcPeer())
+    data = b'{"jsonrpc": "2.0", "id": "a-1", "method": "rows", "params": [1]}'
+    forwarded = json.loads(proxy.forward_request("alice", data))
+    assert forwarded == {"jsonrpc": "2.0", "id": 0, "method": "rows", "params": [1]}
+    response = b'{"jsonrpc": "2.0", "result": 3, "id": 0}'
+    ((client, data),) = proxy.forward_response(response)
+    assert client == "alice"
+    assert json.loads(data) == {"jsonrpc": "2.0", "result": 3, "id": "a-1"}
+    assert proxy.fallback_count == 0
+
+
+def test_forward_batch_falls_back():
+    proxy = make_proxy()
+    batch = [
+        {"jsonrpc": "2.0", "id": 5, "method": "foo"},
+        {"jsonrpc": "2.0", "method": "notify"},
+        {"jsonrpc": "2.0", "id": 5.0, "method": "bar"},
+    ]
+    forwarded = json.loads(proxy.forward_request("alice", json.dumps(batch).encode()))
+    assert proxy.fallback_count == 1
+    assert [msg.get("id") for msg in forwarded] == [0, None, 1]
+    assert forwarded[1] == batch[1]
+
+    responses = [
+        {"jsonrpc": "2.0", "id": 1, "result": "b"},
+        {"jsonrpc": "2.0", "id": 99, "result": "unknown"},
+        {"jsonrpc": "2.0", "id": 0, "result": "a"},
+    ]
+    ((client, data),) = proxy.forward_response(json.dumps(responses).encode())
+    assert client == "alice"
+    assert json.loads(data) == [
+        {"jsonrpc": "2.0", "id": 5.0, "result": "b"},
+        {"jsonrpc": "2.0", "id": 5, "result": "a"},
+    ]
+
+
+def test_forward_escaped_member_falls_back():
+    proxy = make_proxy()
+    data = b'{"jsonrpc": "2.0", "\\u0069d": 7, "method": "foo"}'
+    forwarded = json.loads(proxy.forward_request("alice", data))
+    assert forwarded["id"] == 0
+    assert proxy.fallback_count == 1
+
+
+def test_forward_invalid_request():
+    proxy = make_proxy()
+    with pytest.raises(JsonRpcInvalidRequestError):
+        proxy.forward_request("alice", b'{"jsonrpc": "2.0", "id": [1], "method": "a"}')
+    with pytest.raises(JsonRpcInvalidRequestError):
+        proxy.forward_request(
+            "alice",
+            b'[{"jsonrpc": "2.0", "id": 1, "method": "a"}, '
+            b'{"jsonrpc": "2.0", "id": 2, "method": 3}]',
+        )
+    with pytest.raises(JsonRpcParseError):
+        proxy.forward_request("alice", b'{"jsonrpc": "2.0", "id": 1, "method": "a"')
+    # Nothing is left behind for the requests that were rejected.
+    assert len(proxy) == 0
+
+
+def test_expire(clock):
+    proxy = make_proxy(timeout=5, clock=clock)
+    up = json.loads(proxy.forward_request("alice", b'{"id": "x", "method": "a"}'))
+    proxy.forward_request("bob", b'{"id": "y", "method": "b"}', timeout=10)
+    assert proxy.next_deadline() == 5
+    clock.now = 6
+    ((client, data),) = proxy.expire()
+    assert client == "alice"
+    response = json.loads(data)
+    assert response["id"] == "x"
+    assert response["error"]["message"] == "The upstream peer did not respond in time."
+    assert len(proxy) == 1
+    # A late response is not forwarded.
+    late = b'{"jsonrpc": "2.0", "result": 1, "id": %d}' % up["id"]
+    assert proxy.forward_response(late) is None
+
+
+def test_drop_client():
+    proxy = make_proxy()
+    proxy.forward_request("alice", b'{"id": 1, "method": "a"}')
+    proxy.forward_request("bob", b'{"id": 1, "method": "a"}')
+    proxy.forward_request("alice", b'{"id": 2, "method": "a"}')
+    assert proxy.drop_client("alice") == 2
+    assert len(proxy) == 1
+    assert proxy.forward_response(b'{"result": 1, "id": 0}') is None
+    assert proxy.forward_response(b'{"result": 1, "id": 1}')[0][0] == "bob"
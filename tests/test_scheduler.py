@@ -0,0 +1,142 @@
+import json
+
+from sansio_jsonrpc import (
+    JsonRpcBatch,
+    JsonRpcDeadlineExceededError,
+    JsonRpcPeer,
+    JsonRpcResponse,
+    JsonRpcScheduler,
+)
+from sansio_jsonrpc.main import MISSING_ID
+
+
+def request(id_, method="foo", **members):
+    return json.dumps(dict(jsonrpc="2.0", id=id_, method=method, **members)).encode()
+
+
+def notification(method="foo", **members):
+    return json.dumps(dict(jsonrpc="2.0", method=method, **members)).encode()
+
+
+def popped_ids(scheduler):
+    ids = []
+    while True:
+        work = scheduler.pop()
+        if work is None:
+            return ids
+        ids.append([message.id for message in work])
+
+
+def test_order_by_lane_priority_and_deadline(clock):
+    scheduler = JsonRpcScheduler(JsonRpcPeer(), clock=clock)
+    assert scheduler.push(notification(priority=10)) is None
+    assert scheduler.push(request(1)) is None
+    assert scheduler.push(request(2, timeout=5)) is None
+    assert scheduler.push(request(3, timeout=1)) is None
+    assert scheduler.push(request(4, priority=1)) is None
+    assert len(scheduler) == 5
+    assert scheduler.next_deadline() == 1
+    ids = popped_ids(scheduler)
+    # Higher priority first, then earliest deadline, then notifications.
+    assert ids == [[4], [3], [2], [1], [MISSING_ID]]
+    assert len(scheduler) == 0
+
+
+def test_expire(clock):
+    peer = JsonRpcPeer()
+    scheduler = JsonRpcScheduler(peer, clock=clock, default_timeout=10)
+    scheduler.push(request(1, timeout=1))
+    scheduler.push(request(2, timeout=2))
+    scheduler.push(notification(timeout=1))
+    scheduler.push(request(3))
+    clock.now = 1.5
+    assert scheduler.expire() == [
+        peer.respond_with_error(
+            JsonRpcPeer().parse(request(1))[0],
+            JsonRpcDeadlineExceededError().get_error(),
+        )
+    ]
+    assert scheduler.expired_count == 2
+    assert scheduler.next_deadline() == 2
+    assert scheduler.expire() == []
+
+    # pop() drops expired work that it reaches, and expire() returns its responses.
+    clock.now = 2
+    assert [message.id for message in scheduler.pop()] == [3]
+    assert scheduler.pop() is None
+    (data,) = scheduler.expire()
+    response = json.loads(data)
+    assert response["id"] == 2
+    assert response["error"]["code"] == JsonRpcDeadlineExceededError.ERROR_CODE
+    assert scheduler.expired_count == 3
+
+
+def test_already_expired(clock):
+    scheduler = JsonRpcScheduler(JsonRpcPeer(), clock=clock)
+    assert scheduler.push(request(1, timeout=0)) is None
+    assert scheduler.push(notification(timeout=-1)) is None
+    assert len(scheduler) == 0
+    assert len(scheduler.expire()) == 1
+    assert scheduler.expired_count == 2
+
+
+def test_batch_is_queued_as_a_whole(clock):
+    scheduler = JsonRpcScheduler(JsonRpcPeer(), clock=clock)
+    scheduler.push(request(1, priority=1))
+    batch = b"[%s, %s, %s, 1]" % (
+        request(2, timeout=3),
+        request(3, timeout=1, priority=2),
+        notification(),
+    )
+    scheduler.push(batch)
+    work = scheduler.pop()
+    assert isinstance(work, JsonRpcBatch)
+    assert [message.id for message in work][:2] == [2, 3]
+
+    scheduler.push(batch)
+    clock.now = 1
+    (data,) = scheduler.expire()
+    responses = json.loads(data)
+    assert [response["id"] for response in responses] == [None, 2, 3]
+    assert responses[0]["error"]["code"] == -32600
+    assert responses[1]["error"]["code"] == JsonRpcDeadlineExceededError.ERROR_CODE
+    assert scheduler.expired_count == 3
+
+
+def test_members(clock):
+    scheduler = JsonRpcScheduler(
+        JsonRpcPeer(),
+        clock=clock,
+        timeout_member="x-timeout",
+        priority_member=None,
+        default_priority=5,
+    )
+    scheduler.push(request(1, timeout=1, priority=9))
+    scheduler.push(request(2, **{"x-timeout": 2}))
+    scheduler.push(request(3, **{"x-timeout": "soon"}))
+    assert scheduler.next_deadline() == 2
+    assert popped_ids(scheduler) == [[2], [1], [3]]
+
+
+def test_responses_are_not_queued():
+    scheduler = JsonRpcScheduler(JsonRpcPeer())
+    data = JsonRpcPeer().respond_with_result(
+        JsonRpcPeer().parse(request(1))[0], True
+    )
+    (response,) = scheduler.push(data)
+    assert response == JsonRpcResponse(id=1, result=True)
+    assert len(scheduler) == 0
+
+
+def test_heaps_stay_bounded(clock):
+    scheduler = JsonRpcScheduler(JsonRpcPeer(), clock=clock)
+    for i in range(1000):
+        scheduler.push(request(i, timeout=1))
+        scheduler.pop()
+    assert len(scheduler._deadline_heap) < 200
+    for i in range(1000):
+        scheduler.push(request(i, timeout=1, priority=1))
+    clock.now = 1
+    assert len(scheduler.expire()) == 1000
+    scheduler.push(request(1000))
+    assert len(scheduler._work_heap) < 200
@@ -0,0 +1,86 @@
+import typing
+
+import pytest
+
+from sansio_jsonrpc import (
+    JsonRpcDispatcher,
+    JsonRpcInvalidParamsError,
+    JsonRpcPeer,
+    JsonRpcRequest,
+    ParamsSchema,
+)
+from sansio_jsonrpc.schema import compile_schema
+
+
+SCHEMA = ParamsSchema(
+    {"name": str, "count": int, "ratio": float, "tags": (list, None), "meta": typing.Any},
+    optional=["tags", "meta"],
+)
+
+
+def test_positional_params():
+    validate = compile_schema("m", SCHEMA)
+    validate(["a", 1, 2])
+    validate(["a", 1, 2.5, None, {"x": 1}])
+    validate(["a", 1, 2.5, ["t"]])
+    with pytest.raises(JsonRpcInvalidParamsError, match="'count' must be an integer"):
+        validate(["a", True, 2.5])
+    with pytest.raises(JsonRpcInvalidParamsError, match="'tags' must be an array or null"):
+        validate(["a", 1, 2.5, "t"])
+    with pytest.raises(JsonRpcInvalidParamsError):
+        validate(["a", 1])
+    with pytest.raises(JsonRpcInvalidParamsError):
+        validate(["a", 1, 2.5, None, None, None])
+
+
+def test_named_params():
+    validate = compile_schema("m", SCHEMA)
+    validate({"name": "a", "count": 1, "ratio": 0.5})
+    validate({"name": "a", "count": 1, "ratio": 0.5, "tags": None, "meta": "x"})
+    with pytest.raises(JsonRpcInvalidParamsError, match="'ratio' must be a number"):
+        validate({"name": "a", "count": 1, "ratio": "0.5"})
+    with pytest.raises(JsonRpcInvalidParamsError):
+        validate({"name": "a", "count": 1})
+    with pytest.raises(JsonRpcInvalidParamsError):
+        validate({"name": "a", "count": 1, "ratio": 0.5, "other": 1})
+    compile_schema("m", ParamsSchema({"name": str}, extra=True))({"name": "a", "x": 1})
+
+
+def test_errors_are_interned():
+    validate = compile_schema("m", SCHEMA)
+    for params in (["a", True, 2.5], {"name": "a", "count": "1", "ratio": 0.5}, None):
+        with pytest.raises(JsonRpcInvalidParamsError) as exc_info:
+            validate(params)
+        error = exc_info.value.get_error()
+        assert error is JsonRpcInvalidParamsError.intern(error.message)
+
+
+def test_missing_params():
+    with pytest.raises(JsonRpcInvalidParamsError):
+        compile_schema("m", SCHEMA)(None)
+    compile_schema("m", ParamsSchema({"a": int}, optional=["a"]))(None)
+    compile_schema("m", ParamsSchema({}))([])
+
+
+def test_invalid_schema():
+    with pytest.raises(ValueError):
+        compile_schema("m", ParamsSchema({"a": set}))
+    with pytest.raises(ValueError):
+        compile_schema("m", ParamsSchema({"a": int}, optional=["b"]))
+
+
+def test_dispatcher_schema():
+    dispatcher = JsonRpcDispatcher()
+
+    @dispatcher.register(schema=ParamsSchema({"a": int, "b": int}))
+    def add(a, b):
+        return a + b
+
+    assert dispatcher(JsonRpcRequest(id=1, method="add", params=[1, 2])) == 3
+    server = JsonRpcPeer(dispatcher)
+    data = server.handle(
+        b'{"jsonrpc": "2.0", "id": 1, "method": "add", "params": [1, "2"]}'
+    )
+    (response,) = JsonRpcPeer().parse(data)
+    assert response.error.code == -32602
+    assert response.error.message == "Invalid params for method 'add': 'b' must be an integer"
@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+from sansio_jsonrpc import (
+    ContentLengthFramer,
+    JsonRpcPeer,
+    JsonRpcRequest,
+    NewlineFramer,
+    PeerMetrics,
+    RequestTracer,
+)
+from sansio_jsonrpc.binary import PureMsgpackCodec
+from sansio_jsonrpc.codec import OrjsonCodec, StdlibJsonCodec, orjson
+
+
+ROWS = {"rows": [{"id": i, "tags": ["a", "b"]} for i in range(1000)], "count": 1000}
+
+
+@pytest.mark.parametrize(
+    "result", [ROWS, list(range(200)), {}, [], [[], {}], 1, "x", {"a": {"b": 1}}]
+)
+def test_stream_matches_respond_with_result(result):
+    peer = JsonRpcPeer(codec=StdlibJsonCodec())
+    request = JsonRpcRequest(id=1, method="get_rows")
+    chunks = list(peer.respond_with_result_stream(request, result, chunk_size=256))
+    assert json.loads(b"".join(chunks)) == json.loads(
+        peer.respond_with_result(request, result)
+    )
+
+
+def test_stream_non_string_keys():
+    peer = JsonRpcPeer(codec=StdlibJsonCodec())
+    request = JsonRpcRequest(id=1, method="get_rows")
+    result = {1: "a", None: [2.5], "c": {True: 3}}
+    data = b"".join(peer.respond_with_result_stream(request, result))
+    assert data == peer.respond_with_result(request, result)
+    assert json.loads(data)["result"] == {"1": "a", "null": [2.5], "c": {"true": 3}}
+    with pytest.raises(TypeError):
+        b"".join(peer.respond_with_result_stream(request, {(1, 2): "a"}))
+
+
+def test_stream_non_string_keys_orjson():
+    if orjson is None:
+        pytest.skip("orjson is not installed")
+    peer = JsonRpcPeer(codec=OrjsonCodec())
+    request = JsonRpcRequest(id=1, method="get_rows")
+    with pytest.raises(TypeError):
+        peer.respond_with_result(request, {1: "a"})
+    with pytest.raises(TypeError):
+        b"".join(peer.respond_with_result_stream(request, {1: "a"}))
+
+
+def test_stream_chunks_are_bounded():
+    peer = JsonRpcPeer(framer=NewlineFramer())
+    request = JsonRpcRequest(id="a", method="get_rows")
+    chunks = list(peer.respond_with_result_stream(request, ROWS, chunk_size=1024))
+    assert chunks[0] == b'{"id":"a","jsonrpc":"2.0","result":'
+    assert len(chunks) > 10
+    # A chunk can exceed the size by one run of small items.
+    assert max(len(chunk) for chunk in chunks) < 2048
+    assert chunks[-1].endswith(b"}\n")
+    (response,) = JsonRpcPeer(framer=NewlineFramer()).feed(b"".join(chunks))
+    assert response.result == ROWS
+
+
+def test_stream_iterator_result():
+    peer = JsonRpcPeer()
+    request = JsonRpcRequest(id=1, method="count")
+    data = b"".join(peer.respond_with_result_stream(request, (i for i in range(5))))
+    (response,) = peer.parse(data)
+    assert response.result == [0, 1, 2, 3, 4]
+
+
+def test_stream_metrics_and_tracing():
+    metrics = PeerMetrics()
+    traces = []
+    peer = JsonRpcPeer(metrics=metrics, tracer=RequestTracer(trace_callback=traces.append))
+    (request,) = peer.parse(b'{"jsonrpc": "2.0", "id": 1, "method": "get_rows"}')
+    data = b"".join(peer.respond_with_result_stream(request, ROWS))
+    assert metrics.bytes_sent == len(data)
+    assert len(traces) == 1
+    assert traces[0].response_size == len(data)
+
+
+def test_stream_requires_streamable_framing():
+    request = JsonRpcRequest(id=1, method="get_rows")
+    with pytest.raises(RuntimeError):
+        JsonRpcPeer(framer=ContentLengthFramer()).respond_with_result_stream(request, 1)
+    with pytest.raises(RuntimeError):
+        JsonRpcPeer(
+            codec=PureMsgpackCodec(), framer=NewlineFramer()
+        ).respond_with_result_stream(request, 1)
@@ -0,0 +1,127 @@
+import pytest
+
+from sansio_jsonrpc import (
+    JsonRpcMethodNotFoundError,
+    JsonRpcPeer,
+    JsonRpcRequest,
+    NewlineFramer,
+    RequestTracer,
+)
+
+
+REQUEST = b'{"jsonrpc": "2.0", "id": 1, "method": "foo"}'
+
+
+def test_trace_stages(clock):
+    clock.step = 1.0
+    traces = []
+    tracer = RequestTracer(clock=clock, trace_callback=traces.append)
+    peer = JsonRpcPeer(tracer=tracer)
+    (request,) = peer.parse(REQUEST, received_at=0.0)
+    assert len(tracer) == 1
+    assert tracer.get(1).stages == {"receive": 1.0, "parse": 1.0}
+    assert tracer.get(1).duration is None
+    clock.now += 10
+    data = peer.respond_with_result(request, 42)
+    assert len(tracer) == 0
+    (trace,) = traces
+    assert trace.id == 1
+    assert trace.method == "foo"
+    assert trace.request_size == len(REQUEST)
+    assert trace.response_size == len(data)
+    assert trace.stages == {"receive": 1.0, "parse": 1.0, "handle": 11.0, "encode": 1.0}
+    assert trace.duration == 14.0
+
+
+def test_trace_error_response(clock):
+    clock.step = 1.0
+    traces = []
+    tracer = RequestTracer(clock=clock, trace_callback=traces.append)
+    peer = JsonRpcPeer(tracer=tracer)
+    (request,) = peer.parse(REQUEST)
+    peer.respond_with_error(request, JsonRpcMethodNotFoundError().get_error())
+    (trace,) = traces
+    assert trace.stages["receive"] == 0.0
+
+
+def test_notifications_and_unknown_ids_are_not_traced(clock):
+    clock.step = 1.0
+    traces = []
+    tracer = RequestTracer(clock=clock, trace_callback=traces.append)
+    peer = JsonRpcPeer(tracer=tracer)
+    peer.parse(b'{"jsonrpc": "2.0", "method": "foo"}')
+    peer.parse(b'{"jsonrpc": "2.0", "id": 2, "result": 1}')
+    assert len(tracer) == 0
+    peer.respond_with_result(JsonRpcRequest(id=1, method="foo"), 42)
+    peer.respond_with_error(None, JsonRpcMethodNotFoundError().get_error())
+    assert traces == []
+
+
+def test_slow_callback(clock):
+    slow = []
+    tracer = RequestTracer(clock=clock, slow_threshold=0.5, slow_callback=slow.append)
+    peer = JsonRpcPeer(tracer=tracer)
+    (request,) = peer.parse(REQUEST)
+    clock.now += 0.5
+    peer.respond_with_result(request, 42)
+    assert slow == []
+    (request,) = peer.parse(REQUEST)
+    clock.now += 0.6
+    peer.respond_with_result(request, 42)
+    (trace,) = slow
+    assert trace.stages["handle"] == pytest.approx(0.6)
+
+
+def test_sampling(clock):
+    samples = iter([0.1, 0.3, 0.2])
+    traces = []
+    tracer = RequestTracer(
+        clock=clock,
+        sample_rate=0.25,
+        trace_callback=traces.append,
+        random=lambda: next(samples),
+    )
+    peer = JsonRpcPeer(tracer=tracer)
+    for _ in range(3):
+        (request,) = peer.parse(REQUEST)
+        peer.respond_with_result(request, 42)
+    assert len(traces) == 2
+
+
+def test_max_active(clock):
+    tracer = RequestTracer(clock=clock, max_active=2)
+    peer = JsonRpcPeer(tracer=tracer)
+    for id_ in range(3):
+        peer.parse(b'{"jsonrpc": "2.0", "id": %d, "method": "foo"}' % id_)
+    assert len(tracer) == 2
+    assert tracer.get(0) is None
+
+
+def test_trace_feed(clock):
+    traces = []
+    tracer = RequestTracer(clock=clock, trace_callback=traces.append)
+    peer = JsonRpcPeer(framer=NewlineFramer(), tracer=tracer)
+    assert list(peer.feed(REQUEST[:10])) == []
+    clock.now = 1.0
+    (request,) = peer.feed(REQUEST[10:] + b"\n")
+    clock.now = 3.0
+    peer.respond_with_result(request, 42)
+    (trace,) = traces
+    assert trace.received_at == 0.0
+    assert trace.stages["receive"] == 1.0
+    assert trace.duration == 3.0
+
+
+def test_trace_handle_batch(clock):
+    clock.step = 1.0
+    traces = []
+    tracer = RequestTracer(clock=clock, trace_callback=traces.append)
+    peer = JsonRpcPeer(lambda request: 42, tracer=tracer)
+    data = b"[%s, %s]" % (REQUEST, REQUEST.replace(b'"id": 1', b'"id": 2'))
+    response = peer.handle(data)
+    assert [trace.id for trace in traces] == [1, 2]
+    for trace in traces:
+        assert trace.request_size == len(data)
+        assert trace.response_size == len(response)
+        assert trace.encoded_at == traces[0].encoded_at
+    assert traces[0].stages["handle"] < traces[1].stages["handle"]
@@ -0,0 +1,123 @@
+import asyncio
+import concurrent.futures
+import os
+import socket
+
+import pytest
+
+from sansio_jsonrpc import (
+    EncodedResult,
+    JsonRpcException,
+    JsonRpcInvalidParamsError,
+    JsonRpcMethodNotFoundError,
+    JsonRpcPeer,
+    JsonRpcRequest,
+    JsonRpcWorkerPool,
+    ParamsSchema,
+    PeerMetrics,
+)
+from sansio_jsonrpc.asyncio import JsonRpcProtocol
+
+
+def total(values):
+    return sum(values)
+
+
+def pid():
+    return os.getpid()
+
+
+def fail():
+    raise JsonRpcInvalidParamsError("nope")
+
+
+def test_inline_and_thread_methods():
+    with concurrent.futures.ThreadPoolExecutor(2) as threads:
+        pool = JsonRpcWorkerPool(thread_pool=threads)
+        pool.register(total)
+        pool.register(total, name="thread_total", run="thread")
+        assert pool.methods == {"total": "inline", "thread_total": "thread"}
+        assert pool(JsonRpcRequest(id=1, method="total", params=[[1, 2]])) == 3
+        future = pool(JsonRpcRequest(id=2, method="thread_total", params=[[1, 2]]))
+        assert isinstance(future, concurrent.futures.Future)
+        assert future.result() == EncodedResult(b"3")
+        with pytest.raises(JsonRpcMethodNotFoundError) as exc_info:
+            pool(JsonRpcRequest(id=3, method="missing"))
+        assert exc_info.value.get_error() is JsonRpcMethodNotFoundError.intern()
+
+
+def test_process_methods_receive_raw_params():
+    peer = JsonRpcPeer(lazy=True)
+    with concurrent.futures.ProcessPoolExecutor(1) as processes:
+        pool = JsonRpcWorkerPool(process_pool=processes)
+        pool.register(total, run="process")
+        pool.register(pid, run="process")
+        pool.register(fail, run="process")
+        pool.register(
+            total,
+            name="checked_total",
+            run="process",
+            schema=ParamsSchema({"values": list}),
+        )
+        (request,) = peer.parse(
+            b'{"jsonrpc": "2.0", "id": 7, "method": "total", "params": [[1, 2, 3]]}'
+        )
+        result = pool(request).result()
+        assert request.raw_params is not None
+        assert result == EncodedResult(b"6")
+        assert pool(JsonRpcRequest(id=8, method="pid")).result() != str(os.getpid())
+        with pytest.raises(JsonRpcInvalidParamsError):
+            pool(JsonRpcRequest(id=9, method="fail")).result()
+        with pytest.raises(JsonRpcInvalidParamsError):
+            pool(JsonRpcRequest(id=10, method="total", params=[1, 2])).result()
+        with pytest.raises(JsonRpcInvalidParamsError, match="must be an array"):
+            pool(JsonRpcRequest(id=11, method="checked_total", params=[1])).result()
+
+
+def test_register_requires_executor():
+    pool = JsonRpcWorkerPool()
+    with pytest.raises(RuntimeError):
+        pool.register(total, run="thread")
+    with pytest.raises(RuntimeError):
+        pool.register(total, run="process")
+    with pytest.raises(ValueError):
+        pool.register(total, run="elsewhere")
+    assert "total" not in pool
+
+
+def test_respond_with_encoded_result():
+    metrics = PeerMetrics()
+    peer = JsonRpcPeer(metrics=metrics)
+    request = JsonRpcRequest(id=1, method="total")
+    data = peer.respond_with_result(request, EncodedResult(b'{"a":[1,2]}'))
+    (response,) = JsonRpcPeer().parse(data)
+    assert response.id == 1
+    assert response.result == {"a": [1, 2]}
+    assert metrics.bytes_sent == len(data)
+    batch = peer.response_batch()
+    batch.add_result(request, EncodedResult(b"[1]"))
+    assert [r.result for r in JsonRpcPeer().parse(batch.encode())] == [[1]]
+
+
+def test_protocol_waits_for_workers():
+    async def main():
+        loop = asyncio.get_event_loop()
+        with concurrent.futures.ThreadPoolExecutor(2) as threads:
+            pool = JsonRpcWorkerPool(thread_pool=threads)
+            pool.register(total, run="thread")
+            server_peer = JsonRpcPeer(pool, lazy=True)
+            client_sock, server_sock = socket.socketpair()
+            await loop.connect_accepted_socket(
+                lambda: JsonRpcProtocol(server_peer), sock=server_sock
+            )
+            _, client = await loop.create_connection(JsonRpcProtocol, sock=client_sock)
+            results = await asyncio.gather(
+                *(client.request("total", [[i, 1]]) for i in range(10))
+            )
+            assert results == list(range(1, 11))
+            with pytest.raises(JsonRpcException) as exc_info:
+                await client.request("total", [1, 2])
+            assert exc_info.value.code == JsonRpcInvalidParamsError.ERROR_CODE
+            client.close()
+
+    asyncio.run(main())